@@ -0,0 +1,189 @@
+"""IVF + product-quantization approximate nearest-neighbour index (NumPy only).
+
+Vectors are assigned to the nearest of ``nlist`` k-means centroids (the
+inverted lists).  The residual to that centroid is split into ``m``
+sub-vectors, each replaced by the id of its nearest sub-codebook entry, so a
+128-d float32 encoding is stored as ``m`` bytes.  A query scans only the
+``nprobe`` closest lists using per-list lookup tables (asymmetric distance)
+and returns candidate ids; the caller re-ranks them exactly.
+"""
+import copy
+
+import numpy as np
+
+
+def kmeans(data, k, iters=15, seed=0):
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(iters):
+        labels = assign(data, centroids)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, data)
+        filled = counts > 0
+        centroids[filled] = sums[filled] / counts[filled, None]
+        # Re-seed empty clusters on random points so every list stays usable.
+        empty = np.flatnonzero(~filled)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty), replace=False)]
+    return centroids
+
+
+def assign(data, centroids, chunk=8192):
+    c_norms = np.einsum("ij,ij->i", centroids, centroids)
+    labels = np.empty(len(data), dtype=np.int64)
+    for start in range(0, len(data), chunk):
+        block = data[start : start + chunk]
+        d2 = c_norms - 2.0 * (block @ centroids.T)
+        labels[start : start + chunk] = np.argmin(d2, axis=1)
+    return labels
+
+
+class _InvertedList:
+    """Append-only codes/ids buffer with spare capacity.
+
+    Readers take ``size`` before the arrays, and writers grow before
+    bumping ``size``, so a concurrent search always sees valid rows.
+    """
+
+    def __init__(self, m, capacity=8):
+        self.codes = np.zeros((capacity, m), dtype=np.uint8)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+
+    def append(self, codes, ids):
+        needed = self.size + len(ids)
+        if needed > len(self.ids):
+            capacity = max(needed, 2 * len(self.ids))
+            grown_codes = np.zeros((capacity, self.codes.shape[1]), dtype=np.uint8)
+            grown_ids = np.zeros(capacity, dtype=np.int64)
+            grown_codes[: self.size] = self.codes[: self.size]
+            grown_ids[: self.size] = self.ids[: self.size]
+            self.codes, self.ids = grown_codes, grown_ids
+        self.codes[self.size : needed] = codes
+        self.ids[self.size : needed] = ids
+        self.size = needed
+
+    def view(self):
+        size = self.size
+        return self.codes[:size], self.ids[:size]
+
+
+class IVFPQIndex:
+    def __init__(self, nlist=256, m=16, nbits=8, nprobe=8):
+        if nbits > 8:
+            raise ValueError("nbits above 8 is not supported (codes are uint8)")
+        self.nlist = nlist
+        self.m = m
+        self.ksub = 2 ** nbits
+        self.nprobe = nprobe
+        self.centroids = None
+        self.codebooks = None
+        self._centroid_norms = None
+        self._codebook_norms = None
+        self.lists = []
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def __len__(self):
+        return sum(lst.size for lst in self.lists)
+
+    def train(self, vectors, max_train=50_000, seed=0):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.shape[1] % self.m:
+            raise ValueError(f"dim {vectors.shape[1]} is not divisible by m={self.m}")
+        rng = np.random.default_rng(seed)
+        if len(vectors) > max_train:
+            vectors = vectors[rng.choice(len(vectors), max_train, replace=False)]
+
+        self.centroids = kmeans(vectors, self.nlist, seed=seed)
+        self.nlist = len(self.centroids)
+        self._centroid_norms = np.einsum("ij,ij->i", self.centroids, self.centroids)
+        residuals = vectors - self.centroids[assign(vectors, self.centroids)]
+
+        dsub = vectors.shape[1] // self.m
+        self.ksub = min(self.ksub, len(vectors))
+        self.codebooks = np.stack(
+            [
+                kmeans(residuals[:, i * dsub : (i + 1) * dsub], self.ksub, seed=seed + i)
+                for i in range(self.m)
+            ]
+        )
+        self._codebook_norms = np.einsum("mkd,mkd->mk", self.codebooks, self.codebooks)
+        self.lists = [_InvertedList(self.m) for _ in range(self.nlist)]
+
+    def add(self, vectors, ids):
+        """Encode and append vectors; no retraining is needed."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        labels = assign(vectors, self.centroids)
+        codes = self._encode(vectors - self.centroids[labels])
+        for label in np.unique(labels):
+            sel = labels == label
+            self.lists[label].append(codes[sel], ids[sel])
+
+    def remap(self, new_ids):
+        """Rewrite stored ids through ``new_ids`` (old id -> new id, -1 drops)."""
+        lists = []
+        for lst in self.lists:
+            codes, ids = lst.view()
+            mapped = new_ids[ids]
+            keep = mapped >= 0
+            fresh = _InvertedList(self.m, capacity=max(int(keep.sum()), 8))
+            fresh.append(codes[keep], mapped[keep])
+            lists.append(fresh)
+        self.lists = lists
+
+    def remapped(self, new_ids):
+        """A copy with ids rewritten through ``new_ids``; this index is left as is.
+
+        The trained centroids and codebooks are shared, the inverted lists are new.
+        """
+        clone = copy.copy(self)
+        clone.remap(new_ids)
+        return clone
+
+    def search(self, query, n_candidates, nprobe=None, lists=None):
+        """Ids of the ``n_candidates`` best vectors by approximate distance."""
+        lists = self.lists if lists is None else lists
+        query = np.asarray(query, dtype=np.float32).ravel()
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+
+        coarse = self._centroid_norms - 2.0 * (self.centroids @ query)
+        probe = np.argpartition(coarse, nprobe - 1)[:nprobe]
+
+        views = [lists[c].view() for c in probe]
+        sizes = [len(ids) for _, ids in views]
+        if sum(sizes) == 0:
+            return np.empty(0, dtype=np.int64)
+        codes = np.concatenate([codes for codes, _ in views])
+        ids = np.concatenate([ids for _, ids in views])
+        owner = np.repeat(np.arange(nprobe), sizes)
+
+        # One lookup table per probed list: ||r_sub - codeword||^2 for every
+        # sub-space and codeword, built for all lists in a single einsum.
+        dsub = len(query) // self.m
+        residuals = (query - self.centroids[probe]).reshape(nprobe, self.m, dsub)
+        tables = (
+            np.einsum("pmd,pmd->pm", residuals, residuals)[:, :, None]
+            - 2.0 * np.einsum("pmd,mkd->pmk", residuals, self.codebooks)
+            + self._codebook_norms[None]
+        )
+        dists = tables[owner[:, None], np.arange(self.m), codes].sum(axis=1)
+
+        if len(ids) > n_candidates:
+            keep = np.argpartition(dists, n_candidates - 1)[:n_candidates]
+            ids = ids[keep]
+        return ids
+
+    def _encode(self, residuals):
+        dsub = residuals.shape[1] // self.m
+        codes = np.empty((len(residuals), self.m), dtype=np.uint8)
+        for i in range(self.m):
+            codes[:, i] = assign(residuals[:, i * dsub : (i + 1) * dsub], self.codebooks[i])
+        return codes
@@ -1,11 +1,9 @@
 import os
-import base64
-import pickle
+import threading
 from datetime import datetime, time, timedelta
 
-import cv2
 import numpy as np
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory, stream_with_context
 from flask_pymongo import PyMongo
 from flask_cors import CORS
 from flask_jwt_extended import (
@@ -15,9 +13,33 @@ from flask_jwt_extended import (
     get_jwt_identity,
 )
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
 from dotenv import load_dotenv
 import traceback
 
+from attendance_sessions import session_for
+from burst_consensus import decide as decide_burst
+from face_gallery import FILTER_FIELDS, FaceGallery, Match
+from frame_buffers import worker_pool
+from frame_gate import FrameGate
+from image_io import (
+    ImageTooLargeError,
+    ImageUploadError,
+    decode_data_url,
+    read_file_part,
+    read_stream,
+)
+from concurrent.futures import as_completed
+from encode_pool import EncodePool, PoolBusyError
+from face_tracker import FaceTracker, TrackHint
+from face_pipeline import FrameJob, StageTimer, parse_tiers, run_frame, tier_label
+from frame_cache import FrameCache
+from gallery_store import GalleryStore
+from identity_cache import RecentIdentityCache
+from match_batcher import MatchBatcher
+from shared_gallery import SharedGallery
+from video_stream import iter_jpeg_frames
+
 # ====== LOAD ENV ======
 load_dotenv()
 
@@ -46,14 +68,141 @@ CORS(
 )
 
 app.config["UPLOAD_FOLDER"] = "static_uploads"
-app.config["ENCODINGS_FILE"] = "face_encodings.pkl"
+app.config["ENCODINGS_FILE"] = "face_encodings.pkl"  # legacy, migrated on startup
+app.config["GALLERY_DIR"] = os.getenv("GALLERY_DIR", "face_gallery")
+app.config["GALLERY_VERIFY_CHECKSUM"] = os.getenv("GALLERY_VERIFY_CHECKSUM", "1") == "1"
+# Fold the enrollment journal into a new snapshot once it grows past this.
+app.config["JOURNAL_COMPACT_BYTES"] = int(os.getenv("JOURNAL_COMPACT_BYTES", str(4 * 1024 * 1024)))
+# Deleted students are tombstoned in memory; compact once this share of rows is dead.
+app.config["GALLERY_COMPACT_DEAD_FRACTION"] = float(os.getenv("GALLERY_COMPACT_DEAD_FRACTION", "0.25"))
+# Publish the gallery in shared memory so every worker process maps one copy
+# and sees enrollments from the others within SHARED_GALLERY_POLL_SECONDS.
+app.config["SHARED_GALLERY"] = os.getenv("SHARED_GALLERY", "0") == "1"
+app.config["SHARED_GALLERY_POLL_SECONDS"] = float(os.getenv("SHARED_GALLERY_POLL_SECONDS", "1.0"))
+# Reload the gallery when its files change on disk (offline rebuild, restored
+# backup, another process); 0 disables the watcher, the admin endpoint still works.
+app.config["GALLERY_RELOAD_POLL_SECONDS"] = float(os.getenv("GALLERY_RELOAD_POLL_SECONDS", "5"))
+# Face detection runs on a copy shrunk to DETECT_MAX_SIDE pixels (or by
+# DETECT_SCALE when set); encodings are still computed on the full frame.
+app.config["DETECT_MAX_SIDE"] = int(os.getenv("DETECT_MAX_SIDE", "320"))
+app.config["DETECT_SCALE"] = float(os.getenv("DETECT_SCALE", "0"))
+app.config["DETECT_UPSAMPLE"] = int(os.getenv("DETECT_UPSAMPLE", "1"))
+app.config["DETECT_MODEL"] = os.getenv("DETECT_MODEL", "hog").lower()
+# mark_attendance tries these "max_side:upsample" passes cheapest first and
+# escalates only when no face was found and the next pass fits the budget.
+app.config["DETECT_TIERS"] = parse_tiers(os.getenv("DETECT_TIERS", "240:0,320:0,320:1"))
+app.config["DETECT_BUDGET_MS"] = float(os.getenv("DETECT_BUDGET_MS", "500"))
+# Quality gate in front of detection: reject blurry, dark/bright or flat frames
+# (and, with GATE_HAAR=1, frames without a Haar face candidate) in a few ms.
+app.config["GATE_ENABLED"] = os.getenv("GATE_ENABLED", "1") == "1"
+app.config["GATE_MIN_SHARPNESS"] = float(os.getenv("GATE_MIN_SHARPNESS", "15"))
+app.config["GATE_MIN_BRIGHTNESS"] = float(os.getenv("GATE_MIN_BRIGHTNESS", "40"))
+app.config["GATE_MAX_BRIGHTNESS"] = float(os.getenv("GATE_MAX_BRIGHTNESS", "220"))
+app.config["GATE_MIN_CONTRAST"] = float(os.getenv("GATE_MIN_CONTRAST", "12"))
+app.config["GATE_HAAR"] = os.getenv("GATE_HAAR", "0") == "1"
+# Classroom photos for /api/roll_call: faces are small, so detection runs on a
+# larger copy with upsampling, and JPEGs are only reduced down to
+# ROLL_CALL_DECODE_SIDE so encodings keep enough detail.
+app.config["ROLL_CALL_MAX_SIDE"] = int(os.getenv("ROLL_CALL_MAX_SIDE", "1280"))
+app.config["ROLL_CALL_UPSAMPLE"] = int(os.getenv("ROLL_CALL_UPSAMPLE", "1"))
+app.config["ROLL_CALL_DECODE_SIDE"] = int(os.getenv("ROLL_CALL_DECODE_SIDE", "2048"))
+app.config["MATCH_THRESHOLD"] = float(os.getenv("MATCH_THRESHOLD", "0.6"))
+# mark_attendance also takes a burst of up to BURST_MAX_FRAMES frames (several
+# multipart "image" parts or a JSON "images" list), decided by one vote; a
+# frame closer than BURST_CONFIDENT_DISTANCE decides it on its own.
+app.config["BURST_MAX_FRAMES"] = int(os.getenv("BURST_MAX_FRAMES", "5"))
+app.config["BURST_CONFIDENT_DISTANCE"] = float(os.getenv("BURST_CONFIDENT_DISTANCE", "0.45"))
+# /api/stream_attendance (MJPEG upload): detect on every Nth frame, follow faces
+# between passes by IoU, encode each track until identified (at most N times).
+app.config["STREAM_DETECT_EVERY"] = int(os.getenv("STREAM_DETECT_EVERY", "2"))
+app.config["STREAM_TRACK_IOU"] = float(os.getenv("STREAM_TRACK_IOU", "0.3"))
+app.config["STREAM_TRACK_MAX_MISSED"] = int(os.getenv("STREAM_TRACK_MAX_MISSED", "5"))
+app.config["STREAM_TRACK_MAX_ENCODINGS"] = int(os.getenv("STREAM_TRACK_MAX_ENCODINGS", "3"))
+app.config["STREAM_MAX_FRAME_BYTES"] = int(os.getenv("STREAM_MAX_FRAME_BYTES", str(2 * 1024 * 1024)))
+# Concurrent mark_attendance lookups are answered together: a request waits up
+# to MATCH_BATCH_WAIT_MS for others (max MATCH_BATCH_SIZE) and the batch is
+# scored with one matrix-matrix product.  0 ms matches each request directly.
+app.config["MATCH_BATCH_WAIT_MS"] = float(os.getenv("MATCH_BATCH_WAIT_MS", "2"))
+app.config["MATCH_BATCH_SIZE"] = int(os.getenv("MATCH_BATCH_SIZE", "32"))
+# Per-kiosk memory of recent matches (TTL 0 disables): a repeat attempt this
+# close to one reuses its identity and already-marked status.
+app.config["IDENTITY_CACHE_TTL_SECONDS"] = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "20"))
+app.config["IDENTITY_CACHE_DISTANCE"] = float(os.getenv("IDENTITY_CACHE_DISTANCE", "0.35"))
+# Resubmitted kiosk frames (double clicks, retries) reuse the previous pipeline
+# result within this window (0 disables); LRU-bounded to FRAME_CACHE_SIZE frames.
+app.config["FRAME_CACHE_WINDOW_SECONDS"] = float(os.getenv("FRAME_CACHE_WINDOW_SECONDS", "10"))
+app.config["FRAME_CACHE_SIZE"] = int(os.getenv("FRAME_CACHE_SIZE", "256"))
+# Large JPEGs decode at 1/2, 1/4 or 1/8 scale while the long side stays at or
+# above DECODE_TARGET_SIDE (keep it >= the biggest detection size; 0 = off).
+# Images over DECODE_MAX_PIXELS are refused from their header, before decoding.
+app.config["DECODE_TARGET_SIDE"] = int(os.getenv("DECODE_TARGET_SIDE", "640"))
+app.config["DECODE_MAX_PIXELS"] = int(os.getenv("DECODE_MAX_PIXELS", str(40_000_000)))
+# Decode/detect/encode run in ENCODE_WORKERS processes (default: one per core;
+# 0 keeps them on request threads).  At most ENCODE_QUEUE frames are in flight,
+# each passed through a shared-memory slot of ENCODE_SLOT_BYTES; beyond that
+# recognition endpoints answer 429 with Retry-After.
+app.config["ENCODE_WORKERS"] = int(os.getenv("ENCODE_WORKERS", str(os.cpu_count() or 1)))
+app.config["ENCODE_QUEUE"] = int(os.getenv("ENCODE_QUEUE", "0")) or 2 * app.config["ENCODE_WORKERS"]
+app.config["ENCODE_SLOT_BYTES"] = int(os.getenv("ENCODE_SLOT_BYTES", str(4 * 1024 * 1024)))
+app.config["ENCODE_TIMEOUT_SECONDS"] = float(os.getenv("ENCODE_TIMEOUT_SECONDS", "30"))
+# Reuse per-thread buffers for upload bytes and resized/grayscale frames.
+app.config["FRAME_POOL"] = os.getenv("FRAME_POOL", "1") == "1"
 app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024
+# Only match kiosk frames against faces enrolled in the request's branch.
+app.config["MATCH_WITHIN_BRANCH"] = os.getenv("MATCH_WITHIN_BRANCH", "0") == "1"
+# A kiosk that names the student (admission_no) gets a 1:1 check against that
+# student's templates only; a mismatch is refused unless VERIFY_FALLBACK (or
+# the request's "fallback" field) asks for the usual 1:N search instead.
+app.config["VERIFY_FALLBACK"] = os.getenv("VERIFY_FALLBACK", "0") == "1"
+# Gallery search index: "exact" (brute force), "ann" (IVF-PQ, approximate)
+# or "vptree" (metric tree, exact with pruning).
+app.config["GALLERY_INDEX"] = os.getenv("GALLERY_INDEX", "exact").lower()
+app.config["INDEX_MIN_FACES"] = int(os.getenv("INDEX_MIN_FACES", "20000"))
+app.config["ANN_NPROBE"] = int(os.getenv("ANN_NPROBE", "8"))
+app.config["ANN_RERANK"] = int(os.getenv("ANN_RERANK", "64"))
+# Scan precision for brute-force matching: "float32", "float16" or "int8".
+app.config["GALLERY_STORAGE"] = os.getenv("GALLERY_STORAGE", "float32").lower()
 os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
 
 # === JWT config ===
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "super-secret-dev-key")
 jwt = JWTManager(app)
 
+# ====== RECOGNITION WORKERS ======
+def gate_options():
+    if not app.config["GATE_ENABLED"]:
+        return None
+    return dict(
+        min_sharpness=app.config["GATE_MIN_SHARPNESS"],
+        min_brightness=app.config["GATE_MIN_BRIGHTNESS"],
+        max_brightness=app.config["GATE_MAX_BRIGHTNESS"],
+        min_contrast=app.config["GATE_MIN_CONTRAST"],
+        haar=app.config["GATE_HAAR"],
+    )
+
+
+# Only the process that serves requests starts workers, loads the gallery and
+# runs background threads.  Encode workers started with "spawn" (the Windows
+# default) re-import this file as __mp_main__, and `python app.py` imports it
+# once more in the debug reloader's parent, which only watches for changes.
+SERVING_PROCESS = __name__ != "__mp_main__" and not (
+    __name__ == "__main__" and os.environ.get("WERKZEUG_RUN_MAIN") != "true"
+)
+
+# Created before Mongo or any background thread exists, so forking is safe.
+encode_pool = None
+if SERVING_PROCESS and app.config["ENCODE_WORKERS"] > 0:
+    try:
+        encode_pool = EncodePool(
+            workers=app.config["ENCODE_WORKERS"],
+            max_queue=app.config["ENCODE_QUEUE"],
+            slot_bytes=app.config["ENCODE_SLOT_BYTES"],
+            gate_options=gate_options(),
+        )
+        print(f"✅ Started {encode_pool.workers} encode workers (queue {encode_pool.max_queue})")
+    except Exception as e:
+        print("⚠️ Encode workers unavailable, encoding on request threads:", e)
+
 # MongoDB configuration
 app.config["MONGO_URI"] = os.getenv(
     "MONGO_URI", "mongodb://localhost:27017/smart_attendance_db"
@@ -62,9 +211,16 @@ mongo = PyMongo(app)
 db = mongo.db
 
 # ====== GLOBAL FACE DATA ======
-known_encodings = np.array([])
-known_admission_nos = []
-known_names = []
+gallery = FaceGallery(storage=app.config["GALLERY_STORAGE"])
+gallery_store = GalleryStore(app.config["GALLERY_DIR"], shared=app.config["SHARED_GALLERY"])
+shared_gallery = None
+if app.config["SHARED_GALLERY"]:
+    shared_gallery = SharedGallery(
+        gallery_store,
+        storage=app.config["GALLERY_STORAGE"],
+        poll_interval=app.config["SHARED_GALLERY_POLL_SECONDS"],
+        verify=app.config["GALLERY_VERIFY_CHECKSUM"],
+    )
 
 # ====== DB INIT (Mongo) ======
 def init_db():
@@ -92,19 +248,7 @@ def init_db():
 
 # ====== ATTENDANCE SESSION FUNCTIONS ======
 def get_current_session():
-    now = datetime.now()
-    current_time = now.time()
-
-    am_start = time(9, 0)
-    am_end = time(13, 0)
-    pm_start = time(14, 0)
-    pm_end = time(17, 0)
-
-    if am_start <= current_time <= am_end:
-        return "AM"
-    elif pm_start <= current_time <= pm_end:
-        return "PM"
-    return None
+    return session_for(datetime.now())
 
 
 def can_mark_attendance(admission_no, branch, session_type):
@@ -134,69 +278,608 @@ def can_mark_attendance(admission_no, branch, session_type):
         }
     )
     if existing:
-        return False, f"Attendance already marked for {session_type} session today"
+        return False, already_marked_message(session_type)
 
     return True, "Can mark attendance"
 
+
+def already_marked_message(session_type):
+    return f"Attendance already marked for {session_type} session today"
+
 # ====== FACE ENCODINGS HELPERS ======
 def load_encodings():
-    global known_encodings, known_admission_nos, known_names
+    global gallery
     encodings_file = app.config["ENCODINGS_FILE"]
-    if os.path.exists(encodings_file):
+    try:
+        if not gallery_store.exists() and os.path.exists(encodings_file):
+            count = gallery_store.migrate_pickle(encodings_file)
+            print(f"📦 Migrated {count} encodings from {encodings_file} to {gallery_store.directory}/")
+
+        if shared_gallery is not None:
+            gallery = shared_gallery.open()
+            print(f"✅ Mapped {len(gallery)} shared face encodings (v{shared_gallery.version})")
+        elif gallery_store.exists():
+            gallery = gallery_store.load(
+                storage=app.config["GALLERY_STORAGE"],
+                verify=app.config["GALLERY_VERIFY_CHECKSUM"],
+            )
+            print(f"✅ Loaded {len(gallery)} face encodings")
+        else:
+            print("ℹ️ No encodings file found")
+    except Exception as e:
+        print("⚠️ Error loading encodings:", e)
+        gallery = FaceGallery(storage=app.config["GALLERY_STORAGE"])
+
+
+def current_gallery():
+    # In shared mode, pick up versions published by other workers; each one
+    # inherits the index of the one before (see index_gallery).
+    global gallery
+    if shared_gallery is not None:
+        latest = shared_gallery.current()
+        if latest is not gallery:
+            gallery = latest
+            threading.Thread(target=maybe_build_index, daemon=True).start()
+    return gallery
+
+
+def add_gallery_face(encoding, admission_no, name, metadata):
+    if shared_gallery is not None:
+        row = shared_gallery.add(encoding, admission_no, name, metadata)
+        current_gallery()
+        return row
+    with gallery_store.lock:  # read the global only once a reload can't swap it
+        return gallery_store.add(gallery, encoding, admission_no, name, metadata)
+
+
+def remove_gallery_faces(admission_no):
+    if shared_gallery is not None:
+        removed = shared_gallery.remove(admission_no)
+        current_gallery()
+        return removed
+    with gallery_store.lock:
+        return gallery_store.remove(gallery, admission_no)
+
+
+compaction_lock = threading.Lock()
+
+
+def compact_gallery():
+    if not compaction_lock.acquire(blocking=False):
+        return  # a compaction is already running
+    try:
+        if gallery_is_stale():
+            return  # changed on disk; let the reload pick it up instead of overwriting it
+        if shared_gallery is not None:
+            generation = shared_gallery.compact()
+            print(f"🗜️ Compacted shared gallery journal into generation {generation}")
+            return
+        with gallery_store.lock:
+            target = gallery
+        reclaimed = target.compact()
+        if reclaimed:
+            print(f"🗜️ Reclaimed {reclaimed} tombstoned gallery rows")
+        generation = gallery_store.compact(target)
+        print(f"🗜️ Compacted gallery journal into generation {generation}")
+    except Exception as e:
+        print("⚠️ Gallery compaction failed:", e)
+    finally:
+        compaction_lock.release()
+
+
+def maybe_compact_gallery():
+    if (
+        gallery_store.journal_size() >= app.config["JOURNAL_COMPACT_BYTES"]
+        or gallery.dead_fraction >= app.config["GALLERY_COMPACT_DEAD_FRACTION"]
+    ):
+        threading.Thread(target=compact_gallery, daemon=True).start()
+
+
+reload_lock = threading.Lock()
+
+
+def gallery_is_stale():
+    if shared_gallery is not None:
+        return shared_gallery.is_stale()
+    return gallery_store.is_stale()
+
+
+def reload_gallery(force=False):
+    # Runs off the request path; in-flight requests keep the gallery they started with.
+    global gallery, indexed_gallery
+    if not reload_lock.acquire(blocking=False):
+        return False  # a reload is already running
+    try:
+        with compaction_lock:  # never fold a stale in-memory gallery over fresh files
+            if shared_gallery is not None:
+                if not shared_gallery.reload(force=force):
+                    return False
+                indexed_gallery = None  # rebuilt from scratch after a reload
+                current_gallery()
+            else:
+                with gallery_store.lock:  # no enrollment can land between load and swap
+                    if not force and not gallery_store.is_stale():
+                        return False
+                    gallery = gallery_store.load(
+                        storage=app.config["GALLERY_STORAGE"],
+                        verify=app.config["GALLERY_VERIFY_CHECKSUM"],
+                    )
+                    indexed_gallery = None
+        print(f"🔄 Reloaded {len(gallery)} face encodings from disk")
+        sync_gallery_metadata()
+        maybe_build_index()
+        return True
+    except Exception as e:
+        print("⚠️ Gallery reload failed, keeping the current gallery:", e)
+        return False
+    finally:
+        reload_lock.release()
+
+
+gallery_watch_stop = threading.Event()
+
+
+def watch_gallery(interval):
+    while not gallery_watch_stop.wait(interval):
         try:
-            with open(encodings_file, "rb") as f:
-                data = pickle.load(f)
-            encs = data.get("encodings", [])
-            known_encodings = np.array(encs) if len(encs) > 0 else np.array([])
-            known_admission_nos = data.get("admission_nos", [])
-            known_names = data.get("names", [])
-            print(f"✅ Loaded {len(known_encodings)} face encodings")
+            if gallery_is_stale():
+                reload_gallery()
         except Exception as e:
-            print("⚠️ Error loading encodings:", e)
-            known_encodings = np.array([])
-            known_admission_nos = []
-            known_names = []
-    else:
-        print("ℹ️ No encodings file found")
+            print("⚠️ Gallery watcher error:", e)
+
+
+index_build_lock = threading.Lock()
+index_wanted = threading.Event()
+# Last gallery that got an index; the versions that replace it inherit it.
+indexed_gallery = None
 
 
-def save_encodings():
+def maybe_build_index():
+    if app.config["GALLERY_INDEX"] not in ("ann", "vptree"):
+        return
+    index_wanted.set()
+    while index_wanted.is_set():
+        if not index_build_lock.acquire(blocking=False):
+            return  # the running build picks up the newer gallery when done
+        try:
+            while index_wanted.is_set():
+                index_wanted.clear()
+                index_gallery(gallery)
+        finally:
+            index_build_lock.release()
+
+
+def index_gallery(target):
+    global indexed_gallery
+    if target.ann is not None or target.tree is not None:
+        indexed_gallery = target
+        return
+    if len(target) < app.config["INDEX_MIN_FACES"]:
+        return
     try:
-        data = {
-            "encodings": [enc.tolist() for enc in known_encodings],
-            "admission_nos": known_admission_nos,
-            "names": known_names,
-        }
-        with open(app.config["ENCODINGS_FILE"], "wb") as f:
-            pickle.dump(data, f)
-        print(f"💾 Saved {len(known_encodings)} encodings")
+        # A version published by another worker is the previous one plus or
+        # minus a few students: update its index rather than retrain.
+        if indexed_gallery is not None and target.inherit_indexes(indexed_gallery):
+            indexed_gallery = target
+            return
+        if app.config["GALLERY_INDEX"] == "ann":
+            index = target.build_ann(
+                nprobe=app.config["ANN_NPROBE"], rerank=app.config["ANN_RERANK"]
+            )
+            if index is not None:
+                print(f"✅ ANN index built: {index.nlist} lists over {len(index)} faces")
+        else:
+            tree = target.build_tree()
+            if tree is not None:
+                print(f"✅ VP-tree index built over {len(tree)} faces")
+        if target.ann is not None or target.tree is not None:
+            indexed_gallery = target
     except Exception as e:
-        print("⚠️ Error saving encodings:", e)
+        print("⚠️ Gallery index build failed, using exact search:", e)
 
 
-def cleanup_deleted_faces():
-    global known_encodings, known_admission_nos, known_names
+def student_metadata(student):
+    student = student or {}
+    return {field: student.get(field, "") for field in FILTER_FIELDS}
+
+
+def sync_gallery_metadata():
+    # Refresh branch/semester/specialization used by filtered matching.
+    try:
+        admission_nos = list({adm for adm, _ in gallery.identities()})
+        projection = {"admission_no": 1, **{field: 1 for field in FILTER_FIELDS}}
+        students = db.students.find({"admission_no": {"$in": admission_nos}}, projection)
+        metadata = {s["admission_no"]: student_metadata(s) for s in students}
+        if shared_gallery is not None:
+            shared_gallery.update(lambda latest: latest.set_metadata(metadata))
+            current_gallery()
+        else:
+            gallery.set_metadata(metadata)
+    except Exception as e:
+        print("⚠️ Could not sync gallery metadata:", e)
 
-    active_students = {
-        s["admission_no"] for s in db.students.find({}, {"admission_no": 1})
+
+def match_filters(data, branch):
+    where = {
+        "semester": data.get("semester") or None,
+        "specialization": data.get("specialization") or None,
+        "admission_no": data.get("roster") or None,
     }
-    deleted_indices = [
-        i for i, adm in enumerate(known_admission_nos) if adm not in active_students
-    ]
+    if request_flag(data, "match_within_branch", app.config["MATCH_WITHIN_BRANCH"]) and branch:
+        where["branch"] = branch
+    return where
+
+
+def request_flag(data, key, default):
+    value = data.get(key, default)
+    if isinstance(value, str):  # query-string / form field
+        value = value.lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def remove_student_faces(admission_no):
+    # Tombstones only this student's rows via the admission_no index.
+    removed = remove_gallery_faces(admission_no)
+    if identity_cache is not None:
+        identity_cache.forget(admission_no)
+    if removed:
+        print(f"🗑️ REMOVED: {removed} face(s) for {admission_no}")
+    maybe_compact_gallery()
+    return removed
+
 
-    for idx in reversed(deleted_indices):
-        print(f"🗑️ REMOVED: {known_names[idx]} ({known_admission_nos[idx]})")
-        known_encodings = np.delete(known_encodings, idx, axis=0)
-        del known_admission_nos[idx]
-        del known_names[idx]
+def cleanup_deleted_faces():
+    # Startup reconciliation for students deleted outside the API.
+    try:
+        active_students = {
+            s["admission_no"] for s in db.students.find({}, {"admission_no": 1})
+        }
+        deleted = {
+            adm: name for adm, name in gallery.identities() if adm not in active_students
+        }
+
+        removed = 0
+        for adm, name in deleted.items():
+            print(f"🗑️ REMOVED: {name} ({adm})")
+            removed += remove_gallery_faces(adm)
 
-    save_encodings()
-    print(f"✅ Cleanup complete: {len(deleted_indices)} deleted faces removed")
+        maybe_compact_gallery()
+        print(f"✅ Cleanup complete: {removed} deleted faces removed")
+    except Exception as e:
+        print("⚠️ Could not clean up deleted faces:", e)
 
 # ====== INITIALIZE ======
-print("🔧 Initializing MongoDB...")
-init_db()
-load_encodings()
+if SERVING_PROCESS:
+    print("🔧 Initializing MongoDB...")
+    init_db()
+    load_encodings()
+    if shared_gallery is None or shared_gallery.initialized:
+        # Once per deployment: later workers map what the first one published.
+        cleanup_deleted_faces()
+        sync_gallery_metadata()
+    maybe_build_index()
+    if app.config["GALLERY_RELOAD_POLL_SECONDS"] > 0:
+        threading.Thread(
+            target=watch_gallery, args=(app.config["GALLERY_RELOAD_POLL_SECONDS"],), daemon=True
+        ).start()
+
+# ====== RECOGNITION PIPELINE ======
+def request_timer():
+    # Per-request stage timings, reported back in a Server-Timing header.
+    g.timer = StageTimer()
+    return g.timer
+
+
+def request_pool():
+    # Buffers are per thread, so nothing from the pool may outlive the request.
+    return worker_pool() if app.config["FRAME_POOL"] else None
+
+
+# What each endpoint asks of the decode -> gate -> detect -> encode pipeline.
+enroll_job = FrameJob(
+    target_side=app.config["DECODE_TARGET_SIDE"],
+    max_pixels=app.config["DECODE_MAX_PIXELS"],
+    gate=False,
+    tiers=None,
+    budget_ms=None,
+    max_side=app.config["DETECT_MAX_SIDE"],
+    scale=app.config["DETECT_SCALE"],
+    upsample=app.config["DETECT_UPSAMPLE"],
+    model=app.config["DETECT_MODEL"],
+)
+kiosk_job = enroll_job._replace(
+    gate=True, tiers=app.config["DETECT_TIERS"], budget_ms=app.config["DETECT_BUDGET_MS"]
+)
+stream_job = enroll_job._replace(tracks=TrackHint(app.config["STREAM_TRACK_IOU"], (), ()))
+roll_call_job = enroll_job._replace(
+    target_side=app.config["ROLL_CALL_DECODE_SIDE"],
+    max_side=app.config["ROLL_CALL_MAX_SIDE"],
+    scale=None,
+    upsample=app.config["ROLL_CALL_UPSAMPLE"],
+)
+
+
+def process_frame(img_bytes, job, timer):
+    """FrameResult for an upload, from the encode workers when they run."""
+    if encode_pool is not None:
+        return encode_pool.run(
+            img_bytes, job, timer, timeout=app.config["ENCODE_TIMEOUT_SECONDS"]
+        )
+    return run_frame(img_bytes, job, frame_gate, timer, request_pool())
+
+
+def iter_frames(frames, job, timer):
+    """(index, FrameResult) for several uploads, as they finish.
+
+    Closing the generator early cancels frames that have not started yet.
+    """
+    if encode_pool is None:
+        for i, buf in enumerate(frames):
+            yield i, run_frame(buf, job, frame_gate, timer, request_pool())
+        return
+
+    pending = {}
+    try:
+        for i, buf in enumerate(frames):
+            try:
+                frame = encode_pool.submit(buf, job)
+            except PoolBusyError:
+                if not pending:
+                    raise
+                break  # work with the frames that got a slot
+            pending[frame.future] = (i, frame)
+        timeout = app.config["ENCODE_TIMEOUT_SECONDS"]
+        for future in as_completed(list(pending), timeout=timeout):
+            i, frame = pending.pop(future)
+            yield i, frame.result(timer)
+    finally:
+        for _, frame in pending.values():
+            frame.cancel()
+
+
+frame_cache = None
+if app.config["FRAME_CACHE_WINDOW_SECONDS"] > 0:
+    frame_cache = FrameCache(
+        max_entries=app.config["FRAME_CACHE_SIZE"],
+        window_seconds=app.config["FRAME_CACHE_WINDOW_SECONDS"],
+        max_pixels=app.config["DECODE_MAX_PIXELS"],
+    )
+
+
+def iter_kiosk_frames(frames, timer, device):
+    """(FrameResult, duplicate) for kiosk uploads, as they finish.
+
+    Frames this device already sent within the cache window come back
+    first, from the cache, without being decoded again.
+    """
+    if frame_cache is None:
+        for _, result in iter_frames(frames, kiosk_job, timer):
+            yield result, False
+        return
+
+    todo, keys = [], []
+    for buf in frames:
+        with timer.stage("frame_cache"):
+            cached, key = frame_cache.lookup(buf, device)
+        if cached is not None:
+            yield cached, True
+        else:
+            todo.append(buf)
+            keys.append(key)
+    for i, result in iter_frames(todo, kiosk_job, timer):
+        frame_cache.store(keys[i], result)
+        yield result, False
+
+
+def busy_response(e):
+    response = jsonify({"success": False, "error": "Server busy - Try again in a moment"})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 429
+
+
+def read_upload_request(multi=False):
+    """(image bytes, fields) from a raw image body, a multipart part or JSON.
+
+    With ``multi`` the first item is a list of frames instead: every
+    multipart ``image`` part, or the JSON ``images`` list.
+    """
+    mimetype = request.mimetype or ""
+    if mimetype.startswith("image/") or mimetype == "application/octet-stream":
+        fields = plain_fields(request.args)
+        if request.content_length is not None:
+            length = request.content_length
+            pool = request_pool()
+            out = pool.byte_buffer("upload", length) if pool is not None else None
+            frames = [read_stream(request.stream, length, out=out)]
+        else:  # chunked upload; still bounded by MAX_CONTENT_LENGTH
+            frames = [np.frombuffer(request.get_data(cache=False), dtype=np.uint8)]
+    elif mimetype == "multipart/form-data":
+        form = request.form.copy()
+        form.update(request.args)
+        fields = plain_fields(form)
+        parts = request.files.getlist("image")
+        frames = [read_file_part(part) for part in (parts if multi else parts[:1])]
+    else:
+        fields = request.get_json(silent=True) or {}
+        images = (fields.get("images") or []) if multi else []
+        if not images and fields.get("image"):
+            images = [fields["image"]]
+        frames = [decode_data_url(image) for image in images]
+
+    if multi:
+        return frames, fields
+    return (frames[0] if frames else None), fields
+
+
+def plain_fields(multidict):
+    # Repeated keys (e.g. roster=A&roster=B) become lists.
+    values = multidict.to_dict(flat=False)
+    return {key: v[0] if len(v) == 1 else v for key, v in values.items()}
+
+
+pipeline_stats_lock = threading.Lock()
+pipeline_stats = {"detection_tiers": {}, "gate": {}, "burst": {}, "stream": {}, "verification": {}}
+
+GATE_MESSAGES = {
+    "too_blurry": "Image too blurry - Hold still and try again",
+    "too_dark": "Image too dark - Try better lighting",
+    "too_bright": "Image too bright - Avoid direct light on the camera",
+    "low_contrast": "Image has no detail - Check the camera",
+    "no_face_candidate": "No face detected - Look at the camera",
+}
+
+
+def create_frame_gate():
+    options = gate_options()
+    if options is None or encode_pool is not None:
+        return None  # the encode workers build their own
+    try:
+        return FrameGate(**options)
+    except ValueError as e:
+        print("⚠️ Haar face check disabled:", e)
+        options.pop("haar")
+        return FrameGate(**options)
+
+
+frame_gate = create_frame_gate()
+
+
+match_batcher = None
+if app.config["MATCH_BATCH_WAIT_MS"] > 0:
+    match_batcher = MatchBatcher(
+        current_gallery,
+        max_batch=app.config["MATCH_BATCH_SIZE"],
+        max_wait_ms=app.config["MATCH_BATCH_WAIT_MS"],
+    )
+
+
+def match_face(encoding, where):
+    if match_batcher is None:
+        return current_gallery().nearest(encoding, where=where)
+    return match_batcher.nearest(encoding, where)
+
+
+identity_cache = None
+if app.config["IDENTITY_CACHE_TTL_SECONDS"] > 0:
+    identity_cache = RecentIdentityCache(
+        ttl_seconds=app.config["IDENTITY_CACHE_TTL_SECONDS"],
+        max_distance=app.config["IDENTITY_CACHE_DISTANCE"],
+    )
+
+
+def device_id(data):
+    # Kiosks send a stable id; otherwise every client address is its own device.
+    return data.get("device_id") or request.headers.get("X-Device-Id") or request.remote_addr
+
+
+def recall_identity(device, encoding, where, timer, claimed=None):
+    """CacheHit if ``device`` matched this face seconds ago, else None."""
+    if identity_cache is None:
+        return None
+    with timer.stage("cache"):
+        return identity_cache.lookup(device, encoding, where, admission_no=claimed)
+
+
+def verify_claim(encoding, claimed, where, timer):
+    """1:1 Match against the student the kiosk named (None if not enrolled)."""
+    with timer.stage("verify"):
+        return current_gallery().verify(encoding, claimed, where)
+
+
+def recognize_burst(frames, where, timer, device, claimed=None):
+    """(Match or None, its encoding, CacheHit or None, burst summary) for
+    several frames of one student.
+
+    With ``claimed`` every frame is only compared with that student.
+    """
+    burst = {"frames": len(frames), "processed": 0, "duplicates": 0, "faces": 0, "rejected": {}}
+    encodings, matches = [], []
+    decided = cached = None
+    for result, duplicate in iter_kiosk_frames(frames, timer, device):
+        burst["processed"] += 1
+        burst["duplicates"] += duplicate
+        verdict = result.verdict
+        if not result.decoded or (verdict is not None and not verdict.ok):
+            reason = verdict.reason if result.decoded else "invalid_image"
+            count_stat("gate", reason)
+            burst["rejected"][reason] = burst["rejected"].get(reason, 0) + 1
+            continue
+        if verdict is not None:
+            count_stat("gate", "passed")
+        detection_info(result)
+        if not result.encodings:
+            continue
+        cached = recall_identity(device, result.encodings[0], where, timer, claimed)
+        if cached is not None:
+            encodings.append(result.encodings[0])
+            decided = cached.match
+            break
+        if claimed:
+            match = verify_claim(result.encodings[0], claimed, where, timer)
+        else:
+            with timer.stage("match"):
+                match = match_face(result.encodings[0], where)
+        if match is None:
+            continue
+        encodings.append(result.encodings[0])
+        matches.append(match)
+        if match.distance <= app.config["BURST_CONFIDENT_DISTANCE"]:
+            decided = match  # confident enough; skip the remaining frames
+            break
+    burst["faces"] = len(encodings)
+
+    encoding = encodings[-1] if encodings else None
+    if cached is not None:
+        burst["decided_by"] = "cache"
+    elif decided is not None:
+        burst["decided_by"] = "early_exit"
+    elif matches:
+        with timer.stage("vote"):
+            decision = decide_burst(
+                current_gallery(), encodings, matches, app.config["MATCH_THRESHOLD"]
+            )
+        burst["decided_by"] = "vote"
+        burst["candidates"] = decision.candidates[:3]
+        if decision.admission_no is not None:
+            decided = Match(None, decision.admission_no, decision.name, decision.distance)
+            # The frame closest to the winner is the one worth caching.
+            _, best = min(
+                (m.distance, i) for i, m in enumerate(matches)
+                if m.admission_no == decision.admission_no
+            )
+            encoding = encodings[best]
+    else:
+        burst["decided_by"] = "no_face"
+    count_stat("burst", burst["decided_by"] if decided is not None else "undecided")
+    return decided, encoding, cached, burst
+
+
+def count_stat(group, key):
+    with pipeline_stats_lock:
+        counts = pipeline_stats[group]
+        counts[key] = counts.get(key, 0) + 1
+
+
+def detection_info(result):
+    if result.tier is not None:
+        label = tier_label(app.config["DETECT_TIERS"][result.tier])
+    else:
+        label = "budget_exhausted" if result.budget_exhausted else "no_face"
+    count_stat("detection_tiers", label)
+    return {
+        "tier": result.tier,
+        "tier_label": label,
+        "tiers_tried": result.tiers_tried,
+    }
+
+
+@app.after_request
+def add_server_timing(response):
+    timer = g.get("timer")
+    if timer is not None and timer.stages:
+        response.headers["Server-Timing"] = timer.server_timing()
+    return response
+
 
 # ====== BASIC + AUTH ROUTES ======
 @app.route("/")
@@ -206,15 +889,33 @@ def index():
 
 @app.route("/api/test_encodings")
 def test_encodings():
+    gallery = current_gallery()
     return jsonify(
         {
-            "known_faces_count": len(known_encodings),
-            "known_students": list(zip(known_names, known_admission_nos)),
-            "encodings_loaded": bool(len(known_encodings) > 0),
+            "known_faces_count": len(gallery),
+            "known_students": [[name, adm] for adm, name in gallery.identities()],
+            "encodings_loaded": bool(len(gallery) > 0),
+            "memory": gallery.memory_footprint(),
         }
     )
 
 
+@app.route("/api/pipeline_stats")
+def get_pipeline_stats():
+    # Counters since this worker started, for tuning the recognition pipeline.
+    with pipeline_stats_lock:
+        stats = {group: dict(counts) for group, counts in pipeline_stats.items()}
+    if match_batcher is not None:
+        stats["match_batches"] = match_batcher.stats()
+    if encode_pool is not None:
+        stats["encode_pool"] = encode_pool.stats()
+    if identity_cache is not None:
+        stats["identity_cache"] = identity_cache.stats()
+    if frame_cache is not None:
+        stats["frame_cache"] = frame_cache.stats()
+    return jsonify(stats)
+
+
 @app.route("/api/stats")
 @jwt_required(optional=True)
 def stats():
@@ -493,7 +1194,7 @@ def delete_student():
 
         if deleted:
             db.attendance.delete_many({"admission_no": admission_no})
-            cleanup_deleted_faces()
+            remove_student_faces(admission_no)
             return jsonify(
                 {"success": True, "message": "Student deleted successfully!"}
             )
@@ -537,12 +1238,13 @@ def enroll_face():
         return jsonify({"success": False, "error": "face_recognition not installed"}), 500
 
     try:
-        data = request.get_json()
+        timer = request_timer()
+        with timer.stage("read"):
+            img_bytes, data = read_upload_request()
         admission_no = (data.get("admission_no") or "").strip()
         name = (data.get("name") or "").strip()
-        image_data_url = data.get("image")
 
-        if not all([admission_no, name, image_data_url]):
+        if not all([admission_no, name]) or img_bytes is None:
             return jsonify({"success": False, "error": "Missing fields"}), 400
 
         student = db.students.find_one({"admission_no": admission_no})
@@ -557,55 +1259,59 @@ def enroll_face():
                 400,
             )
 
-        header, encoded = image_data_url.split(",", 1)
-        img_bytes = base64.b64decode(encoded)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
+        result = process_frame(img_bytes, enroll_job, timer)
+        if not result.decoded:
             return jsonify({"success": False, "error": "Invalid image"}), 400
 
-        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(rgb_img)
+        encodings = result.encodings
         if len(encodings) == 0:
             return jsonify({"success": False, "error": "No face detected"}), 400
 
         new_encoding = encodings[0]
 
-        global known_encodings, known_admission_nos, known_names
-        if len(known_encodings) > 0:
-            distances = face_recognition.face_distance(known_encodings, new_encoding)
-            best_match_idx = np.argmin(distances)
-            if (
-                distances[best_match_idx] < 0.4
-                and known_admission_nos[best_match_idx] != admission_no
-            ):
-                return (
-                    jsonify(
-                        {
-                            "success": False,
-                            "error": (
-                                "🚫 Face already belongs to:\n"
-                                f"{known_names[best_match_idx]}\n"
-                                f"({known_admission_nos[best_match_idx]})"
-                            ),
-                        }
-                    ),
-                    400,
-                )
+        nearby = current_gallery().within(new_encoding, 0.4)
+        match = nearby[0] if nearby else None
+        if (
+            match is not None
+            and match.distance < 0.4
+            and match.admission_no != admission_no
+        ):
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": (
+                            "🚫 Face already belongs to:\n"
+                            f"{match.name}\n"
+                            f"({match.admission_no})"
+                        ),
+                    }
+                ),
+                400,
+            )
 
-        if len(known_encodings) == 0:
-            known_encodings = np.array([new_encoding])
-        else:
-            known_encodings = np.vstack([known_encodings, new_encoding])
-        known_admission_nos.append(admission_no)
-        known_names.append(name)
-        save_encodings()
+        add_gallery_face(new_encoding, admission_no, name, student_metadata(student))
+        maybe_compact_gallery()
+        # Train off the request path the first time the gallery gets big enough.
+        threading.Thread(target=maybe_build_index, daemon=True).start()
 
         db.students.update_one(
             {"admission_no": admission_no}, {"$set": {"face_enrolled": True}}
         )
 
-        return jsonify({"success": True, "message": f"✅ Face enrolled for {name}!"})
+        return jsonify(
+            {
+                "success": True,
+                "message": f"✅ Face enrolled for {name}!",
+                "timings_ms": timer.as_dict(),
+            }
+        )
+    except PoolBusyError as e:
+        return busy_response(e)
+    except ImageTooLargeError as e:
+        return jsonify({"success": False, "error": str(e)}), 413
+    except ImageUploadError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print(f"❌ enroll_face error: {e}")
         traceback.print_exc()
@@ -619,36 +1325,26 @@ def mark_attendance():
         return jsonify({"success": False, "error": "face_recognition not installed"}), 500
 
     try:
-        data = request.get_json()
-        image_data_url = data.get("image")
+        timer = request_timer()
+        with timer.stage("read"):
+            frames, data = read_upload_request(multi=True)
         branch = data.get("branch", "CSE")
 
-        if not image_data_url:
+        if not frames:
             return jsonify({"success": False, "error": "No image provided"}), 400
-
-        header, encoded = image_data_url.split(",", 1)
-        img_bytes = base64.b64decode(encoded)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        if img is None:
-            return jsonify({"success": False, "error": "Invalid image data"}), 400
-
-        rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(rgb_img)
-        if len(encodings) == 0:
+        if len(frames) > app.config["BURST_MAX_FRAMES"]:
             return (
                 jsonify(
                     {
                         "success": False,
-                        "error": "No face detected - Try better lighting/closer face",
+                        "error": f"Send at most {app.config['BURST_MAX_FRAMES']} frames at once",
                     }
                 ),
                 400,
             )
 
-        face_encoding = encodings[0]
-
-        if len(known_encodings) == 0:
+        known_faces = current_gallery()
+        if len(known_faces) == 0:
             return (
                 jsonify(
                     {
@@ -659,25 +1355,173 @@ def mark_attendance():
                 400,
             )
 
-        distances = face_recognition.face_distance(known_encodings, face_encoding)
-        best_match_idx = np.argmin(distances)
-        best_distance = distances[best_match_idx]
+        where = match_filters(data, branch)
+        device = device_id(data)
+        extra = {}
+        claimed = data.get("admission_no") or None
+        fallback = request_flag(data, "fallback", app.config["VERIFY_FALLBACK"])
+        if claimed:
+            verification = extra["verification"] = {"admission_no": claimed}
+            if not known_faces.rows_for(claimed, where):
+                verification["result"] = "not_enrolled"
+                count_stat("verification", "not_enrolled")
+                if not fallback:
+                    return (
+                        jsonify(
+                            {
+                                "success": False,
+                                "error": f"No enrolled face for {claimed} in this class",
+                                **extra,
+                            }
+                        ),
+                        400,
+                    )
+                verification["fallback"] = True
+                claimed = None
+
+        if len(frames) > 1:
+            match, face_encoding, cached, burst = recognize_burst(
+                frames, where, timer, device, claimed
+            )
+            if claimed:
+                verification["result"] = "verified" if match is not None else "rejected"
+                if match is not None:
+                    verification["distance"] = round(match.distance, 3)
+                elif burst.get("candidates"):
+                    verification["distance"] = burst["candidates"][0]["mean_distance"]
+                count_stat("verification", verification["result"])
+                if match is None and burst["faces"]:
+                    if not fallback:
+                        return (
+                            jsonify(
+                                {
+                                    "success": False,
+                                    "error": f"Face does not match {claimed}",
+                                    "burst": burst,
+                                    **extra,
+                                }
+                            ),
+                            400,
+                        )
+                    # Frames come back from the frame cache when it is enabled.
+                    verification["fallback"] = True
+                    match, face_encoding, cached, burst = recognize_burst(
+                        frames, where, timer, device
+                    )
+            extra["burst"] = burst
+            if match is None:
+                error = "No face detected - Try better lighting/closer face"
+                if burst["faces"]:
+                    error = "Face not recognized consistently - Try again"
+                return jsonify({"success": False, "error": error, "burst": burst}), 400
+        else:
+            result, duplicate = next(iter_kiosk_frames(frames, timer, device))
+            if duplicate:
+                extra["duplicate_frame"] = True
+            if not result.decoded:
+                return jsonify({"success": False, "error": "Invalid image data"}), 400
+
+            verdict = result.verdict
+            if verdict is not None:
+                count_stat("gate", verdict.reason or "passed")
+                if not verdict.ok:
+                    return (
+                        jsonify(
+                            {
+                                "success": False,
+                                "error": GATE_MESSAGES[verdict.reason],
+                                "reason": verdict.reason,
+                                "quality": verdict.metrics,
+                            }
+                        ),
+                        400,
+                    )
+
+            encodings = result.encodings
+            detection = detection_info(result)
+            extra["detection"] = detection
+            if len(encodings) == 0:
+                return (
+                    jsonify(
+                        {
+                            "success": False,
+                            "error": "No face detected - Try better lighting/closer face",
+                            "detection": detection,
+                        }
+                    ),
+                    400,
+                )
+
+            face_encoding = encodings[0]
+            cached = recall_identity(device, face_encoding, where, timer, claimed)
+            if cached is not None:
+                match = cached.match
+            elif claimed:
+                match = verify_claim(face_encoding, claimed, where, timer)
+                # None only if the student was removed since the rows_for check.
+                verified = match is not None and match.distance <= app.config["MATCH_THRESHOLD"]
+                verification["result"] = "verified" if verified else "rejected"
+                if match is not None:
+                    verification["distance"] = round(match.distance, 3)
+                count_stat("verification", verification["result"])
+                if not verified:
+                    if not fallback:
+                        return (
+                            jsonify(
+                                {
+                                    "success": False,
+                                    "error": f"Face does not match {claimed}",
+                                    **extra,
+                                }
+                            ),
+                            400,
+                        )
+                    verification["fallback"] = True
+                    with timer.stage("match"):
+                        match = match_face(face_encoding, where)
+            else:
+                with timer.stage("match"):
+                    match = match_face(face_encoding, where)
+            if match is None:
+                return (
+                    jsonify(
+                        {
+                            "success": False,
+                            "error": "No enrolled faces match this class filter",
+                        }
+                    ),
+                    400,
+                )
 
-        if best_distance > 0.6:
+            if match.distance > app.config["MATCH_THRESHOLD"]:
+                return (
+                    jsonify(
+                        {
+                            "success": False,
+                            "error": f"Unknown face (confidence: {1 - match.distance:.1f})",
+                        }
+                    ),
+                    400,
+                )
+
+        best_distance = match.distance
+        admission_no = match.admission_no
+        name = match.name
+        confidence = 1 - best_distance
+        if cached is not None:
+            extra["cached"] = True
+            if claimed:
+                extra["verification"]["result"] = "verified"
+
+        # Seconds after a success, repeat attempts stop here without MongoDB.
+        session_type = get_current_session()
+        today = datetime.now().date().isoformat()
+        if session_type and cached is not None and cached.marked == (today, session_type):
             return (
-                jsonify(
-                    {
-                        "success": False,
-                        "error": f"Unknown face (confidence: {1 - best_distance:.1f})",
-                    }
-                ),
+                jsonify({"success": False, "error": already_marked_message(session_type), **extra}),
                 400,
             )
 
-        admission_no = known_admission_nos[best_match_idx]
-        name = known_names[best_match_idx]
-        confidence = 1 - best_distance
-
         student = db.students.find_one({"admission_no": admission_no})
         if not student:
             return (
@@ -693,7 +1537,6 @@ def mark_attendance():
         student_name = student["name"]
         student_branch = student.get("branch", branch)
 
-        session_type = get_current_session()
         if not session_type:
             return (
                 jsonify(
@@ -709,7 +1552,11 @@ def mark_attendance():
             admission_no, student_branch, session_type
         )
         if not can_mark:
-            return jsonify({"success": False, "error": message}), 400
+            if identity_cache is not None and message == already_marked_message(session_type):
+                identity_cache.remember(
+                    device, face_encoding, match, where, marked=(today, session_type)
+                )
+            return jsonify({"success": False, "error": message, **extra}), 400
 
         now = datetime.now()
         attendance_doc = {
@@ -723,6 +1570,10 @@ def mark_attendance():
             "session": session_type,
         }
         db.attendance.insert_one(attendance_doc)
+        if identity_cache is not None:
+            identity_cache.remember(
+                device, face_encoding, match, where, marked=(today, session_type)
+            )
 
         return jsonify(
             {
@@ -732,14 +1583,391 @@ def mark_attendance():
                 "confidence": f"{confidence:.2f}",
                 "session": session_type,
                 "message": f"✅ {session_type} attendance marked for {student_name}!",
+                "timings_ms": timer.as_dict(),
+                **extra,
             }
         )
+    except PoolBusyError as e:
+        return busy_response(e)
+    except ImageTooLargeError as e:
+        return jsonify({"success": False, "error": str(e)}), 413
+    except ImageUploadError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         print(f"❌ mark_attendance FULL ERROR: {e}")
         traceback.print_exc()
         return jsonify({"success": False, "error": f"Server error: {str(e)[:100]}"}), 500
 
 
+def box_dict(box):
+    top, right, bottom, left = (int(v) for v in box)
+    return {"top": top, "right": right, "bottom": bottom, "left": left}
+
+
+@app.route("/api/roll_call", methods=["POST"])
+@jwt_required()
+def roll_call():
+    """Mark every recognized student in one classroom photo."""
+    if not FACE_LIB_AVAILABLE:
+        return jsonify({"success": False, "error": "face_recognition not installed"}), 500
+
+    try:
+        timer = request_timer()
+        with timer.stage("read"):
+            img_bytes, data = read_upload_request()
+        branch = data.get("branch", "CSE")
+
+        if img_bytes is None:
+            return jsonify({"success": False, "error": "No image provided"}), 400
+
+        session_type = get_current_session()
+        if not session_type:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "Attendance only allowed 9AM-1PM or 2PM-5PM",
+                    }
+                ),
+                400,
+            )
+
+        # One detection pass, then one face_encodings call for every box.
+        result = process_frame(img_bytes, roll_call_job, timer)
+        if not result.decoded:
+            return jsonify({"success": False, "error": "Invalid image data"}), 400
+        encodings, boxes = result.encodings, result.boxes
+        if len(encodings) == 0:
+            return jsonify({"success": False, "error": "No faces detected in the photo"}), 400
+
+        known_faces = current_gallery()
+        if len(known_faces) == 0:
+            return (
+                jsonify(
+                    {
+                        "success": False,
+                        "error": "No students enrolled yet! Add & enroll faces first",
+                    }
+                ),
+                400,
+            )
+
+        with timer.stage("match"):
+            matches = known_faces.nearest_many(encodings, where=match_filters(data, branch))
+
+        # A student seen twice keeps only the closest face.
+        results = [{"box": box_dict(box), "status": "unknown"} for box in boxes]
+        best_face = {}
+        for i, match in enumerate(matches):
+            if match is None or match.distance > app.config["MATCH_THRESHOLD"]:
+                continue
+            results[i]["confidence"] = round(1 - match.distance, 2)
+            results[i]["admission_no"] = match.admission_no
+            other = best_face.get(match.admission_no)
+            if other is None or match.distance < matches[other].distance:
+                if other is not None:
+                    results[other]["status"] = "duplicate"
+                best_face[match.admission_no] = i
+            else:
+                results[i]["status"] = "duplicate"
+
+        with timer.stage("db"):
+            students = {
+                s["admission_no"]: s
+                for s in db.students.find(
+                    {"admission_no": {"$in": list(best_face)}},
+                    {"admission_no": 1, "name": 1, "branch": 1},
+                )
+            }
+            now = datetime.now()
+            today_str = now.date().isoformat()
+            already = {
+                (a["admission_no"], a.get("branch"))
+                for a in db.attendance.find(
+                    {
+                        "admission_no": {"$in": list(students)},
+                        "date": today_str,
+                        "session": session_type,
+                    },
+                    {"admission_no": 1, "branch": 1},
+                )
+            }
+
+            docs = []
+            for admission_no, i in best_face.items():
+                student = students.get(admission_no)
+                if student is None:
+                    results[i]["status"] = "not_found"
+                    continue
+                student_branch = student.get("branch", branch)
+                results[i]["name"] = student["name"]
+                if (admission_no, student_branch) in already:
+                    results[i]["status"] = "already_marked"
+                    continue
+                results[i]["status"] = "marked"
+                docs.append(
+                    {
+                        "admission_no": admission_no,
+                        "name": student["name"],
+                        "branch": student_branch,
+                        "date": today_str,
+                        "timestamp": now,
+                        "status": "Present",
+                        "confidence": results[i]["confidence"],
+                        "session": session_type,
+                    }
+                )
+            if docs:
+                db.attendance.insert_many(docs, ordered=False)
+
+        summary = {}
+        for result in results:
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+        return jsonify(
+            {
+                "success": True,
+                "session": session_type,
+                "faces": len(results),
+                "marked": len(docs),
+                "summary": summary,
+                "results": results,
+                "message": f"✅ {session_type} attendance marked for {len(docs)} student(s)",
+                "timings_ms": timer.as_dict(),
+            }
+        )
+    except PoolBusyError as e:
+        return busy_response(e)
+    except ImageTooLargeError as e:
+        return jsonify({"success": False, "error": str(e)}), 413
+    except ImageUploadError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        print(f"❌ roll_call error: {e}")
+        traceback.print_exc()
+        return jsonify({"success": False, "error": f"Server error: {str(e)[:100]}"}), 500
+
+
+def observe_track(track, encoding, where, timer):
+    """Match one more encoding of ``track``; settle it once it is confident
+    or has used up its encodings."""
+    with timer.stage("match"):
+        match = match_face(encoding, where)
+    if match is None:
+        track.status = "unknown"  # nobody enrolled under this filter
+        return
+    track.encodings.append(encoding)
+    track.matches.append(match)
+    if match.distance <= app.config["BURST_CONFIDENT_DISTANCE"]:
+        track.status, track.match = "identified", match
+    elif len(track.encodings) >= app.config["STREAM_TRACK_MAX_ENCODINGS"]:
+        settle_track(track, timer)
+
+
+def settle_track(track, timer):
+    # Same vote as a mark_attendance burst, over the frames of one track.
+    if not track.matches:
+        track.status = "unknown"
+        return
+    with timer.stage("vote"):
+        decision = decide_burst(
+            current_gallery(), track.encodings, track.matches, app.config["MATCH_THRESHOLD"]
+        )
+    if decision.admission_no is None:
+        track.status = "unknown"
+        track.match = Match(None, None, None, decision.distance)
+    else:
+        track.status = "identified"
+        track.match = Match(None, decision.admission_no, decision.name, decision.distance)
+
+
+def stream_track_event(track, branch, marked, timer):
+    """The event for a settled track, writing attendance when it is identified."""
+    event = {
+        "event": "track",
+        "track_id": track.id,
+        "status": "unknown",
+        "encodings": len(track.encodings),
+    }
+    match = track.match
+    if match is not None:
+        event["confidence"] = round(1 - match.distance, 2)
+    if track.status != "identified":
+        return event
+
+    admission_no = match.admission_no
+    event["admission_no"] = admission_no
+    if admission_no in marked:
+        event["status"] = "already_marked"
+        return event
+    with timer.stage("db"):
+        student = db.students.find_one({"admission_no": admission_no})
+        if not student:
+            event["status"] = "not_found"
+            return event
+        event["name"] = student["name"]
+        student_branch = student.get("branch", branch)
+        session_type = get_current_session()
+        if not session_type:
+            event["status"] = "outside_session"
+            return event
+        can_mark, _ = can_mark_attendance(admission_no, student_branch, session_type)
+        marked.add(admission_no)
+        if not can_mark:
+            event["status"] = "already_marked"
+            return event
+        now = datetime.now()
+        db.attendance.insert_one(
+            {
+                "admission_no": admission_no,
+                "name": student["name"],
+                "branch": student_branch,
+                "date": now.date().isoformat(),
+                "timestamp": now,
+                "status": "Present",
+                "confidence": event["confidence"],
+                "session": session_type,
+            }
+        )
+    event["status"] = "marked"
+    return event
+
+
+@app.route("/api/stream_attendance", methods=["POST"])
+@jwt_required()
+def stream_attendance():
+    """Mark attendance from a live MJPEG upload, one JSON line per event.
+
+    The body is a chunked ``multipart/x-mixed-replace`` (or back-to-back
+    JPEG) camera feed, e.g.::
+
+        ffmpeg -f v4l2 -i /dev/video0 -f mpjpeg -q:v 5 - | curl -N -X POST -T - \\
+            -H "Authorization: Bearer $TOKEN" \\
+            -H "Content-Type: multipart/x-mixed-replace; boundary=ffmpeg" \\
+            "$API/api/stream_attendance?branch=CSE"
+
+    Every STREAM_DETECT_EVERY-th frame is sent for detection; while one is
+    in the encode workers, newer frames are dropped undecoded.  A "track"
+    line is written as each tracked face settles, and a "summary" line when
+    the upload ends.
+    """
+    if not FACE_LIB_AVAILABLE:
+        return jsonify({"success": False, "error": "face_recognition not installed"}), 500
+    if len(current_gallery()) == 0:
+        return (
+            jsonify(
+                {
+                    "success": False,
+                    "error": "No students enrolled yet! Add & enroll faces first",
+                }
+            ),
+            400,
+        )
+
+    data = plain_fields(request.args)
+    branch = data.get("branch", "CSE")
+    where = match_filters(data, branch)
+    # Unlike single uploads, a stream has no overall size limit.
+    stream = get_input_stream(request.environ, safe_fallback=False)
+
+    def events():
+        timer = StageTimer()
+        tracker = FaceTracker(
+            iou_threshold=app.config["STREAM_TRACK_IOU"],
+            max_missed=app.config["STREAM_TRACK_MAX_MISSED"],
+            max_encodings=app.config["STREAM_TRACK_MAX_ENCODINGS"],
+        )
+        summary = {
+            "frames": 0,
+            "detections": 0,
+            "dropped": 0,
+            "faces": 0,
+            "encodings": 0,
+            "tracks": 0,
+            "marked": 0,
+        }
+        marked = set()
+
+        def detection_pass(result):
+            # Tracks that settled on this pass.
+            summary["detections"] += 1
+            if not result.decoded:
+                count_stat("stream", "invalid_frame")
+                return []
+            summary["faces"] += len(result.boxes)
+            assigned, ended = tracker.update(result.boxes)
+            done = []
+            for track, encoding in zip(assigned, result.encodings):
+                if track.hits == 1:
+                    summary["tracks"] += 1
+                if encoding is None or not tracker.needs_encoding(track):
+                    continue
+                summary["encodings"] += 1
+                observe_track(track, encoding, where, timer)
+                if track.status != "pending":
+                    done.append(track)
+            return done + ended_tracks(ended)
+
+        def ended_tracks(tracks):
+            # A track that left before settling is decided on what it has.
+            done = []
+            for track in tracks:
+                if track.status == "pending" and track.encodings:
+                    settle_track(track, timer)
+                    done.append(track)
+            return done
+
+        def lines(tracks):
+            for track in tracks:
+                event = stream_track_event(track, branch, marked, timer)
+                count_stat("stream", event["status"])
+                summary["marked"] += event["status"] == "marked"
+                yield app.json.dumps(event) + "\n"
+
+        pending = None
+        try:
+            frames = iter_jpeg_frames(stream, app.config["STREAM_MAX_FRAME_BYTES"])
+            for index, buf in enumerate(frames):
+                summary["frames"] += 1
+                if pending is not None:
+                    if not pending.done():
+                        summary["dropped"] += 1
+                        continue
+                    yield from lines(detection_pass(pending.result(timer)))
+                    pending = None
+                if index % app.config["STREAM_DETECT_EVERY"]:
+                    continue
+                job = stream_job._replace(tracks=tracker.hint())
+                if encode_pool is None:
+                    result = run_frame(buf, job, None, timer, request_pool())
+                    yield from lines(detection_pass(result))
+                    continue
+                try:
+                    pending = encode_pool.submit(buf, job)
+                except PoolBusyError:
+                    summary["dropped"] += 1
+            if pending is not None:
+                result = pending.result(timer, timeout=app.config["ENCODE_TIMEOUT_SECONDS"])
+                pending = None
+                yield from lines(detection_pass(result))
+            yield from lines(ended_tracks(tracker.close()))
+            yield app.json.dumps(
+                {"event": "summary", "success": True, **summary, "timings_ms": timer.as_dict()}
+            ) + "\n"
+        except ImageUploadError as e:
+            yield app.json.dumps({"event": "error", "success": False, "error": str(e)}) + "\n"
+        except Exception as e:
+            print(f"❌ stream_attendance error: {e}")
+            traceback.print_exc()
+            yield app.json.dumps(
+                {"event": "error", "success": False, "error": f"Server error: {str(e)[:100]}"}
+            ) + "\n"
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    return Response(stream_with_context(events()), mimetype="application/x-ndjson")
+
+
 @app.route("/api/today_attendance/<branch>", methods=["GET"])
 @jwt_required(optional=True)
 def today_attendance(branch):
@@ -844,6 +2072,27 @@ def admin_details():
     )
 
 
+@app.route("/api/admin/reload_gallery", methods=["POST"])
+@jwt_required()
+def admin_reload_gallery():
+    # Load in the background and answer right away; the swap is atomic.
+    data = request.get_json(silent=True) or {}
+    force = bool(data.get("force", True))
+    if reload_lock.locked():
+        return jsonify({"success": False, "error": "A gallery reload is already running"}), 409
+    threading.Thread(target=reload_gallery, args=(force,), daemon=True).start()
+    return (
+        jsonify(
+            {
+                "success": True,
+                "message": "Gallery reload started",
+                "known_faces_count": len(current_gallery()),
+            }
+        ),
+        202,
+    )
+
+
 @app.route("/static_uploads/<filename>")
 def uploaded_file(filename):
     return send_from_directory(app.config["UPLOAD_FOLDER"], filename)
@@ -0,0 +1,16 @@
+"""The AM/PM attendance windows, shared by the app and offline tools."""
+from datetime import time
+
+SESSION_WINDOWS = {
+    "AM": (time(9, 0), time(13, 0)),
+    "PM": (time(14, 0), time(17, 0)),
+}
+
+
+def session_for(moment):
+    """"AM", "PM" or None for a datetime (only its time of day matters)."""
+    current_time = moment.time()
+    for session_type, (start, end) in SESSION_WINDOWS.items():
+        if start <= current_time <= end:
+            return session_type
+    return None
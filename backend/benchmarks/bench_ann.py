@@ -0,0 +1,59 @@
+"""Recall and latency of the IVF-PQ index against exact FaceGallery search.
+
+Run from the backend folder:  python benchmarks/bench_ann.py [gallery_size]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery import FaceGallery  # noqa: E402
+
+NUM_QUERIES = 300
+NPROBES = [1, 4, 8, 16, 32]
+RERANKS = [16, 64, 256]
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(0.0, 0.09, size=(n, 128))
+    ids = [f"S{i:06d}" for i in range(n)]
+    picks = rng.integers(0, n, NUM_QUERIES)
+    queries = encodings[picks] + rng.normal(0.0, 0.02, size=(NUM_QUERIES, 128))
+
+    gallery = FaceGallery.from_lists(encodings, ids, ids)
+
+    start = time.perf_counter()
+    exact = [gallery.top_k(q, 10) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / NUM_QUERIES
+
+    start = time.perf_counter()
+    index = gallery.build_ann()
+    print(f"{n} faces, {index.nlist} lists, m={index.m}: trained in {time.perf_counter() - start:.1f}s")
+    print(f"exact search: {exact_ms:.2f} ms/query")
+    print(f"{'nprobe':>6} {'rerank':>6} {'ms/query':>9} {'recall@1':>9} {'recall@10':>10}")
+
+    for nprobe in NPROBES:
+        for rerank in RERANKS:
+            index.nprobe = nprobe
+            gallery.ann_rerank = rerank
+            start = time.perf_counter()
+            approx = [gallery.top_k(q, 10) for q in queries]
+            ms = (time.perf_counter() - start) * 1000 / NUM_QUERIES
+
+            r1 = np.mean([a[0].index == e[0].index for a, e in zip(approx, exact)])
+            r10 = np.mean(
+                [
+                    len({m.index for m in a} & {m.index for m in e}) / len(e)
+                    for a, e in zip(approx, exact)
+                ]
+            )
+            print(f"{nprobe:>6} {rerank:>6} {ms:>9.2f} {r1:>9.1%} {r10:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Matching throughput with and without micro-batching, 1-64 concurrent clients.
+
+Run from the backend folder:  python benchmarks/bench_batcher.py [gallery_size] [wait_ms]
+
+Each client thread issues queries back to back for a fixed time, either
+calling ``gallery.nearest`` directly or going through a MatchBatcher.
+Reports queries/second, p50/p99 latency and the mean batch size.
+"""
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from face_gallery import FaceGallery  # noqa: E402
+from match_batcher import MatchBatcher  # noqa: E402
+
+CLIENTS = (1, 2, 4, 8, 16, 32, 64)
+SECONDS = 2.0
+
+
+def run(clients, lookup, queries):
+    latencies = [[] for _ in range(clients)]
+    stop = time.perf_counter() + SECONDS
+    start_gate = threading.Barrier(clients)
+
+    def client(index):
+        start_gate.wait()
+        i = index
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            lookup(queries[i % len(queries)])
+            latencies[index].append((time.perf_counter() - start) * 1000)
+            i += clients
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    began = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - began
+    flat = np.concatenate([np.asarray(lat) for lat in latencies])
+    p50, p99 = np.percentile(flat, [50, 99])
+    return len(flat) / elapsed, p50, p99
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    wait_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 2.0
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(0.0, 0.09, size=(n, 128)).astype(np.float32)
+    ids = [f"S{i:06d}" for i in range(n)]
+    gallery = FaceGallery.from_arrays(encodings, ids, ids)
+    queries = encodings[rng.integers(0, n, 512)] + rng.normal(0, 0.01, (512, 128)).astype(np.float32)
+
+    print(f"{n} faces, batch wait {wait_ms} ms, {SECONDS:.0f} s per run")
+    print(
+        f"{'clients':>7} {'direct q/s':>11} {'p50':>6} {'p99':>6} "
+        f"{'batched q/s':>12} {'p50':>6} {'p99':>6} {'batch':>6}"
+    )
+    for clients in CLIENTS:
+        direct = run(clients, gallery.nearest, queries)
+        batcher = MatchBatcher(lambda: gallery, max_batch=64, max_wait_ms=wait_ms)
+        batched = run(clients, batcher.nearest, queries)
+        print(
+            f"{clients:>7} {direct[0]:>11.0f} {direct[1]:>6.1f} {direct[2]:>6.1f} "
+            f"{batched[0]:>12.0f} {batched[1]:>6.1f} {batched[2]:>6.1f} "
+            f"{batcher.stats()['mean_batch']:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Frame pipeline allocations and latency with and without the buffer pool.
+
+Run from the backend folder:  python benchmarks/bench_buffers.py [requests] [width] [height]
+
+Each simulated request does what mark_attendance does before detection: read
+the upload body from a stream, decode, run the quality gate, convert to RGB
+and build the detection-tier images.  "alloc MB" is the peak of traced
+NumPy/OpenCV allocations per request (tracemalloc) and "RSS +MB" the
+growth of the process over the run.  Latency is measured in a separate pass
+without tracemalloc, single-threaded OpenCV.
+"""
+import io
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from face_pipeline import detection_scale, downscale, parse_tiers  # noqa: E402
+from frame_buffers import FramePool  # noqa: E402
+from frame_gate import FrameGate  # noqa: E402
+from image_io import decode_image, read_stream  # noqa: E402
+
+TIERS = parse_tiers("240:0,320:0,320:1")
+
+
+def make_frames(width, height, count=8):
+    rng = np.random.default_rng(0)
+    frames = []
+    for i in range(count):
+        img = np.full((height, width, 3), 90 + 10 * i, dtype=np.uint8)
+        for _ in range(30):
+            x, y = rng.integers(0, width), rng.integers(0, height)
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.circle(img, (int(x), int(y)), int(rng.integers(5, height // 4)), color, -1)
+        img = cv2.GaussianBlur(img, (3, 3), 0)
+        frames.append(cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes())
+    return frames
+
+
+def handle(body, gate, pool):
+    out = pool.byte_buffer("upload", len(body)) if pool is not None else None
+    buf = read_stream(io.BytesIO(body), len(body), out=out)
+    img = decode_image(buf, target_side=640)
+    gate.check(img, pool)
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img if pool is not None else None)
+    for tier in TIERS:
+        downscale(rgb, detection_scale(rgb.shape, tier.max_side, tier.scale), pool)
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def run(frames, requests, pool):
+    gate = FrameGate()
+    rss_before = rss_mb()
+    for body in frames:  # warm up (fills the pool)
+        handle(body, gate, pool)
+
+    tracemalloc.start()
+    peaks = []
+    for i in range(requests):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        handle(frames[i % len(frames)], gate, pool)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks.append(peak - before)
+    tracemalloc.stop()
+
+    latencies = []
+    for i in range(requests):
+        start = time.perf_counter()
+        handle(frames[i % len(frames)], gate, pool)
+        latencies.append((time.perf_counter() - start) * 1000)
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return np.mean(peaks) / 2**20, p50, p99, rss_mb() - rss_before
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    width = int(sys.argv[2]) if len(sys.argv) > 2 else 1280
+    height = int(sys.argv[3]) if len(sys.argv) > 3 else 720
+    cv2.setNumThreads(1)
+    frames = make_frames(width, height)
+    print(f"{requests} requests, {width}x{height} JPEG (~{len(frames[0]) // 1024} KB)")
+    print(f"{'pool':>5} {'alloc MB/req':>13} {'p50 ms':>7} {'p99 ms':>7} {'RSS +MB':>9} {'pool hits':>10}")
+    for label, pool in (("off", None), ("on", FramePool())):
+        alloc, p50, p99, rss = run(frames, requests, pool)
+        hits = "-" if pool is None else f"{pool.hits}/{pool.hits + pool.misses}"
+        print(f"{label:>5} {alloc:>13.2f} {p50:>7.2f} {p99:>7.2f} {rss:>9.1f} {hits:>10}")
+
+
+if __name__ == "__main__":
+    main()
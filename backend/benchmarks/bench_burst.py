@@ -0,0 +1,94 @@
+"""Single-frame vs burst decisions on simulated borderline captures.
+
+Run from the backend folder:  python benchmarks/bench_burst.py [students] [attempts]
+
+Every enrolled student gets a synthetic template.  An attempt is a burst of
+frames from one student (or from an unenrolled stranger), each frame the
+student's template plus fresh capture noise, scaled so genuine distances sit
+around the 0.6 threshold.  "single" decides on the first frame only, the way
+the kiosk did before; "burst" runs the same early-exit + vote as
+mark_attendance.  Strangers should never be accepted.
+"""
+import os
+import sys
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from burst_consensus import decide  # noqa: E402
+from face_gallery import FaceGallery  # noqa: E402
+
+THRESHOLD = 0.6
+CONFIDENT = 0.45
+FRAMES = (3, 5)
+NOISE = (0.45, 0.55, 0.6)  # expected genuine distance per frame
+
+
+def face(rng, n):
+    # Identities ~0.9-1.0 apart, like real encodings of different people.
+    return rng.normal(0.0, 0.95 / np.sqrt(2 * 128), size=(n, 128)).astype(np.float32)
+
+
+def attempt(gallery, frames, frames_n):
+    encodings, matches = [], []
+    for encoding in frames[:frames_n]:
+        match = gallery.nearest(encoding)
+        encodings.append(encoding)
+        matches.append(match)
+        if match.distance <= CONFIDENT:
+            return match.admission_no, len(encodings)
+    decision = decide(gallery, encodings, matches, THRESHOLD)
+    return decision.admission_no, len(encodings)
+
+
+def main():
+    students = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    attempts = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    rng = np.random.default_rng(0)
+    templates = face(rng, students)
+    ids = [f"S{i:04d}" for i in range(students)]
+    gallery = FaceGallery.from_arrays(templates, ids, ids)
+
+    print(f"{students} students, {attempts} genuine + {attempts} stranger attempts per row")
+    print(f"{'noise':>6} {'mode':>8} {'accepted':>9} {'wrong':>6} {'stranger':>9} {'frames':>7}")
+    for noise in NOISE:
+        sigma = noise / np.sqrt(128)
+        people = rng.integers(0, students, attempts)
+        strangers = face(rng, attempts)
+        bursts = [
+            templates[p] + rng.normal(0, sigma, (max(FRAMES), 128)).astype(np.float32)
+            for p in people
+        ]
+        stranger_bursts = [
+            s + rng.normal(0, sigma, (max(FRAMES), 128)).astype(np.float32) for s in strangers
+        ]
+
+        rows = [("single", 1)] + [(f"burst{n}", n) for n in FRAMES]
+        for label, n in rows:
+            right = wrong = false_accepts = 0
+            used = []
+            for p, frames in zip(people, bursts):
+                if n == 1:
+                    match = gallery.nearest(frames[0])
+                    adm = match.admission_no if match.distance <= THRESHOLD else None
+                    used.append(1)
+                else:
+                    adm, count = attempt(gallery, frames, n)
+                    used.append(count)
+                right += adm == ids[p]
+                wrong += adm is not None and adm != ids[p]
+            for frames in stranger_bursts:
+                if n == 1:
+                    false_accepts += gallery.nearest(frames[0]).distance <= THRESHOLD
+                else:
+                    false_accepts += attempt(gallery, frames, n)[0] is not None
+            print(
+                f"{noise:>6.2f} {label:>8} {right / attempts:>9.1%} {wrong / attempts:>6.1%} "
+                f"{false_accepts / attempts:>9.1%} {np.mean(used):>7.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
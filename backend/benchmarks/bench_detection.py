@@ -0,0 +1,83 @@
+"""Per-stage latency of face detection at different detection resolutions.
+
+Run from the backend folder:  python benchmarks/bench_detection.py photo.jpg [repeats]
+
+Detection runs on a downscaled copy; encodings are always computed on the
+full frame from the rescaled boxes.  "drift" is the encoding distance to the
+full-resolution result for the same face (well under the 0.6 match
+threshold means matching is unaffected).  The second table runs the
+coarse-to-fine tiers used by mark_attendance and shows which one succeeded.
+Needs face_recognition installed.
+"""
+import os
+import sys
+
+import cv2
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from face_pipeline import (  # noqa: E402
+    StageTimer,
+    encode_faces,
+    encode_faces_tiered,
+    parse_tiers,
+    tier_label,
+)
+
+MAX_SIDES = (None, 1280, 960, 640, 480, 320, 240, 160)
+TIER_SPECS = ("240:0,320:0,320:1", "160:0,320:0,full:1", "full:1")
+
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python benchmarks/bench_detection.py photo.jpg [repeats]")
+        sys.exit(1)
+    img = cv2.imread(sys.argv[1], cv2.IMREAD_COLOR)
+    if img is None:
+        print(f"Could not read {sys.argv[1]}")
+        sys.exit(1)
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    reference, _ = encode_faces(rgb)
+    print(f"{sys.argv[1]}: {rgb.shape[1]}x{rgb.shape[0]}, {len(reference)} face(s) at full size")
+    print(
+        f"{'max side':>9} {'faces':>6} {'resize ms':>10} {'detect ms':>10} "
+        f"{'encode ms':>10} {'total ms':>9} {'drift':>7}"
+    )
+    for max_side in MAX_SIDES:
+        timings = []
+        for _ in range(repeats):
+            timer = StageTimer()
+            encodings, _ = encode_faces(rgb, max_side=max_side, timer=timer)
+            timings.append(timer.stages)
+        med = {
+            stage: float(np.median([t.get(stage, 0.0) for t in timings]))
+            for stage in ("resize", "detect", "encode")
+        }
+        drift = "-"
+        if encodings and reference:
+            drift = f"{np.linalg.norm(np.asarray(reference[0]) - encodings[0]):.3f}"
+        label = "full" if max_side is None else str(max_side)
+        print(
+            f"{label:>9} {len(encodings):>6} {med['resize']:>10.1f} {med['detect']:>10.1f} "
+            f"{med['encode']:>10.1f} {sum(med.values()):>9.1f} {drift:>7}"
+        )
+
+    print()
+    print(f"{'tiers':>22} {'succeeded':>10} {'tried':>6} {'total ms':>9}")
+    for spec in TIER_SPECS:
+        tiers = parse_tiers(spec)
+        totals = []
+        for _ in range(repeats):
+            timer = StageTimer()
+            result = encode_faces_tiered(rgb, tiers, timer=timer)
+            totals.append(sum(timer.stages.values()))
+        won = "none" if result.tier is None else tier_label(tiers[result.tier])
+        print(f"{spec:>22} {won:>10} {result.tiers_tried:>6} {float(np.median(totals)):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
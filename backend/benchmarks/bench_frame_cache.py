@@ -0,0 +1,147 @@
+"""dHash/pHash distances of resubmitted vs different kiosk frames, and lookup cost.
+
+Run from the backend folder:  python benchmarks/bench_frame_cache.py [students]
+
+Synthetic 320x240 kiosk snapshots (the size MarkAttendance.js sends): one
+fixed room background, a head-and-shoulders figure per student (skin tone,
+hair, eye/mouth placement, shirt colour vary), placed near the centre.
+"Resubmitted" frames are the same capture re-encoded at another JPEG
+quality, with sensor noise, or shifted by a pixel.  "Different" pairs are
+two students, including look-alikes that share skin tone, hair, shirt and
+position and differ only in where the eyes and mouth sit.
+Whole-frame hashes alone cannot keep look-alikes apart, so FrameCache also
+compares 8x8 blocks of the thumbnails; the last column is the fraction of
+pairs FrameCache's default thresholds would treat as the same frame.
+"""
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from frame_cache import FrameCache, frame_signature, hamming, max_block_difference  # noqa: E402
+from image_io import decode_image  # noqa: E402
+
+
+def background(rng):
+    img = np.zeros((240, 320, 3), np.uint8)
+    img[:] = (180, 190, 200)
+    for _ in range(12):
+        x, y = rng.integers(0, 320), rng.integers(0, 240)
+        colour = tuple(int(c) for c in rng.integers(60, 230, 3))
+        cv2.rectangle(img, (int(x), int(y)), (int(x + rng.integers(20, 120)), int(y + rng.integers(20, 90))), colour, -1)
+    return cv2.GaussianBlur(img, (5, 5), 0)
+
+
+def student(rng, base=None):
+    if base is None:
+        return {
+            "skin": tuple(int(c) for c in rng.integers(90, 210, 3)),
+            "hair": tuple(int(c) for c in rng.integers(10, 90, 3)),
+            "shirt": tuple(int(c) for c in rng.integers(20, 240, 3)),
+            "hair_h": int(rng.integers(15, 40)),
+            "eyes": int(rng.integers(-6, 6)),
+            "mouth": int(rng.integers(-6, 6)),
+            "dx": int(rng.integers(-25, 25)),
+        }
+    # Look-alike: same colours, build and position; eyes and mouth sit 4-8 px
+    # higher or lower (about one pixel in the cache's thumbnail).
+    twin = dict(base)
+    for part in ("eyes", "mouth"):
+        twin[part] = base[part] + 2 * int(rng.choice([-1, 1])) * int(rng.integers(4, 9))
+    return twin
+
+
+def snapshot(bg, s, noise=0.0, shift=0, rng=None):
+    img = bg.copy()
+    cx, cy = 160 + s["dx"] + shift, 115
+    cv2.ellipse(img, (cx, 260), (95, 60), 0, 180, 360, s["shirt"], -1)
+    cv2.ellipse(img, (cx, cy), (48, 62), 0, 0, 360, s["skin"], -1)
+    cv2.ellipse(img, (cx, cy - 40), (52, s["hair_h"]), 0, 180, 360, s["hair"], -1)
+    for ex in (-18, 18):
+        cv2.circle(img, (cx + ex, cy - 8 + s["eyes"] // 2), 6, (40, 30, 30), -1)
+    cv2.ellipse(img, (cx, cy + 28 + s["mouth"] // 2), (16, 5), 0, 0, 180, (60, 40, 120), 2)
+    img = cv2.GaussianBlur(img, (3, 3), 0)
+    if noise:
+        img = np.clip(img + rng.normal(0, noise, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+
+def jpeg(img, quality=80):
+    return cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, quality])[1]
+
+
+DEFAULTS = FrameCache()
+
+
+def distances(a, b):
+    (ta, da, pa), (tb, db, pb) = frame_signature(a), frame_signature(b)
+    return hamming(da, db), hamming(pa, pb), max_block_difference(ta, tb)
+
+
+def summary(label, pairs):
+    d = np.array(pairs)
+    hashes_agree = (d[:, 0] <= DEFAULTS.max_hamming) & (d[:, 1] <= DEFAULTS.max_hamming)
+    same = hashes_agree & (d[:, 2] <= DEFAULTS.max_block_diff)
+    print(
+        f"{label:<24} dHash {d[:, 0].min():2.0f}/{np.median(d[:, 0]):2.0f}/{d[:, 0].max():2.0f}"
+        f"  pHash {d[:, 1].min():2.0f}/{np.median(d[:, 1]):2.0f}/{d[:, 1].max():2.0f}"
+        f"  block {d[:, 2].min():5.1f}/{np.median(d[:, 2]):5.1f}/{d[:, 2].max():5.1f}"
+        f"  hashes {np.mean(hashes_agree):4.0%}  cache {np.mean(same):4.0%}"
+    )
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    rng = np.random.default_rng(0)
+    bg = background(rng)
+    students = [student(rng) for _ in range(n)]
+
+    resubmits = {"re-encoded q70/q90": [], "sensor noise (sigma 3)": [], "shifted 1px": []}
+    different, lookalike = [], []
+    for i, s in enumerate(students):
+        frame = snapshot(bg, s)
+        sent = jpeg(frame)
+        resubmits["re-encoded q70/q90"].append(distances(sent, jpeg(frame, 70 if i % 2 else 90)))
+        resubmits["sensor noise (sigma 3)"].append(distances(sent, jpeg(snapshot(bg, s, 3.0, 0, rng))))
+        resubmits["shifted 1px"].append(distances(sent, jpeg(snapshot(bg, s, 0, 1))))
+        other = students[(i + 1) % n]
+        different.append(distances(sent, jpeg(snapshot(bg, other))))
+        lookalike.append(distances(sent, jpeg(snapshot(bg, student(rng, s)))))
+
+    print(f"{'min/median/max':<24} {'bits':^11}  {'bits':^11}  {'grey levels':^17}  same frame?")
+    for label, pairs in resubmits.items():
+        summary(label, pairs)
+    summary("different students", different)
+    summary("look-alike students", lookalike)
+
+    frames = [jpeg(snapshot(bg, s)) for s in students]
+    cache = FrameCache(max_entries=max(256, len(frames)))
+    for f in frames:
+        _, key = cache.lookup(f, "kiosk")
+        if key is not None:
+            cache.store(key, "result")
+    fresh = jpeg(snapshot(bg, student(rng)))
+    runs = 300
+    start = time.perf_counter()
+    for _ in range(runs):
+        cache.lookup(frames[0], "kiosk")
+    exact = (time.perf_counter() - start) / runs * 1e6
+    start = time.perf_counter()
+    for _ in range(runs):
+        cache.lookup(fresh, "kiosk")
+    miss = (time.perf_counter() - start) / runs * 1e6
+    start = time.perf_counter()
+    for _ in range(runs):
+        decode_image(fresh, target_side=640)
+    decode = (time.perf_counter() - start) / runs * 1e6
+    print(f"\nlookup with {len(frames)} cached: exact hit {exact:.0f} us, miss (hash + scan) {miss:.0f} us;"
+          f" a full-size decode alone is {decode:.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Queries/sec of FaceGallery.nearest vs. the face_recognition.face_distance path.
+
+Run from the backend folder:  python benchmarks/bench_gallery.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery import FaceGallery  # noqa: E402
+
+try:
+    from face_recognition import face_distance
+except Exception:
+    # Same expression face_recognition.face_distance evaluates.
+    def face_distance(face_encodings, face_to_compare):
+        if len(face_encodings) == 0:
+            return np.empty((0))
+        return np.linalg.norm(face_encodings - face_to_compare, axis=1)
+
+
+GALLERY_SIZES = [1_000, 10_000, 100_000]
+NUM_QUERIES = 200
+
+
+def synthetic_encodings(rng, n):
+    # dlib encodings sit roughly in [-0.3, 0.3] per dimension.
+    return rng.normal(0.0, 0.09, size=(n, 128))
+
+
+def time_queries(fn, queries):
+    start = time.perf_counter()
+    results = [fn(q) for q in queries]
+    elapsed = time.perf_counter() - start
+    return len(queries) / elapsed, results
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'faces':>8} {'face_distance q/s':>18} {'FaceGallery q/s':>16} {'speedup':>8} {'agree':>6}")
+
+    for n in GALLERY_SIZES:
+        encodings = synthetic_encodings(rng, n)
+        ids = [f"S{i:06d}" for i in range(n)]
+        picks = rng.integers(0, n, NUM_QUERIES)
+        queries = encodings[picks] + rng.normal(0.0, 0.02, size=(NUM_QUERIES, 128))
+
+        # Current app path: float64 array rebuilt from pickled lists.
+        known_encodings = np.array([enc.tolist() for enc in encodings])
+        gallery = FaceGallery.from_lists(encodings, ids, ids)
+
+        base_qps, base_idx = time_queries(
+            lambda q: int(np.argmin(face_distance(known_encodings, q))), queries
+        )
+        new_qps, new_idx = time_queries(lambda q: gallery.nearest(q).index, queries)
+
+        agree = np.mean(np.array(base_idx) == np.array(new_idx))
+        print(f"{n:>8} {base_qps:>18.0f} {new_qps:>16.0f} {new_qps / base_qps:>7.1f}x {agree:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
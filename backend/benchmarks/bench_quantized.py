@@ -0,0 +1,73 @@
+"""Memory footprint and decision agreement of quantized gallery storage.
+
+Run from the backend folder:  python benchmarks/bench_quantized.py [gallery_size]
+
+Decisions are compared with the legacy float64 face_distance path: the
+accept decision at 0.6 (which student, or unknown) and the duplicate check
+at 0.4.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery import STORAGE_MODES, FaceGallery  # noqa: E402
+
+NUM_QUERIES = 500
+
+
+def legacy_decision(known_encodings, query, threshold):
+    distances = np.linalg.norm(known_encodings - query, axis=1)
+    best = int(np.argmin(distances))
+    return best if distances[best] <= threshold else None
+
+
+def gallery_decision(gallery, query, threshold):
+    match = gallery.nearest(query)
+    return match.index if match.distance <= threshold else None
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(0.0, 0.045, size=(n, 128))
+    ids = [f"S{i:06d}" for i in range(n)]
+
+    # Half genuine attempts with varying noise, half unknown faces.
+    picks = rng.integers(0, n, NUM_QUERIES // 2)
+    genuine = encodings[picks] + rng.normal(0.0, 1.0, size=(len(picks), 128)) * rng.uniform(
+        0.01, 0.06, size=(len(picks), 1)
+    )
+    impostors = rng.normal(0.0, 0.045, size=(NUM_QUERIES - len(picks), 128))
+    queries = np.vstack([genuine, impostors])
+
+    known_encodings = np.array([enc.tolist() for enc in encodings])
+    expected = {
+        t: [legacy_decision(known_encodings, q, t) for q in queries] for t in (0.6, 0.4)
+    }
+    print(f"{n} faces, {NUM_QUERIES} queries; legacy float64 matrix = {known_encodings.nbytes / 1e6:.1f} MB")
+    print(
+        f"{'storage':>8} {'scan MB':>8} {'float32 MB':>11} {'ms/query':>9} "
+        f"{'agree@0.6':>10} {'agree@0.4':>10}"
+    )
+
+    for storage in STORAGE_MODES:
+        gallery = FaceGallery.from_lists(encodings, ids, ids, storage=storage)
+        mem = gallery.memory_footprint()
+
+        start = time.perf_counter()
+        got = {t: [gallery_decision(gallery, q, t) for q in queries] for t in (0.6, 0.4)}
+        ms = (time.perf_counter() - start) * 1000 / (2 * NUM_QUERIES)
+
+        agree = {t: np.mean([a == b for a, b in zip(expected[t], got[t])]) for t in got}
+        print(
+            f"{storage:>8} {mem['scan_bytes'] / 1e6:>8.1f} {mem['float32_bytes'] / 1e6:>11.1f} "
+            f"{ms:>9.2f} {agree[0.6]:>10.2%} {agree[0.4]:>10.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
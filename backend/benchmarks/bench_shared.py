@@ -0,0 +1,97 @@
+"""Per-worker memory and enrollment visibility delay of the shared-memory gallery.
+
+Run from the backend folder:  python benchmarks/bench_shared.py [gallery_size] [workers]
+
+Every worker maps the published segment, runs a query, then waits until an
+enrollment made by worker 0 shows up.  Private (anonymous) memory should stay
+flat as workers are added; the matrix is counted once under RssShmem.
+Linux only (reads /proc/self/status).
+"""
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from face_gallery import FaceGallery  # noqa: E402
+from gallery_store import GalleryStore  # noqa: E402
+from shared_gallery import SharedGallery, _unlink  # noqa: E402
+
+POLL_SECONDS = 0.05
+
+
+def rss_mb():
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields[key] = value.strip()
+    return tuple(int(fields[k].split()[0]) / 1024 for k in ("RssAnon", "RssShmem"))
+
+
+def worker(index, store_dir, name, start, results):
+    base_anon, base_shmem = rss_mb()
+    shared = SharedGallery(
+        GalleryStore(store_dir, fsync=False, shared=True), name=name, poll_interval=POLL_SECONDS
+    )
+    gallery = shared.open()
+    gallery.nearest(np.zeros(128))  # touch every page
+    anon, shmem = rss_mb()
+
+    start.wait()
+    if index == 0:
+        enrolled_at = time.time()
+        shared.add(np.full(128, 0.05, dtype=np.float32), "NEW", "New Student")
+    while not shared.current().rows_for("NEW"):
+        time.sleep(POLL_SECONDS / 10)
+    seen_at = time.time()
+    results.put((index, anon - base_anon, shmem - base_shmem, seen_at, enrolled_at if index == 0 else None))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(0.0, 0.09, size=(n, 128)).astype(np.float32)
+    ids = [f"S{i:06d}" for i in range(n)]
+    name = f"sagbench_{os.getpid()}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store_dir = os.path.join(tmp, "face_gallery")
+        GalleryStore(store_dir, fsync=False).save(FaceGallery.from_arrays(encodings, ids, ids))
+        # Publish once up front so the workers only map it.
+        SharedGallery(GalleryStore(store_dir, fsync=False, shared=True), name=name).open()
+
+        start = mp.Event()
+        results = mp.Queue()
+        procs = [
+            mp.Process(target=worker, args=(i, store_dir, name, start, results))
+            for i in range(workers)
+        ]
+        for p in procs:
+            p.start()
+        time.sleep(1.0)
+        start.set()
+        rows = sorted(results.get() for _ in procs)
+        for p in procs:
+            p.join()
+
+        enrolled_at = rows[0][4]
+        print(f"{n} faces, {workers} workers, matrix {encodings.nbytes / 2**20:.1f} MB")
+        print(f"{'worker':>6} {'private MB':>11} {'shmem MB':>9} {'visible after ms':>17}")
+        for index, anon, shmem, seen_at, _ in rows:
+            print(f"{index:>6} {anon:>11.1f} {shmem:>9.1f} {(seen_at - enrolled_at) * 1000:>17.1f}")
+
+        control = SharedGallery(GalleryStore(store_dir, shared=True), name=name)
+        control._control = control._open_control()
+        _unlink(control.read_control().segment)
+        _unlink(f"{name}_ctl")
+
+
+if __name__ == "__main__":
+    main()
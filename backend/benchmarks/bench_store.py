@@ -0,0 +1,85 @@
+"""Cold-start time and memory of the pickle gallery vs. the mmap gallery store.
+
+Run from the backend folder:  python benchmarks/bench_store.py [gallery_size]
+
+Each load runs in a fresh interpreter.  Private (anonymous) memory is what
+multiplies with the worker count; file-backed pages of the memory-mapped
+matrix live in the shared page cache.  Linux only (reads /proc/self/status).
+"""
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from face_gallery import FaceGallery  # noqa: E402
+from gallery_store import GalleryStore  # noqa: E402
+
+
+def rss_mb():
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            fields[key] = value.strip()
+    return tuple(int(fields[k].split()[0]) / 1024 for k in ("RssAnon", "RssFile"))
+
+
+def child(kind, path):
+    base_anon, base_file = rss_mb()
+    start = time.perf_counter()
+    if kind == "pickle":
+        with open(path, "rb") as f:
+            data = pickle.load(f)
+        gallery = FaceGallery.from_lists(data["encodings"], data["admission_nos"], data["names"])
+    else:
+        gallery = GalleryStore(path).load(verify=kind == "store+crc")
+    load_s = time.perf_counter() - start
+    gallery.nearest(np.zeros(128))  # first query touches every page
+    query_s = time.perf_counter() - start - load_s
+    anon, file_backed = rss_mb()
+    print(f"{load_s:.3f} {query_s:.3f} {anon - base_anon:.1f} {file_backed - base_file:.1f}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = np.random.default_rng(0)
+    encodings = rng.normal(0.0, 0.09, size=(n, 128))
+    ids = [f"S{i:06d}" for i in range(n)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pkl = os.path.join(tmp, "face_encodings.pkl")
+        with open(pkl, "wb") as f:
+            pickle.dump(
+                {"encodings": [e.tolist() for e in encodings], "admission_nos": ids, "names": ids}, f
+            )
+        store_dir = os.path.join(tmp, "face_gallery")
+        GalleryStore(store_dir).migrate_pickle(pkl)
+
+        print(f"{n} faces")
+        print(
+            f"{'loader':>10} {'load s':>8} {'1st query s':>12} "
+            f"{'private MB':>11} {'shared MB':>10}"
+        )
+        for kind, path in (("pickle", pkl), ("store", store_dir), ("store+crc", store_dir)):
+            out = subprocess.run(
+                [sys.executable, __file__, "--child", kind, path],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.split()
+            load_s, query_s, anon, file_backed = map(float, out)
+            print(f"{kind:>10} {load_s:>8.3f} {query_s:>12.3f} {anon:>11.1f} {file_backed:>10.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        child(sys.argv[2], sys.argv[3])
+    else:
+        main()
@@ -0,0 +1,93 @@
+"""Encodings needed for a walking queue, per frame vs per track.
+
+Run from the backend folder:  python benchmarks/bench_tracking.py [people] [detect_every]
+
+Simulates a 640x480, 30 fps kiosk camera: students walk across the frame
+one after another (a new one every ~0.7 s, sometimes two side by side),
+with box jitter and a 10% chance that detection misses a face.  Compares
+the encodings a snapshot-per-frame client would trigger with what
+FaceTracker asks for, and counts students whose walk was split into more
+than one track (each extra track costs another encoding).
+"""
+import os
+import sys
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from face_tracker import FaceTracker  # noqa: E402
+
+FPS = 30
+WIDTH, HEIGHT = 640, 480
+MISS_RATE = 0.1
+
+
+def walkers(rng, people):
+    """(start_frame, y, speed px/frame, face size) per student."""
+    out = []
+    frame = 0
+    for _ in range(people):
+        frame += int(rng.integers(int(0.4 * FPS), int(1.0 * FPS)))
+        size = int(rng.integers(70, 130))
+        speed = float(rng.uniform(6, 14))  # crosses 640 px in 1.5-3.5 s
+        y = int(rng.integers(80, HEIGHT - 80 - size))
+        out.append((frame, y, speed, size))
+    return out
+
+
+def boxes_at(rng, people, frame):
+    boxes, owners = [], []
+    for person, (start, y, speed, size) in enumerate(people):
+        x = (frame - start) * speed - size
+        if frame < start or x > WIDTH:
+            continue
+        if rng.random() < MISS_RATE:
+            continue
+        jitter = rng.normal(0, 3, 4)
+        left = max(0, int(x + jitter[0]))
+        right = min(WIDTH, int(x + size + jitter[1]))
+        if right - left < size // 3:
+            continue  # mostly out of frame
+        top, bottom = int(y + jitter[2]), int(y + size + jitter[3])
+        boxes.append((top, right, bottom, left))
+        owners.append(person)
+    return boxes, owners
+
+
+def main():
+    people_n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    every = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    rng = np.random.default_rng(0)
+    people = walkers(rng, people_n)
+    last = people[-1][0] + int(WIDTH / people[-1][2]) + 2 * FPS
+
+    tracker = FaceTracker()
+    per_frame = tracked = detections = 0
+    tracks_of = {}
+    for frame in range(last):
+        boxes, owners = boxes_at(rng, people, frame)
+        per_frame += len(boxes)
+        if frame % every:
+            continue
+        detections += 1
+        assigned, _ = tracker.update(boxes)
+        for track, owner in zip(assigned, owners):
+            tracks_of.setdefault(owner, set()).add(track.id)
+            if tracker.needs_encoding(track):
+                tracked += 1
+                track.status = "identified"  # one encoding settles it
+
+    split = sum(len(ids) > 1 for ids in tracks_of.values())
+    seconds = last / FPS
+    print(f"{people_n} students, {seconds:.0f}s of video, detect every {every} frame(s)")
+    print(f"snapshot per frame : {per_frame:6d} encodings ({per_frame / seconds:5.1f}/s)")
+    print(f"tracked            : {tracked:6d} encodings ({tracked / seconds:5.1f}/s)"
+          f"  over {detections} detection passes")
+    print(f"tracks per student : {tracker.next_id - 1} tracks for {len(tracks_of)} students, "
+          f"{split} split")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""1:1 verification (FaceGallery.verify) vs a 1:N search (FaceGallery.nearest).
+
+Run from the backend folder:  python benchmarks/bench_verify.py
+
+Galleries of random 128-d templates, three per student.  verify only reads
+the claimed student's rows, so its cost stays flat while nearest grows with
+the gallery.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from face_gallery import FaceGallery  # noqa: E402
+
+
+def timed(fn, queries, claims):
+    start = time.perf_counter()
+    for q, claim in zip(queries, claims):
+        fn(q, claim)
+    return (time.perf_counter() - start) / len(queries) * 1e6
+
+
+def main():
+    rng = np.random.default_rng(0)
+    runs = 300
+    print(f"{'templates':>10} {'1:N us':>10} {'1:1 us':>10} {'speed-up':>9}")
+    for students in (1_000, 10_000, 50_000):
+        encodings = rng.normal(0, 0.1, (students * 3, 128)).astype(np.float32)
+        admission_nos = [f"S{i // 3}" for i in range(len(encodings))]
+        gallery = FaceGallery.from_lists(encodings, admission_nos, admission_nos)
+        picks = rng.integers(0, len(encodings), runs)
+        queries = encodings[picks] + rng.normal(0, 0.01, (runs, 128)).astype(np.float32)
+        claims = [admission_nos[i] for i in picks]
+        gallery.rows_for(claims[0])  # builds the admission index once, as a server would
+        search = timed(lambda q, _: gallery.nearest(q), queries, claims)
+        verify = timed(lambda q, claim: gallery.verify(q, claim), queries, claims)
+        assert all(gallery.verify(q, c).admission_no == c for q, c in zip(queries[:20], claims))
+        print(f"{len(encodings):>10} {search:>10.1f} {verify:>10.1f} {search / verify:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Distance evaluations and latency of VP-tree search against brute force.
+
+Run from the backend folder:  python benchmarks/bench_vptree.py
+
+Two synthetic galleries are measured: isotropic noise (the worst case for
+any metric tree) and encodings with a low intrinsic dimension, which is
+closer to how real face embeddings are distributed.
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from face_gallery import FaceGallery  # noqa: E402
+from vp_tree import VPTree  # noqa: E402
+
+GALLERY_SIZES = [1_000, 10_000, 100_000]
+NUM_QUERIES = 200
+
+
+def isotropic(rng, n):
+    return rng.normal(0.0, 0.09, size=(n, 128))
+
+
+def low_intrinsic_dim(rng, n, latent=12):
+    basis = rng.normal(0.0, 0.09, size=(latent, 128))
+    return rng.normal(0.0, 1.0, size=(n, latent)) @ basis + rng.normal(0.0, 0.01, size=(n, 128))
+
+
+def run(name, make):
+    rng = np.random.default_rng(0)
+    print(f"\n{name}")
+    print(
+        f"{'faces':>8} {'query':>12} {'evals/query':>12} {'% of gallery':>13} "
+        f"{'tree ms':>8} {'brute ms':>9}"
+    )
+    for n in GALLERY_SIZES:
+        encodings = make(rng, n).astype(np.float32)
+        picks = rng.integers(0, n, NUM_QUERIES)
+        queries = encodings[picks] + rng.normal(0.0, 0.02, size=(NUM_QUERIES, 128)).astype(np.float32)
+
+        gallery = FaceGallery.from_lists(encodings, list(range(n)), list(range(n)))
+        tree = VPTree().build(encodings, np.arange(n))
+
+        cases = [
+            ("1-NN", lambda q: tree.knn(q, 1), lambda q: gallery.nearest(q)),
+            ("r=0.4", lambda q: tree.radius(q, 0.4), lambda q: gallery.within(q, 0.4)),
+            ("r=0.6", lambda q: tree.radius(q, 0.6), lambda q: gallery.within(q, 0.6)),
+        ]
+        for label, tree_fn, brute_fn in cases:
+            tree.distance_evals = 0
+            start = time.perf_counter()
+            for q in queries:
+                tree_fn(q)
+            tree_ms = (time.perf_counter() - start) * 1000 / NUM_QUERIES
+            evals = tree.distance_evals / NUM_QUERIES
+
+            start = time.perf_counter()
+            for q in queries:
+                brute_fn(q)
+            brute_ms = (time.perf_counter() - start) * 1000 / NUM_QUERIES
+
+            print(
+                f"{n:>8} {label:>12} {evals:>12.0f} {evals / n:>13.1%} "
+                f"{tree_ms:>8.2f} {brute_ms:>9.2f}"
+            )
+
+
+def main():
+    run("isotropic 128-d", isotropic)
+    run("low intrinsic dimension (12)", low_intrinsic_dim)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""One attendance decision from a short burst of frames of the same student.
+
+A single frame near the 0.6 threshold is a coin flip: blur, pose or
+lighting can push the right student just over it, or a look-alike just
+under.  With 3-5 frames every candidate that was the nearest match in any
+frame is scored against all of them:
+
+* its distance is the mean over the frames (noise averages out), and
+* it must be the nearest match in a strict majority of the frames.
+
+The best-scoring candidate is accepted only when both hold and its mean
+distance is within the threshold.  The caller exits early, without a vote,
+when a single frame is already a confident match.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+BurstDecision = namedtuple(
+    "BurstDecision", ["admission_no", "name", "distance", "votes", "candidates"]
+)
+
+
+def decide(gallery, encodings, matches, threshold):
+    """BurstDecision from per-frame encodings and their nearest Matches.
+
+    ``admission_no`` is None when no candidate wins; ``candidates`` holds
+    every candidate's mean distance and vote count for the response.
+    """
+    names = {}
+    for match in matches:
+        names.setdefault(match.admission_no, match.name)
+    admission_nos = list(names)
+    dists = gallery.candidate_distances(encodings, admission_nos)
+    votes = np.bincount(np.argmin(dists, axis=1), minlength=len(admission_nos))
+    means = dists.mean(axis=0)
+
+    candidates = [
+        {
+            "admission_no": adm,
+            "name": names[adm],
+            "mean_distance": round(float(means[j]), 3),
+            "votes": int(votes[j]),
+        }
+        for j, adm in enumerate(admission_nos)
+    ]
+    candidates.sort(key=lambda c: c["mean_distance"])
+
+    best = int(np.argmin(means))
+    distance = float(means[best])
+    if distance > threshold or 2 * votes[best] <= len(encodings):
+        return BurstDecision(None, None, distance, int(votes[best]), candidates)
+    adm = admission_nos[best]
+    return BurstDecision(adm, names[adm], distance, int(votes[best]), candidates)
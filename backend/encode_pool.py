@@ -0,0 +1,220 @@
+"""Fixed-size process pool for the CPU-heavy part of recognition requests.
+
+dlib detection and encoding hold the GIL for most of a frame, so running them
+on Flask's request threads stalls every other endpoint in the process.
+``EncodePool.run`` hands the upload to a worker process instead and only
+blocks the calling thread:
+
+* the upload bytes go through one of ``max_queue`` preallocated
+  shared-memory slots (only the small FrameJob/FrameResult are pickled);
+* the slots double as the bounded queue: when all of them are in flight,
+  ``run`` raises PoolBusyError at once, with a Retry-After estimate, instead
+  of queueing more threads behind the workers;
+* workers are forked when the pool is created, before the app starts any
+  threads or database clients, and each keeps its own FramePool.
+"""
+import math
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+
+from face_pipeline import StageTimer, run_frame
+from frame_buffers import worker_pool
+from frame_gate import FrameGate
+
+
+class PoolBusyError(Exception):
+    def __init__(self, retry_after):
+        super().__init__(f"Recognition workers are busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class EncodePool:
+    def __init__(self, workers=None, max_queue=None, slot_bytes=4 * 2**20, gate_options=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max(max_queue or 2 * self.workers, self.workers)
+        self.slot_bytes = slot_bytes
+        self.gate_options = gate_options
+        self._slots = []
+        try:
+            for _ in range(self.max_queue):
+                self._slots.append(shared_memory.SharedMemory(create=True, size=slot_bytes))
+            self._executor = self._start()
+        except BaseException:
+            self._unlink_slots()
+            raise
+        self._free = list(self._slots)
+        self._lock = threading.Lock()
+        self._job_seconds = 0.2
+        self.submitted = 0
+        self.rejected = 0
+
+    def submit(self, buf, job):
+        """Start ``job`` on the image bytes ``buf`` in a worker; returns a PendingFrame.
+
+        Raises PoolBusyError at once when every slot is in flight.
+        """
+        with self._lock:
+            if not self._free:
+                self.rejected += 1
+                raise PoolBusyError(self.retry_after())
+            slot = self._free.pop()
+            self.submitted += 1
+            executor = self._executor
+
+        started = time.perf_counter()
+        try:
+            if len(buf) <= slot.size:
+                slot.buf[: len(buf)] = memoryview(buf)
+                future = executor.submit(_run_job, slot.name, len(buf), None, job)
+            else:  # bigger than a slot: pickle the bytes instead
+                future = executor.submit(_run_job, None, 0, np.asarray(buf), job)
+        except BaseException as e:
+            # Never submitted (broken or shut-down pool, bad buffer): the slot
+            # would otherwise stay taken for good.
+            self._release(slot)
+            if isinstance(e, BrokenProcessPool):
+                self._restart(executor)
+            raise
+        # The slot stays taken until the worker is really done with it, even
+        # if the request gives up waiting.
+        future.add_done_callback(lambda f: self._finished(f, slot, started, executor))
+        return PendingFrame(future, started)
+
+    def run(self, buf, job, timer=None, timeout=None):
+        """FrameResult of ``job`` on ``buf``, computed in a worker."""
+        return self.submit(buf, job).result(timer, timeout)
+
+    def retry_after(self):
+        """Seconds until a full queue has likely drained (at least 1)."""
+        return max(1, math.ceil(self._job_seconds * self.max_queue / self.workers))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self.max_queue - len(self._free),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "avg_job_ms": round(self._job_seconds * 1000, 1),
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._unlink_slots()
+
+    def _unlink_slots(self):
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+
+    def _start(self):
+        methods = mp.get_all_start_methods()
+        context = mp.get_context("fork" if "fork" in methods else "spawn")
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.gate_options,),
+        )
+        # Forks every worker now, from the thread creating the pool.
+        try:
+            executor.submit(os.getpid).result()
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor
+
+    def _restart(self, broken):
+        # A worker died (e.g. crashed inside dlib); the executor is unusable.
+        with self._lock:
+            if self._executor is not broken:
+                return
+            print("⚠️ Encode worker died, restarting the pool")
+            self._executor = self._start()
+
+    def _finished(self, future, slot, started, executor):
+        with self._lock:
+            self._free.append(slot)
+            if not future.cancelled() and future.exception() is None:
+                elapsed = time.perf_counter() - started
+                self._job_seconds = 0.9 * self._job_seconds + 0.1 * elapsed
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._restart(executor)
+
+    def _release(self, slot):
+        with self._lock:
+            self._free.append(slot)
+
+
+class PendingFrame:
+    """A frame submitted to the pool; ``future`` resolves to (FrameResult, stages)."""
+
+    def __init__(self, future, started):
+        self.future = future
+        self.started = started
+
+    def cancel(self):
+        return self.future.cancel()
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timer=None, timeout=None):
+        """The FrameResult; worker stage timings are added to ``timer``.
+
+        The time spent queued and transferring shows up as a "queue" stage.
+        """
+        result, stages = self.future.result(timeout=timeout)
+        if timer is not None:
+            for name, ms in stages.items():
+                timer.stages[name] = timer.stages.get(name, 0.0) + ms
+            elapsed = (time.perf_counter() - self.started) * 1000
+            queued = max(0.0, elapsed - sum(stages.values()))
+            timer.stages["queue"] = timer.stages.get("queue", 0.0) + queued
+        return result
+
+
+# ---- worker process side ----
+_gate = None
+_segments = {}
+
+
+def _init_worker(gate_options):
+    global _gate
+    cv2.setNumThreads(1)  # one frame per worker; the pool provides the parallelism
+    _gate = None
+    if gate_options is not None:
+        try:
+            _gate = FrameGate(**gate_options)
+        except ValueError:
+            _gate = FrameGate(**{k: v for k, v in gate_options.items() if k != "haar"})
+
+
+def _run_job(slot_name, length, data, job):
+    buf = data
+    if slot_name is not None:
+        segment = _segments.get(slot_name)
+        if segment is None:
+            segment = _segments[slot_name] = _attach(slot_name)
+        buf = np.frombuffer(segment.buf, dtype=np.uint8, count=length)
+    timer = StageTimer()
+    result = run_frame(buf, job, _gate, timer, worker_pool())
+    return result, timer.stages
+
+
+def _attach(name):
+    # The parent owns (and unlinks) the slots; workers must not unregister
+    # them from the shared resource tracker.
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
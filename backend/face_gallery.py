@@ -0,0 +1,785 @@
+"""In-memory gallery of enrolled face encodings with a vectorized matcher."""
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from ann_index import IVFPQIndex
+from vp_tree import VPTree
+
+ENCODING_DIM = 128
+FILTER_FIELDS = ("branch", "semester", "specialization")
+STORAGE_MODES = ("float32", "float16", "int8")
+_SCAN_CHUNK = 8192
+
+Match = namedtuple("Match", ["index", "admission_no", "name", "distance"])
+_View = namedtuple(
+    "_View",
+    [
+        "matrix",
+        "sq_norms",
+        "codes",
+        "code_norms",
+        "scale",
+        "alive",
+        "dead",
+        "size",
+        "admission_nos",
+        "names",
+    ],
+)
+
+
+class FaceGallery:
+    """Enrolled encodings kept as one contiguous float32 matrix.
+
+    Squared row norms are cached so every query is a single BLAS
+    matrix-vector product: ||a - b||^2 = ||a||^2 - 2 a.b + ||b||^2.
+    Rows are appended into spare capacity, so enrolling a face does not
+    copy the whole matrix.
+
+    Queries accept a ``where`` dict over FILTER_FIELDS and ``admission_no``
+    (a scalar or a list of allowed values).  Each field keeps one boolean
+    row mask per value, built on first use and kept current on enrollment,
+    so a filtered query only computes distances for the selected rows.
+
+    ``build_ann`` attaches an IVF-PQ index for very large galleries:
+    unfiltered queries then take ``ann_rerank`` approximate candidates and
+    re-rank them exactly, and later enrollments are appended to the index
+    without retraining.  ``build_tree`` instead attaches a VP-tree, which
+    keeps results exact while pruning most rows for k-NN and ``within``
+    radius queries.
+
+    With ``storage="float16"`` or ``"int8"`` (per-dimension scale) brute-force
+    scans run over the quantized copy instead.  Every row whose quantized
+    distance is within twice the worst quantization error of the k-th best
+    (or of the radius) is re-ranked against the float32 rows, so results are
+    the same as a float32 scan.
+
+    Deleting a student only tombstones its rows (found through the
+    admission_no -> rows index); scans skip dead rows until ``compact``
+    rebuilds the arrays without them.
+    """
+
+    def __init__(self, dim=ENCODING_DIM, capacity=16, storage="float32"):
+        if storage not in STORAGE_MODES:
+            raise ValueError(f"storage must be one of {STORAGE_MODES}")
+        self.dim = dim
+        self.storage = storage
+        self._matrix = np.zeros((max(capacity, 1), dim), dtype=np.float32)
+        self._sq_norms = np.zeros(len(self._matrix), dtype=np.float32)
+        self._codes = None
+        self._code_norms = None
+        self._scale = np.full(dim, 0.5 / 127, dtype=np.float32)
+        self._quant_err = 0.0
+        if storage != "float32":
+            self._codes = np.zeros(self._matrix.shape, dtype=self._code_dtype)
+            self._code_norms = np.zeros(len(self._matrix), dtype=np.float32)
+        self._alive = np.zeros(len(self._matrix), dtype=bool)
+        self._dead = 0
+        self._layout = 0
+        self._size = 0
+        self.admission_nos = []
+        self.names = []
+        self.metadata = {field: [] for field in FILTER_FIELDS}
+        self._admission_index = {}
+        self._masks = {}
+        self._ann = None
+        self.ann_rerank = 64
+        self._tree = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def from_lists(cls, encodings, admission_nos, names, metadata=None, storage="float32"):
+        encodings = np.array(encodings, dtype=np.float32)
+        if encodings.size == 0:
+            return cls(storage=storage)
+        return cls.from_arrays(
+            encodings.reshape(len(encodings), -1), admission_nos, names, metadata, storage
+        )
+
+    @classmethod
+    def from_arrays(
+        cls, matrix, admission_nos, names, metadata=None, storage="float32", sq_norms=None
+    ):
+        """Wrap an existing float32 matrix (e.g. a read-only memmap) without copying.
+
+        The first enrollment copies it into a growable in-memory buffer.
+        """
+        if not (len(matrix) == len(admission_nos) == len(names)):
+            raise ValueError("encodings, admission_nos and names differ in length")
+        metadata = metadata or {}
+
+        gallery = cls(dim=matrix.shape[1], capacity=1, storage=storage)
+        gallery._matrix = matrix
+        if sq_norms is None:
+            sq_norms = np.einsum("ij,ij->i", matrix, matrix)
+        gallery._sq_norms = sq_norms
+        if gallery._codes is not None:
+            gallery._codes = np.zeros(matrix.shape, dtype=gallery._code_dtype)
+            gallery._code_norms = np.zeros(len(matrix), dtype=np.float32)
+        if storage == "int8" and len(matrix):
+            gallery._scale = np.maximum(np.abs(matrix).max(axis=0), 1e-6) / 127
+        gallery._quantize_rows(0, len(matrix))
+        gallery._alive = np.ones(len(matrix), dtype=bool)
+        gallery._size = len(matrix)
+        gallery.admission_nos = list(admission_nos)
+        gallery.names = list(names)
+        for field in FILTER_FIELDS:
+            values = list(metadata.get(field) or [])
+            values += [""] * (len(matrix) - len(values))
+            # Few distinct values (branches, semesters); normalize each once.
+            normalized = {v: _norm(v) for v in set(values)}
+            gallery.metadata[field] = [normalized[v] for v in values[: len(matrix)]]
+        gallery._admission_index = None
+        return gallery
+
+    def __len__(self):
+        return self._size - self._dead
+
+    @property
+    def dead_fraction(self):
+        return self._dead / self._size if self._size else 0.0
+
+    @property
+    def encodings(self):
+        with self._lock:
+            return self._matrix[: self._size][self._alive[: self._size]]
+
+    def identities(self):
+        """(admission_no, name) of every live row."""
+        with self._lock:
+            return [
+                (self.admission_nos[i], self.names[i])
+                for i in np.flatnonzero(self._alive[: self._size])
+            ]
+
+    def memory_footprint(self):
+        """Bytes held per representation, next to the legacy float64 layout."""
+        with self._lock:
+            rows = self._size * self.dim
+            scan = self._codes if self._codes is not None else self._matrix
+            return {
+                "storage": self.storage,
+                "faces": len(self),
+                "tombstones": self._dead,
+                "float64_bytes": rows * 8,
+                "float32_bytes": rows * 4,
+                "scan_bytes": rows * scan.itemsize,
+            }
+
+    def export(self):
+        """Point-in-time copy of the live rows and identities, for persisting."""
+        with self._lock:
+            live = np.flatnonzero(self._alive[: self._size])
+            return {
+                "encodings": np.array(self._matrix[live], dtype=np.float32),
+                "sq_norms": np.array(self._sq_norms[live], dtype=np.float32),
+                "admission_nos": [self.admission_nos[i] for i in live],
+                "names": [self.names[i] for i in live],
+                "metadata": {f: [v[i] for i in live] for f, v in self.metadata.items()},
+            }
+
+    # ---- mutation ----
+    def add(self, encoding, admission_no, name, metadata=None):
+        vec = self._as_query(encoding)
+        metadata = metadata or {}
+        with self._lock:
+            if self._size == len(self._matrix):
+                self._grow(max(2 * len(self._matrix), 16))  # may wrap an empty matrix
+            row = self._size
+            self._matrix[row] = vec
+            self._sq_norms[row] = vec @ vec
+            if self.storage == "int8" and np.any(np.abs(vec) > 127 * self._scale):
+                # Widen the scale instead of clipping, which would inflate the
+                # error bound (and the re-rank set) for every later query.
+                self._requantize(np.maximum(self._scale, np.abs(vec) / 127), row + 1)
+            else:
+                self._quantize_rows(row, row + 1)
+            self._alive[row] = True
+            self.admission_nos.append(admission_no)
+            self.names.append(name)
+            if self._admission_index is not None:
+                self._admission_index.setdefault(admission_no, []).append(row)
+            if self._ann is not None:
+                self._ann.add(vec, [row])
+            if self._tree is not None:
+                self._tree.insert(vec, row)
+            for field in FILTER_FIELDS:
+                value = _norm(metadata.get(field, ""))
+                self.metadata[field].append(value)
+                masks = self._masks.get(field)
+                if masks is not None:
+                    if value not in masks:
+                        masks[value] = np.zeros(len(self._matrix), dtype=bool)
+                    masks[value][row] = True
+            self._size = row + 1
+            return row
+
+    def set_metadata(self, metadata_by_admission):
+        """Overwrite filter fields for every row of the given students."""
+        with self._lock:
+            updated = 0
+            for field in FILTER_FIELDS:
+                values = list(self.metadata[field])
+                changed = False
+                for admission_no, metadata in metadata_by_admission.items():
+                    if field not in metadata:
+                        continue
+                    for row in self._rows_by_admission.get(admission_no, []):
+                        values[row] = _norm(metadata[field])
+                        changed = True
+                if changed:
+                    self.metadata[field] = values
+                    self._masks.pop(field, None)
+                    updated += 1
+            return updated
+
+    def rows_for(self, admission_no, where=None):
+        with self._lock:
+            return [
+                row for row in self._rows_by_admission.get(admission_no, [])
+                if self._row_allowed(row, where)
+            ]
+
+    def remove_admission(self, admission_no):
+        """Tombstone every template enrolled for one student."""
+        with self._lock:
+            return self.remove_indices(self._rows_by_admission.get(admission_no, []))
+
+    def replace_template(self, encoding, admission_no, name, metadata=None):
+        """Swap a student's templates for a single new encoding."""
+        with self._lock:
+            self.remove_admission(admission_no)
+            return self.add(encoding, admission_no, name, metadata)
+
+    def remove_indices(self, indices):
+        """Tombstone rows; O(rows removed), the arrays are left in place."""
+        with self._lock:
+            rows = sorted(
+                {int(i) for i in indices if 0 <= int(i) < self._size and self._alive[int(i)]}
+            )
+            for row in rows:
+                self._alive[row] = False
+                siblings = self._rows_by_admission.get(self.admission_nos[row], [])
+                if row in siblings:
+                    siblings.remove(row)
+                if not siblings:
+                    self._rows_by_admission.pop(self.admission_nos[row], None)
+                if self._tree is not None:
+                    self._tree.remove(row)
+            self._dead += len(rows)
+            return len(rows)
+
+    def compact(self):
+        """Rebuild the arrays without tombstoned rows; returns rows reclaimed."""
+        with self._lock:
+            if self._dead == 0:
+                return 0
+            keep = self._alive[: self._size].copy()
+            kept = np.flatnonzero(keep)
+            matrix = np.zeros((max(len(kept), 16), self.dim), dtype=np.float32)
+            sq_norms = np.zeros(len(matrix), dtype=np.float32)
+            matrix[: len(kept)] = self._matrix[kept]
+            sq_norms[: len(kept)] = self._sq_norms[kept]
+            if self._codes is not None:
+                codes = np.zeros(matrix.shape, dtype=self._codes.dtype)
+                code_norms = np.zeros(len(matrix), dtype=np.float32)
+                codes[: len(kept)] = self._codes[kept]
+                code_norms[: len(kept)] = self._code_norms[kept]
+                self._codes, self._code_norms = codes, code_norms
+            alive = np.zeros(len(matrix), dtype=bool)
+            alive[: len(kept)] = True
+
+            # Swap in fresh containers so in-flight queries keep a consistent view.
+            self.admission_nos = [self.admission_nos[i] for i in kept]
+            self.names = [self.names[i] for i in kept]
+            self.metadata = {
+                f: [values[i] for i in kept] for f, values in self.metadata.items()
+            }
+            self._matrix, self._sq_norms, self._alive = matrix, sq_norms, alive
+            reclaimed = self._size - len(kept)
+            self._size = len(kept)
+            self._dead = 0
+            self._layout += 1
+            self._masks = {}
+            self._admission_index = None
+            new_ids = np.full(len(keep), -1, dtype=np.int64)
+            new_ids[kept] = np.arange(len(kept))
+            if self._ann is not None:
+                self._ann.remap(new_ids)
+            if self._tree is not None:
+                self._tree.remap(new_ids)
+                if self._tree.dead_fraction > 0.5:
+                    self._tree = VPTree().build(matrix[: len(kept)], np.arange(len(kept)))
+            return reclaimed
+
+    def _grow(self, capacity):
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        sq_norms = np.zeros(capacity, dtype=np.float32)
+        matrix[: self._size] = self._matrix[: self._size]
+        sq_norms[: self._size] = self._sq_norms[: self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self._size] = self._alive[: self._size]
+        self._matrix, self._sq_norms, self._alive = matrix, sq_norms, alive
+        if self._codes is not None:
+            codes = np.zeros((capacity, self.dim), dtype=self._codes.dtype)
+            code_norms = np.zeros(capacity, dtype=np.float32)
+            codes[: self._size] = self._codes[: self._size]
+            code_norms[: self._size] = self._code_norms[: self._size]
+            self._codes, self._code_norms = codes, code_norms
+        for masks in self._masks.values():
+            for value, mask in masks.items():
+                grown = np.zeros(capacity, dtype=bool)
+                grown[: len(mask)] = mask
+                masks[value] = grown
+
+    # ---- quantized storage ----
+    @property
+    def _code_dtype(self):
+        return np.float16 if self.storage == "float16" else np.int8
+
+    def _quantize_rows(self, start, stop):
+        if self._codes is None or stop <= start:
+            return
+        vecs = self._matrix[start:stop]
+        if self.storage == "float16":
+            codes = vecs.astype(np.float16)
+            approx = codes.astype(np.float32)
+        else:
+            codes = np.clip(np.rint(vecs / self._scale), -127, 127).astype(np.int8)
+            approx = codes * self._scale
+        self._codes[start:stop] = codes
+        self._code_norms[start:stop] = np.einsum("ij,ij->i", approx, approx)
+        err = np.sqrt(np.einsum("ij,ij->i", vecs - approx, vecs - approx)).max()
+        self._quant_err = max(self._quant_err, float(err))
+
+    def _requantize(self, scale, stop):
+        # Fresh arrays, so scans holding the old view stay consistent.
+        self._codes = np.zeros(self._matrix.shape, dtype=self._codes.dtype)
+        self._code_norms = np.zeros(len(self._matrix), dtype=np.float32)
+        self._scale = scale.astype(np.float32)
+        self._quant_err = 0.0
+        self._quantize_rows(0, stop)
+
+    def _approx_distances(self, codes, code_norms, scale, query):
+        weights = query * scale if self.storage == "int8" else query
+        dots = np.empty(len(codes), dtype=np.float32)
+        # Widen in chunks so a scan never materializes a full float32 copy.
+        for start in range(0, len(codes), _SCAN_CHUNK):
+            chunk = codes[start : start + _SCAN_CHUNK].astype(np.float32)
+            dots[start : start + _SCAN_CHUNK] = chunk @ weights
+        d2 = code_norms - 2.0 * dots + query @ query
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+    @property
+    def _rows_by_admission(self):
+        # Built on first use; galleries wrapped for read-only matching rarely need it.
+        with self._lock:
+            if self._admission_index is None:
+                self._admission_index = self._build_admission_index()
+            return self._admission_index
+
+    def _build_admission_index(self):
+        index = {}
+        if self._dead:
+            rows = np.flatnonzero(self._alive[: self._size]).tolist()
+            pairs = zip(rows, [self.admission_nos[row] for row in rows])
+        else:
+            pairs = enumerate(self.admission_nos)
+        for row, admission_no in pairs:
+            rows_for = index.get(admission_no)
+            if rows_for is None:
+                index[admission_no] = [row]
+            else:
+                rows_for.append(row)
+        return index
+
+    # ---- approximate index ----
+    def build_ann(self, nlist=None, m=16, nprobe=8, rerank=64):
+        """Train an IVF-PQ index over the current rows and use it for queries."""
+        with self._lock:
+            size, layout = self._size, self._layout
+            data = self._matrix[:size].copy()
+        if size == 0:
+            return None
+
+        # Tombstoned rows are indexed too; queries drop them after the search.
+        index = IVFPQIndex(nlist=nlist or max(1, int(4 * np.sqrt(size))), m=m, nprobe=nprobe)
+        index.train(data)
+        index.add(data, np.arange(size))
+        with self._lock:
+            if self._layout != layout:
+                return None  # compacted while training; caller can retry
+            if self._size > size:
+                index.add(self._matrix[size : self._size], np.arange(size, self._size))
+            self._ann = index
+            self.ann_rerank = rerank
+        return index
+
+    def drop_ann(self):
+        with self._lock:
+            self._ann = None
+
+    @property
+    def ann(self):
+        return self._ann
+
+    # ---- metric tree ----
+    def build_tree(self, leaf_size=32):
+        """Index the current rows with a VP-tree for exact pruned search."""
+        with self._lock:
+            size, layout = self._size, self._layout
+            live = np.flatnonzero(self._alive[:size])
+            data = self._matrix[live]
+
+        tree = VPTree(leaf_size=leaf_size).build(data, live)
+        with self._lock:
+            if self._layout != layout:
+                return None  # compacted while building; caller can retry
+            for row in np.flatnonzero(~self._alive[:size]):
+                tree.remove(row)  # tombstoned while building
+            for row in np.flatnonzero(self._alive[size : self._size]) + size:
+                tree.insert(self._matrix[row], row)
+            self._tree = tree
+        return tree
+
+    def drop_tree(self):
+        with self._lock:
+            self._tree = None
+
+    @property
+    def tree(self):
+        return self._tree
+
+    def inherit_indexes(self, previous):
+        """Take over ``previous``'s ANN index / VP-tree instead of building new ones.
+
+        Meant for the next version of the same gallery (e.g. one published
+        by SharedGallery): ``previous``'s live rows in order, minus removed
+        students, then new rows.  Removed rows are dropped from a copy of the
+        index and new rows inserted; ``previous`` keeps its own.  Returns
+        False, carrying nothing, when the rows do not line up that way or
+        most of them are new.
+        """
+        with previous._lock:
+            old, ann, tree = previous._snapshot(), previous._ann, previous._tree
+            rerank = previous.ann_rerank
+        if ann is None and tree is None:
+            return False
+        with self._lock:
+            new, layout = self._snapshot(), self._layout
+
+        new_ids = np.full(old.size, -1, dtype=np.int64)
+        kept = 0
+        for row in np.flatnonzero(old.alive[: old.size]).tolist():
+            if kept < new.size and old.admission_nos[row] == new.admission_nos[kept]:
+                new_ids[row] = kept
+                kept += 1
+        old_rows = np.flatnonzero(new_ids >= 0)
+        if new.size - kept > kept or not np.array_equal(old.matrix[old_rows], new.matrix[:kept]):
+            return False  # mostly different rows (e.g. a restore): rebuild instead
+        added = np.flatnonzero(new.alive[kept : new.size]) + kept
+
+        if ann is not None:
+            ann = ann.remapped(new_ids)
+            if len(added):
+                ann.add(new.matrix[added], added)
+        if tree is not None:
+            tree = tree.remapped(new_ids)
+            if tree.dead_fraction > 0.5:
+                return False  # mostly dead vantage points; worth a rebuild
+            for row in added:
+                tree.insert(new.matrix[row], row)
+
+        with self._lock:
+            if self._layout != layout:
+                return False  # compacted meanwhile
+            # Rows added or tombstoned since the snapshot.
+            for row in range(new.size, self._size):
+                if ann is not None:
+                    ann.add(self._matrix[row], [row])
+                if tree is not None:
+                    tree.insert(self._matrix[row], row)
+            if tree is not None:
+                for row in np.flatnonzero(~self._alive[: self._size]):
+                    tree.remove(row)
+            self._ann, self._tree = ann, tree
+            if ann is not None:
+                self.ann_rerank = rerank
+        return True
+
+    # ---- filters ----
+    def select(self, where=None):
+        """Row indices allowed by ``where``, or None when nothing is filtered."""
+        with self._lock:
+            return self._select(where)
+
+    def _select(self, where):
+        where = {f: v for f, v in (where or {}).items() if v is not None}
+        if not where:
+            return None
+        mask = self._alive[: self._size].copy()
+        for field, allowed in where.items():
+            if isinstance(allowed, (str, int)):
+                allowed = [allowed]
+            mask &= self._field_mask(field, allowed)
+        return np.flatnonzero(mask)
+
+    def _row_allowed(self, row, where):
+        for field, allowed in (where or {}).items():
+            if allowed is None:
+                continue
+            if isinstance(allowed, (str, int)):
+                allowed = [allowed]
+            if field == "admission_no":
+                if self.admission_nos[row] not in allowed:
+                    return False
+            elif field not in FILTER_FIELDS:
+                raise ValueError(f"Cannot filter gallery on '{field}'")
+            elif self.metadata[field][row] not in {_norm(v) for v in allowed}:
+                return False
+        return True
+
+    def _field_mask(self, field, allowed):
+        mask = np.zeros(self._size, dtype=bool)
+        if field == "admission_no":
+            for admission_no in allowed:
+                mask[self._rows_by_admission.get(admission_no, [])] = True
+            return mask
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Cannot filter gallery on '{field}'")
+
+        masks = self._masks.get(field)
+        if masks is None:
+            masks = {}
+            for row, value in enumerate(self.metadata[field]):
+                if value not in masks:
+                    masks[value] = np.zeros(len(self._matrix), dtype=bool)
+                masks[value][row] = True
+            self._masks[field] = masks
+        for value in allowed:
+            value_mask = masks.get(_norm(value))
+            if value_mask is not None:
+                mask |= value_mask[: self._size]
+        return mask
+
+    # ---- queries ----
+    def distances(self, encoding):
+        """Distance to every physical row; tombstoned rows read as inf."""
+        view = self._snapshot()
+        size = view.size
+        dists = self._distances(view.matrix[:size], view.sq_norms[:size], self._as_query(encoding))
+        dists[~view.alive[:size]] = np.inf
+        return dists
+
+    def nearest(self, encoding, where=None):
+        matches = self.top_k(encoding, 1, where=where)
+        return matches[0] if matches else None
+
+    def nearest_many(self, encodings, where=None):
+        """Nearest live row (a Match, or None if nothing is selected) per encoding.
+
+        Every query is answered from one matrix-matrix product per chunk of
+        gallery rows, instead of one scan each.  Always exact float32.
+        """
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            view = self._snapshot()
+            rows = self._select(where)
+        if rows is None and view.dead:
+            rows = np.flatnonzero(view.alive[: view.size])
+        total = view.size if rows is None else len(rows)
+        if len(queries) == 0 or total == 0:
+            return [None] * len(queries)
+
+        cols = np.arange(len(queries))
+        best = np.full(len(queries), np.inf, dtype=np.float32)
+        best_rows = np.zeros(len(queries), dtype=np.int64)
+        weights = np.ascontiguousarray(queries.T) * -2.0
+        # Keep each rows x queries block around 512 KB so it stays in cache.
+        step = max(256, min(_SCAN_CHUNK, 131072 // len(queries)))
+        for start in range(0, total, step):
+            stop = min(start + step, total)
+            chunk = np.arange(start, stop) if rows is None else rows[start:stop]
+            picked = slice(start, stop) if rows is None else chunk
+            d2 = view.matrix[picked] @ weights
+            d2 += view.sq_norms[picked][:, None]
+            j = np.argmin(d2, axis=0)
+            values = d2[j, cols]
+            better = values < best
+            best[better] = values[better]
+            best_rows[better] = chunk[j[better]]
+
+        best += np.einsum("ij,ij->i", queries, queries)
+        dists = np.sqrt(np.maximum(best, 0.0))
+        return [
+            Match(int(row), view.admission_nos[row], view.names[row], float(dist))
+            for row, dist in zip(best_rows, dists)
+        ]
+
+    def candidate_distances(self, encodings, admission_nos):
+        """Distance from each encoding to each student's closest live template.
+
+        A (len(encodings), len(admission_nos)) array; inf for students
+        without live rows.
+        """
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, self.dim)
+        with self._lock:
+            view = self._snapshot()
+            rows = [list(self._rows_by_admission.get(a, [])) for a in admission_nos]
+        out = np.full((len(queries), len(rows)), np.inf, dtype=np.float32)
+        q_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        for j, student_rows in enumerate(rows):
+            if student_rows:
+                d2 = queries @ view.matrix[student_rows].T
+                d2 *= -2.0
+                d2 += view.sq_norms[student_rows]
+                d2 += q_norms
+                out[:, j] = np.sqrt(np.maximum(d2, 0.0)).min(axis=1)
+        return out
+
+    def verify(self, encoding, admission_no, where=None):
+        """1:1 match against one student's live templates, or None if they have
+        none (or none allowed by ``where``).
+
+        Only that student's rows are read, so the cost does not grow with
+        the gallery.
+        """
+        query = self._as_query(encoding)
+        with self._lock:
+            view = self._snapshot()
+            rows = self.rows_for(admission_no, where)
+        if not rows:
+            return None
+        dists = self._distances(view.matrix[rows], view.sq_norms[rows], query)
+        best = int(np.argmin(dists))
+        row = rows[best]
+        return Match(row, view.admission_nos[row], view.names[row], float(dists[best]))
+
+    def within(self, encoding, radius, where=None):
+        """Every match closer than ``radius``, closest first."""
+        query = self._as_query(encoding)
+        with self._lock:
+            if self._tree is not None and not where:
+                # Tree queries run under the lock; inserts restructure leaves.
+                return [
+                    Match(i, self.admission_nos[i], self.names[i], d)
+                    for d, i in self._tree.radius(query, radius)
+                ]
+            view = self._snapshot()
+            rows = self._select(where)
+
+        rows, dists = self._scan(view, rows, query, radius=radius)
+        hits = np.flatnonzero(dists <= radius)
+        hits = hits[np.argsort(dists[hits])]
+        return [
+            Match(int(rows[j]), view.admission_nos[rows[j]], view.names[rows[j]], float(dists[j]))
+            for j in hits
+        ]
+
+    def top_k(self, encoding, k=5, where=None):
+        with self._lock:
+            if self._tree is not None and not where and k > 0:
+                return [
+                    Match(i, self.admission_nos[i], self.names[i], d)
+                    for d, i in self._tree.knn(self._as_query(encoding), k)
+                ]
+            view = self._snapshot()
+            rows = self._select(where)
+            ann = self._ann if rows is None else None
+            ann_lists = ann.lists if ann is not None else None
+        query = self._as_query(encoding)
+        size = view.size
+        if ann is not None and size > 0:
+            rows = ann.search(query, max(k, self.ann_rerank), lists=ann_lists)
+            rows = rows[rows < size]
+            rows = rows[view.alive[rows]]
+            if len(rows) == 0:
+                rows = None  # nothing in the probed lists; fall back to exact
+        if size == 0 or k <= 0 or (rows is not None and len(rows) == 0):
+            return []
+
+        # ANN candidates are few, so re-rank them directly at full precision.
+        rows, dists = self._scan(view, rows, query, k=k, quantized=ann is None)
+        order = self._smallest(dists, k)
+        return [
+            Match(int(rows[j]), view.admission_nos[rows[j]], view.names[rows[j]], float(dists[j]))
+            for j in order
+            if np.isfinite(dists[j])
+        ]
+
+    def _scan(self, view, rows, query, k=None, radius=None, quantized=True):
+        """Exact distances for the rows that can matter: (row_ids, distances)."""
+        dead = None
+        if rows is None:
+            rows = np.arange(view.size)
+            full = slice(0, view.size)
+            if view.dead:
+                dead = ~view.alive[: view.size]
+        else:
+            full = rows  # already restricted to live rows
+
+        if view.codes is None or not quantized:
+            dists = self._distances(view.matrix[full], view.sq_norms[full], query)
+            if dead is not None:
+                dists[dead] = np.inf
+            return rows, dists
+
+        approx = self._approx_distances(
+            view.codes[full], view.code_norms[full], view.scale, query
+        )
+        if dead is not None:
+            approx[dead] = np.inf
+        slack = 2.0 * self._quant_err + 1e-4
+        if radius is not None:
+            cutoff = radius + slack
+        else:
+            kth = min(k, len(approx)) - 1
+            cutoff = np.partition(approx, kth)[kth] + slack
+        keep = np.flatnonzero((approx <= cutoff) & np.isfinite(approx))
+        rows = rows[keep]
+        return rows, self._distances(view.matrix[rows], view.sq_norms[rows], query)
+
+    def _snapshot(self):
+        with self._lock:
+            return _View(
+                self._matrix,
+                self._sq_norms,
+                self._codes,
+                self._code_norms,
+                self._scale,
+                self._alive,
+                self._dead,
+                self._size,
+                self.admission_nos,
+                self.names,
+            )
+
+    def _as_query(self, encoding):
+        vec = np.asarray(encoding, dtype=np.float32).ravel()
+        if vec.shape[0] != self.dim:
+            raise ValueError(f"Expected a {self.dim}-d encoding, got {vec.shape[0]}")
+        return vec
+
+    @staticmethod
+    def _distances(matrix, sq_norms, query):
+        d2 = matrix @ query
+        d2 *= -2.0
+        d2 += sq_norms
+        d2 += query @ query
+        np.maximum(d2, 0.0, out=d2)
+        return np.sqrt(d2, out=d2)
+
+    @staticmethod
+    def _smallest(values, k):
+        k = min(k, len(values))
+        if k == len(values):
+            return np.argsort(values)
+        idx = np.argpartition(values, k - 1)[:k]
+        return idx[np.argsort(values[idx])]
+
+
+def _norm(value):
+    return str(value if value is not None else "").strip().lower()
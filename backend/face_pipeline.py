@@ -0,0 +1,284 @@
+"""Face detection + encoding pipeline with per-stage timings.
+
+HOG detection cost grows with the pixel count, but the 128-d encoding only
+needs the landmarks inside each face box.  Detection therefore runs on a copy
+downscaled to ``max_side`` (or by ``scale``); the boxes are mapped back to
+the full-resolution frame and passed to ``face_encodings`` as
+``known_face_locations``, so the encoder still sees every original pixel.
+
+``encode_faces_tiered`` goes coarse-to-fine: a cheap small-image pass first,
+escalating to larger images or upsampling only when nothing was found and
+the next tier is expected to fit in the request's time budget.
+
+Every function takes an optional ``pool`` (a ``frame_buffers.FramePool``);
+with one, the downscaled detection images are written into reused buffers.
+
+``run_frame`` is the whole per-upload pipeline (decode, quality gate,
+detection, encoding) described by a picklable ``FrameJob``, so it can run on
+a request thread or in an ``encode_pool`` worker process.  Video streams set
+``tracks`` to their tracker's ``TrackHint``: every face is still detected,
+but faces that land on an already identified track are not encoded.
+"""
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+
+import cv2
+
+from face_tracker import boxes_to_encode
+from image_io import decode_image
+
+try:
+    import face_recognition
+except Exception:
+    face_recognition = None
+
+
+Tier = namedtuple("Tier", ["max_side", "scale", "upsample"])
+TieredResult = namedtuple(
+    "TieredResult", ["encodings", "boxes", "tier", "tiers_tried", "budget_exhausted"]
+)
+# tiers set -> encode_faces_tiered, otherwise a single encode_faces pass.
+# tracks set -> one detection pass; encodings is None for faces of settled tracks.
+FrameJob = namedtuple(
+    "FrameJob",
+    [
+        "target_side",
+        "max_pixels",
+        "gate",
+        "tiers",
+        "budget_ms",
+        "max_side",
+        "scale",
+        "upsample",
+        "model",
+        "tracks",
+    ],
+    defaults=(None,),
+)
+FrameResult = namedtuple(
+    "FrameResult",
+    ["decoded", "verdict", "encodings", "boxes", "tier", "tiers_tried", "budget_exhausted"],
+)
+
+
+class StageTimer:
+    """Wall-clock milliseconds per named pipeline stage."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+
+    def as_dict(self):
+        return {name: round(ms, 1) for name, ms in self.stages.items()}
+
+    def server_timing(self):
+        """Value for a ``Server-Timing`` response header."""
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stages.items())
+
+
+def parse_tiers(spec):
+    """"240:0,320:0,full:1" -> [Tier, ...].
+
+    The first part is a max side in pixels, a scale factor when it has a
+    decimal point, or "full"; the second is number_of_times_to_upsample.
+    """
+    tiers = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        size, _, upsample = part.partition(":")
+        size = size.strip().lower()
+        upsample = int(upsample or 0)
+        if size == "full":
+            tiers.append(Tier(None, None, upsample))
+        elif "." in size:
+            tiers.append(Tier(None, float(size), upsample))
+        else:
+            tiers.append(Tier(int(size), None, upsample))
+    return tiers
+
+
+def tier_label(tier):
+    size = "full" if tier.max_side is None and tier.scale is None else tier.max_side or tier.scale
+    return f"{size}:{tier.upsample}"
+
+
+def detection_scale(shape, max_side=None, scale=None):
+    """Factor (<= 1) to shrink a frame of ``shape`` by before detection."""
+    if scale:
+        return min(float(scale), 1.0)
+    if max_side:
+        return min(1.0, float(max_side) / max(shape[0], shape[1]))
+    return 1.0
+
+
+def downscale(image, factor, pool=None):
+    if factor >= 1.0:
+        return image
+    height, width = image.shape[:2]
+    size = (max(1, round(width * factor)), max(1, round(height * factor)))
+    dst = None
+    if pool is not None:
+        dst = pool.array("detect", (size[1], size[0]) + image.shape[2:], image.dtype)
+    return cv2.resize(image, size, dst=dst, interpolation=cv2.INTER_AREA)
+
+
+def scale_boxes(boxes, small_shape, full_shape):
+    """Map (top, right, bottom, left) boxes from ``small_shape`` to ``full_shape``."""
+    sy = full_shape[0] / small_shape[0]
+    sx = full_shape[1] / small_shape[1]
+    if sy == 1.0 and sx == 1.0:
+        return list(boxes)
+    height, width = full_shape[:2]
+    return [
+        (
+            max(0, int(round(top * sy))),
+            min(width, int(round(right * sx))),
+            min(height, int(round(bottom * sy))),
+            max(0, int(round(left * sx))),
+        )
+        for top, right, bottom, left in boxes
+    ]
+
+
+def detect_faces(
+    rgb, max_side=None, scale=None, upsample=1, model="hog", timer=None, pool=None
+):
+    """Face boxes in full-resolution coordinates, detected on a downscaled copy."""
+    timer = timer or StageTimer()
+    with timer.stage("resize"):
+        small = downscale(rgb, detection_scale(rgb.shape, max_side, scale), pool)
+    with timer.stage("detect"):
+        boxes = face_recognition.face_locations(
+            small, number_of_times_to_upsample=upsample, model=model
+        )
+    return scale_boxes(boxes, small.shape, rgb.shape)
+
+
+def encode_faces(
+    rgb, max_side=None, scale=None, upsample=1, model="hog", timer=None, pool=None
+):
+    """(encodings, boxes) for every face in an RGB frame."""
+    timer = timer or StageTimer()
+    boxes = detect_faces(rgb, max_side, scale, upsample, model, timer, pool)
+    if not boxes:
+        return [], []
+    with timer.stage("encode"):
+        encodings = face_recognition.face_encodings(rgb, known_face_locations=boxes)
+    return encodings, boxes
+
+
+def encode_new_faces(
+    rgb, tracks, max_side=None, scale=None, upsample=1, model="hog", timer=None, pool=None
+):
+    """(encodings, boxes) like ``encode_faces``, but the encoding is None for
+    every face the tracker will assign to a track that needs no more
+    encodings (``tracks`` is its TrackHint)."""
+    timer = timer or StageTimer()
+    boxes = detect_faces(rgb, max_side, scale, upsample, model, timer, pool)
+    todo = boxes_to_encode(tracks, boxes)
+    encodings = [None] * len(boxes)
+    if todo:
+        with timer.stage("encode"):
+            found = face_recognition.face_encodings(
+                rgb, known_face_locations=[boxes[i] for i in todo]
+            )
+        for i, encoding in zip(todo, found):
+            encodings[i] = encoding
+    return encodings, boxes
+
+
+def encode_faces_tiered(rgb, tiers, budget_ms=None, model="hog", timer=None, pool=None):
+    """Try ``tiers`` cheapest first and stop at the first one that finds a face.
+
+    Before escalating, the next tier's detect time is extrapolated from the
+    last one (HOG cost ~ pixels x 4^upsample) and skipped if it would blow
+    ``budget_ms``.  Tiers that work out to the same detection image as an
+    earlier one (e.g. a max side above the frame size) are skipped.
+    """
+    timer = timer or StageTimer()
+    start = time.perf_counter()
+    tried, seen = 0, set()
+    last_ms = last_work = None
+    for index, tier in enumerate(tiers):
+        factor = detection_scale(rgb.shape, tier.max_side, tier.scale)
+        key = (round(factor, 3), tier.upsample)
+        if key in seen:
+            continue
+        seen.add(key)
+
+        work = rgb.shape[0] * rgb.shape[1] * factor * factor * 4 ** tier.upsample
+        if budget_ms and last_ms is not None:
+            elapsed = (time.perf_counter() - start) * 1000
+            if elapsed + last_ms * work / last_work > budget_ms:
+                return TieredResult([], [], None, tried, True)
+
+        with timer.stage("resize"):
+            small = downscale(rgb, factor, pool)
+        detect_start = time.perf_counter()
+        with timer.stage(f"detect_{index}"):
+            boxes = face_recognition.face_locations(
+                small, number_of_times_to_upsample=tier.upsample, model=model
+            )
+        last_ms = (time.perf_counter() - detect_start) * 1000
+        last_work = max(work, 1.0)
+        tried += 1
+        if boxes:
+            boxes = scale_boxes(boxes, small.shape, rgb.shape)
+            with timer.stage("encode"):
+                encodings = face_recognition.face_encodings(rgb, known_face_locations=boxes)
+            return TieredResult(encodings, boxes, index, tried, False)
+    return TieredResult([], [], None, tried, False)
+
+
+def run_frame(buf, job, gate=None, timer=None, pool=None):
+    """Decode ``buf`` and run ``job`` on it; returns a FrameResult.
+
+    ``decoded`` is False for undecodable bytes; a failed gate check comes
+    back as ``verdict`` with no encodings.  ImageUploadError propagates.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("decode"):
+        img = decode_image(buf, target_side=job.target_side, max_pixels=job.max_pixels)
+    if img is None:
+        return FrameResult(False, None, [], [], None, 0, False)
+
+    verdict = None
+    if gate is not None and job.gate:
+        with timer.stage("gate"):
+            verdict = gate.check(img, pool)
+        if not verdict.ok:
+            return FrameResult(True, verdict, [], [], None, 0, False)
+
+    # The decoded frame is ours alone, so convert it in place.
+    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    if job.tiers:
+        result = encode_faces_tiered(rgb, job.tiers, job.budget_ms, job.model, timer, pool)
+        return FrameResult(
+            True,
+            verdict,
+            result.encodings,
+            result.boxes,
+            result.tier,
+            result.tiers_tried,
+            result.budget_exhausted,
+        )
+    if job.tracks is not None:
+        encodings, boxes = encode_new_faces(
+            rgb, job.tracks, job.max_side, job.scale, job.upsample, job.model, timer, pool
+        )
+        return FrameResult(True, verdict, encodings, boxes, None, 1, False)
+    encodings, boxes = encode_faces(
+        rgb, job.max_side, job.scale, job.upsample, job.model, timer, pool
+    )
+    return FrameResult(True, verdict, encodings, boxes, None, 1, False)
@@ -0,0 +1,141 @@
+"""Following faces across the detection passes of a video stream.
+
+Detection finds boxes but says nothing about who is who, and the 128-d
+encoding is the expensive part.  ``FaceTracker`` links each pass's boxes to
+the tracks of earlier passes by IoU against a constant-velocity prediction,
+so a student walking past the camera stays one track and is encoded only
+until the track is identified (normally once, at most ``max_encodings``
+times for borderline faces).  Tracks not seen for ``max_missed`` passes end.
+
+The encode workers run detection and encoding in one go, before ``update``
+sees the boxes.  ``FaceTracker.hint`` gives them the live tracks so that
+``boxes_to_encode`` can run the same association and skip exactly the faces
+that will land on a track that needs no more encodings.
+"""
+from collections import namedtuple
+
+# Picklable view of the live tracks for one detection pass.
+TrackHint = namedtuple("TrackHint", ["iou_threshold", "predicted", "settled"])
+
+
+def box_iou(a, b):
+    """Intersection over union of two (top, right, bottom, left) boxes."""
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    if bottom <= top or right <= left:
+        return 0.0
+    inter = (bottom - top) * (right - left)
+    area_a = (a[2] - a[0]) * (a[1] - a[3])
+    area_b = (b[2] - b[0]) * (b[1] - b[3])
+    return inter / float(area_a + area_b - inter)
+
+
+def associate(predicted, boxes, iou_threshold):
+    """Greedy IoU matching, best pairs first: ``assigned[i]`` is the index in
+    ``predicted`` matched to ``boxes[i]``, or None."""
+    pairs = []
+    for t, track_box in enumerate(predicted):
+        for i, box in enumerate(boxes):
+            iou = box_iou(track_box, box)
+            if iou >= iou_threshold:
+                pairs.append((iou, t, i))
+    pairs.sort(reverse=True)
+
+    assigned = [None] * len(boxes)
+    used = set()
+    for _, t, i in pairs:
+        if t in used or assigned[i] is not None:
+            continue
+        used.add(t)
+        assigned[i] = t
+    return assigned
+
+
+def boxes_to_encode(hint, boxes):
+    """Indices of the ``boxes`` worth encoding: all but those ``FaceTracker.update``
+    will assign to a track that needs no more encodings."""
+    assigned = associate(hint.predicted, boxes, hint.iou_threshold)
+    return [i for i, t in enumerate(assigned) if t is None or not hint.settled[t]]
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box
+        self.velocity = (0.0, 0.0, 0.0, 0.0)
+        self.hits = 1
+        self.missed = 0
+        self.encodings = []
+        self.matches = []
+        self.status = "pending"  # -> "identified" / "unknown"
+        self.match = None
+
+    def predicted(self):
+        steps = self.missed + 1
+        return tuple(v + d * steps for v, d in zip(self.box, self.velocity))
+
+    def update(self, box):
+        steps = self.missed + 1
+        moved = tuple((n - o) / steps for n, o in zip(box, self.box))
+        self.velocity = tuple(0.5 * v + 0.5 * m for v, m in zip(self.velocity, moved))
+        self.box = box
+        self.hits += 1
+        self.missed = 0
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_missed=5, max_encodings=3):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.max_encodings = max_encodings
+        self.tracks = []
+        self.next_id = 1
+
+    def needs_encoding(self, track):
+        return track.status == "pending" and len(track.encodings) < self.max_encodings
+
+    def hint(self):
+        """TrackHint for the next detection pass (valid until ``update``)."""
+        return TrackHint(
+            self.iou_threshold,
+            [t.predicted() for t in self.tracks],
+            [not self.needs_encoding(t) for t in self.tracks],
+        )
+
+    def update(self, boxes):
+        """Associate one detection pass.
+
+        Returns (assigned, ended): ``assigned[i]`` is the Track for
+        ``boxes[i]`` (new tracks included), ``ended`` the tracks that
+        expired on this pass.
+        """
+        matched = associate([t.predicted() for t in self.tracks], boxes, self.iou_threshold)
+        assigned = [None] * len(boxes)
+        used = set()
+        for i, t in enumerate(matched):
+            if t is not None:
+                used.add(t)
+                assigned[i] = self.tracks[t]
+                self.tracks[t].update(boxes[i])
+
+        live, ended = [], []
+        for t, track in enumerate(self.tracks):
+            if t not in used:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    ended.append(track)
+                    continue
+            live.append(track)
+        for i, box in enumerate(boxes):
+            if assigned[i] is None:
+                track = Track(self.next_id, box)
+                self.next_id += 1
+                assigned[i] = track
+                live.append(track)
+        self.tracks = live
+        return assigned, ended
+
+    def close(self):
+        """End every live track (the stream is over)."""
+        ended, self.tracks = self.tracks, []
+        return ended
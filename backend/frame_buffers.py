@@ -0,0 +1,95 @@
+"""Reusable per-worker buffers for the frame pipeline.
+
+Kiosks send frames of the same size over and over, so the arrays a request
+needs (upload bytes, grayscale/resized copies, the gate's Laplacian) have the
+same shapes every time.  A ``FramePool`` hands out one preallocated array per
+(name, shape, dtype) and OpenCV writes into it through its ``dst=``
+parameters, instead of every request allocating and freeing megabytes.
+
+Pooled arrays are only valid until the same name is requested again, so a
+pool must never be shared between threads: use ``worker_pool()`` to get the
+calling thread's own pool.  ``cv2.imdecode`` has no ``dst=`` in the Python
+bindings, so the decoded frame itself is still allocated per request (and
+converted to RGB in place).
+"""
+import threading
+
+import numpy as np
+
+_local = threading.local()
+
+
+class FramePool:
+    def __init__(self, max_bytes=64 * 2**20, max_buffers=32):
+        self.max_bytes = max_bytes
+        self.max_buffers = max_buffers
+        self._buffers = {}
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def array(self, name, shape, dtype=np.uint8):
+        """Array of ``shape``/``dtype`` reused across calls with the same name.
+
+        Contents are left over from the last use.  Arrays bigger than half of
+        ``max_bytes`` are allocated normally and not kept.
+        """
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+        key = (name, shape, dtype.str)
+        buf = self._buffers.get(key)
+        if buf is not None:
+            self.hits += 1
+            return buf
+        self.misses += 1
+        return self._keep(key, np.empty(shape, dtype=dtype))
+
+    def byte_buffer(self, name, length):
+        """Writable uint8 array of ``length`` bytes (e.g. an upload body).
+
+        The backing buffer only grows, so uploads of varying size share it.
+        """
+        key = (name, None, None)
+        buf = self._buffers.get(key)
+        if buf is not None and len(buf) >= length:
+            self.hits += 1
+            return buf[:length]
+        self.misses += 1
+        if buf is not None:
+            self._evict(key)
+        return self._keep(key, np.empty(max(length, 64 * 1024), dtype=np.uint8))[:length]
+
+    def _keep(self, key, buf):
+        if buf.nbytes > self.max_bytes // 2:
+            return buf
+        # Frame sizes change rarely; drop the oldest shapes to make room.
+        while self._buffers and (
+            len(self._buffers) >= self.max_buffers or self.nbytes + buf.nbytes > self.max_bytes
+        ):
+            self._evict(next(iter(self._buffers)))
+        self._buffers[key] = buf
+        self.nbytes += buf.nbytes
+        return buf
+
+    def _evict(self, key):
+        self.nbytes -= self._buffers.pop(key).nbytes
+
+    def clear(self):
+        self._buffers.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        return {
+            "buffers": len(self._buffers),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+def worker_pool():
+    """The calling thread's FramePool (created on first use)."""
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = FramePool()
+    return pool
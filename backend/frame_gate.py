@@ -0,0 +1,97 @@
+"""Cheap quality gate run on kiosk frames before dlib detection.
+
+Everything is measured on a small grayscale copy, so a frame costs a few
+milliseconds here instead of a full HOG pass plus encoding:
+
+    too_blurry          variance of the Laplacian below ``min_sharpness``
+    too_dark/too_bright mean brightness (from the histogram) out of range
+    low_contrast        brightness standard deviation below ``min_contrast``
+    no_face_candidate   optional Haar cascade found nothing face-like
+
+Thresholds apply to the ``work_side`` copy, so they do not depend on the
+upload resolution.  ``check`` can write its intermediates into a
+``frame_buffers.FramePool`` instead of allocating them per frame.
+"""
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+GateResult = namedtuple("GateResult", ["ok", "reason", "metrics"])
+
+REASONS = ("too_blurry", "too_dark", "too_bright", "low_contrast", "no_face_candidate")
+
+_LEVELS = np.arange(256, dtype=np.float64)
+
+
+class FrameGate:
+    def __init__(
+        self,
+        min_sharpness=15.0,
+        min_brightness=40.0,
+        max_brightness=220.0,
+        min_contrast=12.0,
+        haar=False,
+        haar_min_face=40,
+        work_side=160,
+    ):
+        self.min_sharpness = min_sharpness
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.min_contrast = min_contrast
+        self.haar_min_face = haar_min_face
+        self.work_side = work_side
+        self.cascade = None
+        if haar:
+            if not hasattr(cv2, "CascadeClassifier"):
+                raise ValueError("This OpenCV build has no CascadeClassifier (moved out in OpenCV 5)")
+            path = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
+            self.cascade = cv2.CascadeClassifier(path)
+            if self.cascade.empty():
+                raise ValueError(f"Could not load Haar cascade from {path}")
+
+    def check(self, bgr, pool=None):
+        """GateResult(ok, reason, metrics) for a BGR frame; reason is None when ok."""
+        height, width = bgr.shape[:2]
+        if bgr.ndim == 3:
+            dst = pool.array("gate_gray", (height, width)) if pool is not None else None
+            gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=dst)
+        else:
+            gray = bgr
+        factor = self.work_side / max(height, width)
+        if factor < 1.0:
+            size = (max(1, round(width * factor)), max(1, round(height * factor)))
+            dst = pool.array("gate_small", (size[1], size[0])) if pool is not None else None
+            gray = cv2.resize(gray, size, dst=dst, interpolation=cv2.INTER_AREA)
+        else:
+            factor = 1.0
+
+        dst = pool.array("gate_hist", (256, 1), np.float32) if pool is not None else None
+        hist = cv2.calcHist([gray], [0], None, [256], [0, 256], hist=dst).ravel()
+        total = max(hist.sum(), 1.0)
+        mean = float(hist @ _LEVELS / total)
+        std = float(np.sqrt(max(hist @ (_LEVELS - mean) ** 2 / total, 0.0)))
+        metrics = {"brightness": round(mean, 1), "contrast": round(std, 1)}
+        if mean < self.min_brightness:
+            return GateResult(False, "too_dark", metrics)
+        if mean > self.max_brightness:
+            return GateResult(False, "too_bright", metrics)
+        if std < self.min_contrast:
+            return GateResult(False, "low_contrast", metrics)
+
+        dst = pool.array("gate_laplacian", gray.shape, np.float64) if pool is not None else None
+        _, std = cv2.meanStdDev(cv2.Laplacian(gray, cv2.CV_64F, dst=dst))
+        sharpness = float(std[0, 0]) ** 2
+        metrics["sharpness"] = round(sharpness, 1)
+        if sharpness < self.min_sharpness:
+            return GateResult(False, "too_blurry", metrics)
+
+        if self.cascade is not None:
+            min_face = max(8, int(self.haar_min_face * factor))
+            faces = self.cascade.detectMultiScale(
+                gray, scaleFactor=1.2, minNeighbors=3, minSize=(min_face, min_face)
+            )
+            metrics["face_candidates"] = len(faces)
+            if len(faces) == 0:
+                return GateResult(False, "no_face_candidate", metrics)
+        return GateResult(True, None, metrics)
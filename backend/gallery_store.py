@@ -0,0 +1,465 @@
+"""Versioned on-disk gallery format with zero-copy loading and a journal.
+
+A store directory holds one ``manifest.json`` (format version, generation,
+shape and CRC32 checksums) pointing at the files of the current generation:
+
+    encodings-<gen>.npy    float32 (n, 128) matrix
+    norms-<gen>.npy        float32 (n,) squared row norms
+    identities-<gen>.json  admission_nos, names and filter metadata
+    journal-<gen>.log      add/remove/replace records since the snapshot
+
+``load`` opens the matrix with ``np.load(mmap_mode="r")`` so the pages are
+shared through the OS page cache instead of being copied into every worker,
+then replays the journal on top.  Enrollments and deletions append one small
+record each instead of rewriting the snapshot; ``compact`` folds the journal
+into a new generation and atomically replaces the manifest, so a crash at
+any point leaves a readable snapshot + journal pair.
+
+With ``shared=True`` every journal append, compaction and manifest switch
+is serialized across processes through a lock file in the store directory,
+and the store follows generations committed by other processes.
+
+Migrate a legacy pickle with:  python gallery_store.py migrate [pkl] [dir]
+"""
+import glob
+import json
+import mmap
+import os
+import pickle
+import struct
+import sys
+import threading
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from face_gallery import FaceGallery
+
+FORMAT_NAME = "smart-attendance-gallery"
+FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+
+OP_ADD = 1
+OP_REMOVE = 2
+OP_REPLACE = 3
+
+# crc32 of (op + body), body length, op
+_RECORD_HEADER = struct.Struct("<IIB")
+_JSON_LEN = struct.Struct("<I")
+
+
+class GalleryStoreError(Exception):
+    pass
+
+
+class ProcessLock:
+    """Reentrant lock held across threads *and* processes via a lock file."""
+
+    def __init__(self, path, on_acquire=None):
+        self.path = path
+        self.on_acquire = on_acquire
+        self._local = threading.RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._local.acquire()
+        if self._depth == 0:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "a+b")
+                _lock_file(self._file)
+                if self.on_acquire is not None:
+                    self.on_acquire()
+            except BaseException:
+                self._release_file()
+                self._local.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0:
+            self._release_file()
+        self._local.release()
+
+    def _release_file(self):
+        if self._file is not None:
+            _unlock_file(self._file)
+            self._file.close()
+            self._file = None
+
+
+class GalleryStore:
+    def __init__(self, directory, fsync=True, shared=False):
+        self.directory = directory
+        self.fsync = fsync
+        self.shared = shared
+        if shared:
+            self.lock = ProcessLock(os.path.join(directory, ".lock"), self._follow_manifest)
+        else:
+            self.lock = threading.RLock()
+        self.generation = None
+        self.loaded_stamp = None
+        self._journal = None
+
+    @property
+    def manifest_path(self):
+        return os.path.join(self.directory, MANIFEST)
+
+    def exists(self):
+        return os.path.exists(self.manifest_path)
+
+    def disk_stamp(self):
+        """Cheap fingerprint of the files on disk: stat calls only, no reads.
+
+        Changes on every journal append, compaction, or manifest replaced by
+        an offline rebuild or a restored backup.
+        """
+        with self.lock:
+            try:
+                manifest = os.stat(self.manifest_path)
+            except FileNotFoundError:
+                return (0, 0, 0)
+            return (manifest.st_mtime_ns, manifest.st_size, self.journal_size())
+
+    def is_stale(self):
+        """True when the disk has changed since this process last loaded or wrote it."""
+        with self.lock:
+            stamp = self.disk_stamp()
+            # A missing manifest is not something to reload; keep serving what we have.
+            return self.loaded_stamp is not None and stamp != (0, 0, 0) and stamp != self.loaded_stamp
+
+    def _follow_manifest(self):
+        # Another process may have compacted into a newer generation.
+        if not self.exists():
+            return
+        generation = self.read_manifest()["generation"]
+        if generation != self.generation:
+            self._close_journal()
+            self.generation = generation
+
+    def read_manifest(self):
+        with open(self.manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format") != FORMAT_NAME:
+            raise GalleryStoreError(f"{self.manifest_path} is not a gallery manifest")
+        if manifest.get("version") != FORMAT_VERSION:
+            raise GalleryStoreError(
+                f"Unsupported gallery format version {manifest.get('version')}"
+            )
+        return manifest
+
+    # ---- reading ----
+    def load(self, storage="float32", verify=True, read_only=False):
+        """The gallery on disk: snapshot plus journal.
+
+        ``read_only`` is for tools reading a store a server may be writing:
+        a partial record at the end of the journal is skipped, not truncated,
+        since it may be an append still in progress.
+        """
+        with self.lock:
+            manifest = self.read_manifest()
+            gallery = self._load_snapshot(manifest, storage, verify)
+            self._close_journal()
+            self.generation = manifest["generation"]
+            replayed = self._replay(gallery, truncate=not read_only)
+            if replayed:
+                print(f"📜 Replayed {replayed} journal records")
+            self.loaded_stamp = self.disk_stamp()
+            return gallery
+
+    def _load_snapshot(self, manifest, storage, verify):
+        files = {k: os.path.join(self.directory, v) for k, v in manifest["files"].items()}
+        if verify:
+            for key, path in files.items():
+                if _crc32(path) != manifest["checksums"][key]:
+                    raise GalleryStoreError(f"Checksum mismatch for {path}")
+
+        with open(files["identities"], "r", encoding="utf-8") as f:
+            identities = json.load(f)
+        count = manifest["count"]
+        if count == 0:
+            return FaceGallery(dim=manifest["dim"], storage=storage)
+
+        matrix = np.load(files["encodings"], mmap_mode="r")
+        sq_norms = np.load(files["norms"], mmap_mode="r")
+        if matrix.shape != (count, manifest["dim"]) or matrix.dtype != np.float32:
+            raise GalleryStoreError(f"{files['encodings']} does not match the manifest")
+
+        return FaceGallery.from_arrays(
+            matrix,
+            identities["admission_nos"],
+            identities["names"],
+            identities.get("metadata"),
+            storage=storage,
+            sq_norms=sq_norms,
+        )
+
+    # ---- journal ----
+    @property
+    def journal_path(self):
+        return os.path.join(self.directory, f"journal-{self.generation:06d}.log")
+
+    def journal_size(self):
+        with self.lock:
+            if self.generation is None or not os.path.exists(self.journal_path):
+                return 0
+            return os.path.getsize(self.journal_path)
+
+    def add(self, gallery, encoding, admission_no, name, metadata=None):
+        with self.lock:
+            self._ensure_writable(gallery)
+            row = gallery.add(encoding, admission_no, name, metadata)
+            self._append(OP_ADD, admission_no, name, metadata, encoding)
+            return row
+
+    def remove(self, gallery, admission_no):
+        with self.lock:
+            self._ensure_writable(gallery)
+            removed = gallery.remove_admission(admission_no)
+            if removed:
+                self._append(OP_REMOVE, admission_no)
+            return removed
+
+    def replace(self, gallery, encoding, admission_no, name, metadata=None):
+        with self.lock:
+            self._ensure_writable(gallery)
+            row = gallery.replace_template(encoding, admission_no, name, metadata)
+            self._append(OP_REPLACE, admission_no, name, metadata, encoding)
+            return row
+
+    def _ensure_writable(self, gallery):
+        if self.generation is not None:
+            return
+        if self.exists():
+            # Journaling onto a store we never loaded would shadow its contents.
+            raise GalleryStoreError(f"{self.directory} exists but was not loaded")
+        self.save(gallery)
+
+    def _append(self, op, admission_no, name=None, metadata=None, encoding=None):
+        identity = json.dumps(
+            {"admission_no": admission_no, "name": name, "metadata": metadata or {}}
+        ).encode("utf-8")
+        vector = b"" if encoding is None else np.asarray(encoding, dtype=np.float32).tobytes()
+        body = _JSON_LEN.pack(len(identity)) + identity + vector
+        crc = zlib.crc32(bytes([op]) + body) & 0xFFFFFFFF
+
+        if self._journal is None:
+            self._journal = open(self.journal_path, "ab")
+        self._journal.write(_RECORD_HEADER.pack(crc, len(body), op) + body)
+        self._journal.flush()
+        if self.fsync:
+            os.fsync(self._journal.fileno())
+        self.loaded_stamp = self.disk_stamp()
+
+    def _replay(self, gallery, path=None, truncate=True):
+        path = path or self.journal_path
+        if not os.path.exists(path):
+            return 0
+        applied, valid_end = 0, 0
+        with open(path, "rb") as f:
+            data = f.read()
+        for op, body, end in _iter_records(data):
+            (json_len,) = _JSON_LEN.unpack_from(body)
+            identity = json.loads(body[_JSON_LEN.size : _JSON_LEN.size + json_len])
+            vector = np.frombuffer(body[_JSON_LEN.size + json_len :], dtype=np.float32)
+            admission_no = identity["admission_no"]
+            if op == OP_ADD:
+                gallery.add(vector, admission_no, identity["name"], identity["metadata"])
+            elif op == OP_REMOVE:
+                gallery.remove_admission(admission_no)
+            elif op == OP_REPLACE:
+                gallery.replace_template(
+                    vector, admission_no, identity["name"], identity["metadata"]
+                )
+            applied, valid_end = applied + 1, end
+
+        if valid_end < len(data) and truncate:
+            # A torn record from a crash mid-append; drop it so appends resume cleanly.
+            print(f"⚠️ Truncating {len(data) - valid_end} bytes of torn journal tail")
+            with open(path, "r+b") as f:
+                f.truncate(valid_end)
+        return applied
+
+    def _close_journal(self):
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    # ---- writing snapshots ----
+    def save(self, gallery):
+        """Write a full snapshot as a new generation with an empty journal."""
+        with self.lock:
+            generation = self._next_generation()
+            data = gallery.export()
+            files, checksums = self._write_snapshot(data, generation)
+            self._commit(generation, data, files, checksums, journal_tail=b"")
+            return generation
+
+    def compact(self, gallery):
+        """Fold the journal into a new snapshot without blocking appends for long.
+
+        The snapshot is exported together with the journal offset, written
+        outside the lock, and any records appended meanwhile are carried
+        over into the new generation's journal before the manifest switch.
+        """
+        with self.lock:
+            if self.generation is None:
+                return self.save(gallery)
+            generation = self._next_generation()
+            data = gallery.export()
+            offset = self.journal_size()
+
+        files, checksums = self._write_snapshot(data, generation)
+
+        with self.lock:
+            tail = b""
+            if os.path.exists(self.journal_path):
+                with open(self.journal_path, "rb") as f:
+                    f.seek(offset)
+                    tail = f.read()
+            self._commit(generation, data, files, checksums, journal_tail=tail)
+            return generation
+
+    def _write_snapshot(self, data, generation):
+        os.makedirs(self.directory, exist_ok=True)
+        files = {
+            "encodings": f"encodings-{generation:06d}.npy",
+            "norms": f"norms-{generation:06d}.npy",
+            "identities": f"identities-{generation:06d}.json",
+        }
+        paths = {k: os.path.join(self.directory, v) for k, v in files.items()}
+
+        _atomic_write(paths["encodings"], lambda f: np.save(f, data["encodings"]))
+        _atomic_write(paths["norms"], lambda f: np.save(f, data["sq_norms"]))
+        identities = {
+            "admission_nos": data["admission_nos"],
+            "names": data["names"],
+            "metadata": data["metadata"],
+        }
+        _atomic_write(
+            paths["identities"], lambda f: f.write(json.dumps(identities).encode("utf-8"))
+        )
+        return files, {k: _crc32(p) for k, p in paths.items()}
+
+    def _commit(self, generation, data, files, checksums, journal_tail):
+        journal = f"journal-{generation:06d}.log"
+        _atomic_write(os.path.join(self.directory, journal), lambda f: f.write(journal_tail))
+
+        manifest = {
+            "format": FORMAT_NAME,
+            "version": FORMAT_VERSION,
+            "generation": generation,
+            "count": int(len(data["encodings"])),
+            "dim": int(data["encodings"].shape[1]),
+            "dtype": "float32",
+            "files": files,
+            "checksums": checksums,
+            "journal": journal,
+            "saved_at": datetime.now().isoformat(),
+        }
+        _atomic_write(
+            self.manifest_path, lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8"))
+        )
+        self._close_journal()
+        self.generation = generation
+        self.loaded_stamp = self.disk_stamp()
+        self._remove_stale(set(files.values()) | {journal})
+
+    def migrate_pickle(self, pickle_path):
+        with open(pickle_path, "rb") as f:
+            data = pickle.load(f)
+        gallery = FaceGallery.from_lists(
+            data.get("encodings", []),
+            data.get("admission_nos", []),
+            data.get("names", []),
+            data.get("metadata"),
+        )
+        self.save(gallery)
+        return len(gallery)
+
+    def _next_generation(self):
+        if not self.exists():
+            return 1
+        try:
+            return self.read_manifest()["generation"] + 1
+        except (GalleryStoreError, ValueError, KeyError):
+            return 1
+
+    def _remove_stale(self, current):
+        patterns = ("encodings-*.npy", "norms-*.npy", "identities-*.json", "journal-*.log", "*.tmp")
+        for pattern in patterns:
+            for path in glob.glob(os.path.join(self.directory, pattern)):
+                if os.path.basename(path) in current:
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # still mapped by a reader (Windows); retried next save
+
+
+def _iter_records(data):
+    pos = 0
+    while pos + _RECORD_HEADER.size <= len(data):
+        crc, length, op = _RECORD_HEADER.unpack_from(data, pos)
+        start = pos + _RECORD_HEADER.size
+        end = start + length
+        if end > len(data):
+            return
+        body = data[start:end]
+        if zlib.crc32(bytes([op]) + body) & 0xFFFFFFFF != crc:
+            return
+        yield op, body, end
+        pos = end
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _atomic_write(path, write):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _crc32(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return "00000000"
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return f"{zlib.crc32(mm) & 0xFFFFFFFF:08x}"
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage: python gallery_store.py migrate [face_encodings.pkl] [face_gallery]")
+        sys.exit(1)
+    pkl = sys.argv[2] if len(sys.argv) > 2 else "face_encodings.pkl"
+    directory = sys.argv[3] if len(sys.argv) > 3 else "face_gallery"
+    count = GalleryStore(directory).migrate_pickle(pkl)
+    print(f"✅ Migrated {count} encodings from {pkl} to {directory}/")
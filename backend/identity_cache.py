@@ -0,0 +1,116 @@
+"""Short-lived memory of who each kiosk just recognized.
+
+A student waiting at the kiosk sends several attempts within seconds; each
+would search the whole gallery again and then read MongoDB only to learn
+they are already marked.  ``RecentIdentityCache`` keeps, per device, the
+last few encodings it matched.  A new encoding within ``max_distance`` of
+one of them (much tighter than the match threshold, since it is the same
+person seconds later) reuses that Match, and the attendance outcome
+recorded for it, until ``ttl_seconds`` have passed.
+"""
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+CacheHit = namedtuple("CacheHit", ["match", "marked", "distance"])
+
+
+class _Entry:
+    __slots__ = ("encoding", "match", "where", "marked", "expires")
+
+    def __init__(self, encoding, match, where, marked, expires):
+        self.encoding = encoding
+        self.match = match
+        self.where = where
+        self.marked = marked
+        self.expires = expires
+
+
+class RecentIdentityCache:
+    def __init__(self, ttl_seconds=20.0, max_distance=0.35, per_device=8, max_devices=1024):
+        self.ttl = float(ttl_seconds)
+        self.max_distance = float(max_distance)
+        self.per_device = per_device
+        self.max_devices = max_devices
+        self._devices = OrderedDict()  # device -> [_Entry], least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def lookup(self, device, encoding, where=None, admission_no=None):
+        """CacheHit for the closest live entry of ``device``, or None.
+
+        ``marked`` is whatever was passed to ``remember`` (e.g. the
+        (date, session) the student was already marked for).  With
+        ``admission_no`` only that student's entries can match.
+        """
+        query = np.asarray(encoding, dtype=np.float32).ravel()
+        now = time.monotonic()
+        with self._lock:
+            entries = self._devices.get(device)
+            if entries:
+                live = [e for e in entries if e.expires > now]
+                self.expired += len(entries) - len(live)
+                entries[:] = live
+            best = None
+            if entries:
+                candidates = [
+                    e for e in entries
+                    if e.where == where
+                    and (admission_no is None or e.match.admission_no == admission_no)
+                ]
+                if candidates:
+                    dists = np.linalg.norm(
+                        np.stack([e.encoding for e in candidates]) - query, axis=1
+                    )
+                    i = int(np.argmin(dists))
+                    if dists[i] <= self.max_distance:
+                        best = CacheHit(candidates[i].match, candidates[i].marked, float(dists[i]))
+            if best is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._devices.move_to_end(device)
+            return best
+
+    def remember(self, device, encoding, match, where=None, marked=None):
+        entry = _Entry(
+            np.asarray(encoding, dtype=np.float32).ravel().copy(),
+            match,
+            where,
+            marked,
+            time.monotonic() + self.ttl,
+        )
+        with self._lock:
+            entries = self._devices.setdefault(device, [])
+            self._devices.move_to_end(device)
+            # One entry per student and device: the newest encoding wins.
+            entries[:] = [e for e in entries if e.match.admission_no != match.admission_no]
+            entries.append(entry)
+            del entries[: -self.per_device]
+            while len(self._devices) > self.max_devices:
+                self._devices.popitem(last=False)
+
+    def forget(self, admission_no=None):
+        """Drop the entries of one student (or everything)."""
+        with self._lock:
+            if admission_no is None:
+                self._devices.clear()
+                return
+            for entries in self._devices.values():
+                entries[:] = [e for e in entries if e.match.admission_no != admission_no]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "expired": self.expired,
+                "devices": len(self._devices),
+                "entries": sum(len(e) for e in self._devices.values()),
+            }
@@ -0,0 +1,142 @@
+"""Reading uploaded images into a uint8 buffer for ``cv2.imdecode``.
+
+Three request shapes carry a frame:
+
+    raw body     Content-Type: image/jpeg (or any image/*), fields in the query
+    multipart    an ``image`` file part, fields as form fields
+    JSON         {"image": "data:image/jpeg;base64,..."} (the original API)
+
+Raw and multipart bodies are read straight into one preallocated buffer
+(or viewed in place when Werkzeug already holds the part in memory), so the
+only copy between the socket and ``imdecode`` is the read itself.
+
+``decode_image`` reads the width/height from the JPEG/PNG header before
+decoding.  Oversized images (decompression bombs) are rejected without
+being decoded, and big JPEGs are decoded at 1/2, 1/4 or 1/8 scale through
+libjpeg's DCT scaling (``IMREAD_REDUCED_COLOR_*``) when that still leaves at
+least ``target_side`` pixels on the long side.
+"""
+import base64
+import binascii
+import io
+
+import cv2
+import numpy as np
+
+
+class ImageUploadError(ValueError):
+    pass
+
+
+class ImageTooLargeError(ImageUploadError):
+    pass
+
+
+_REDUCED_MODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+_REDUCED_GRAY_MODES = (
+    (8, cv2.IMREAD_REDUCED_GRAYSCALE_8),
+    (4, cv2.IMREAD_REDUCED_GRAYSCALE_4),
+    (2, cv2.IMREAD_REDUCED_GRAYSCALE_2),
+)
+# Start-of-frame markers carry the dimensions; C4/C8/CC share the range but are not SOFs.
+_JPEG_SOF = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+
+def read_stream(stream, length, out=None):
+    """Fill a buffer of ``length`` bytes from ``stream`` with ``readinto``.
+
+    ``out`` is an optional preallocated uint8 array of exactly ``length``.
+    """
+    buf = bytearray(length) if out is None else out
+    view = memoryview(buf)
+    filled = 0
+    while filled < length:
+        n = stream.readinto(view[filled:])
+        if not n:
+            break
+        filled += n
+    if filled < length:
+        raise ImageUploadError("Upload ended early")
+    return np.frombuffer(buf, dtype=np.uint8) if out is None else out
+
+
+def read_file_part(storage):
+    """Bytes of a multipart ``FileStorage`` without copying in-memory parts."""
+    stream = storage.stream
+    if isinstance(stream, io.BytesIO):
+        return np.frombuffer(stream.getbuffer(), dtype=np.uint8)
+    stream.seek(0, io.SEEK_END)
+    length = stream.tell()
+    stream.seek(0)
+    return read_stream(stream, length)
+
+
+def decode_data_url(data_url):
+    """Bytes of a base64 data URL (or bare base64 string)."""
+    _, _, encoded = data_url.rpartition(",")
+    try:
+        raw = base64.b64decode(encoded)
+    except (binascii.Error, ValueError):
+        raise ImageUploadError("Image is not valid base64")
+    return np.frombuffer(raw, dtype=np.uint8)
+
+
+def image_size(buf):
+    """(format, width, height) from a JPEG or PNG header, or None."""
+    view = memoryview(buf).cast("B")
+    if len(view) >= 24 and bytes(view[:8]) == _PNG_SIGNATURE:
+        width = int.from_bytes(view[16:20], "big")
+        height = int.from_bytes(view[20:24], "big")
+        return "png", width, height
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+
+    # Walk the JPEG segments (skipping EXIF/ICC payloads) up to the frame header.
+    pos = 2
+    while pos + 9 <= len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers
+            pos += 2
+            continue
+        if marker in _JPEG_SOF:
+            height = (view[pos + 5] << 8) | view[pos + 6]
+            width = (view[pos + 7] << 8) | view[pos + 8]
+            return "jpeg", width, height
+        pos += 2 + ((view[pos + 2] << 8) | view[pos + 3])
+    return None
+
+
+def decode_image(buf, target_side=None, max_pixels=None, gray=False):
+    """BGR image (grayscale with ``gray``), or None when the bytes are not a
+    decodable image.
+
+    ``target_side`` lets a JPEG decode at reduced scale as long as its long
+    side stays >= target_side; ``max_pixels`` rejects oversized images with
+    ImageTooLargeError, from the header when there is one.
+    """
+    if buf is None or len(buf) == 0:
+        return None
+    header = image_size(buf)
+    if header is not None:
+        fmt, width, height = header
+        if max_pixels and width * height > max_pixels:
+            raise ImageTooLargeError(f"Image too large ({width}x{height})")
+        if fmt == "jpeg" and target_side:
+            for factor, flags in _REDUCED_GRAY_MODES if gray else _REDUCED_MODES:
+                if max(width, height) // factor >= target_side:
+                    return cv2.imdecode(buf, flags)
+
+    img = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE if gray else cv2.IMREAD_COLOR)
+    if img is not None and max_pixels and img.shape[0] * img.shape[1] > max_pixels:
+        raise ImageTooLargeError(f"Image too large ({img.shape[1]}x{img.shape[0]})")
+    return img
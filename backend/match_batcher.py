@@ -0,0 +1,128 @@
+"""Micro-batching of concurrent gallery lookups.
+
+When many kiosks submit at once, each request thread would scan the gallery
+with its own matrix-vector product.  ``MatchBatcher.nearest`` instead queues
+the encoding; a single batcher thread waits up to ``max_wait_ms`` for more
+requests (or until ``max_batch`` are queued), answers the whole batch with
+one ``FaceGallery.nearest_many`` matrix-matrix product per filter group, and
+wakes every caller with its own Match.
+
+Requests that queue up while a batch is being scored always join the next
+one.  The batcher then waits (at most ``max_wait_ms``) only until as many
+requests are queued as went into the previous batch, so a lone kiosk is
+matched straight away while a burst of requests fills larger batches.
+Galleries with an ANN or VP-tree index are still queried one encoding at a
+time (on the batcher thread), since a batched full scan would throw away the
+pruning.
+"""
+import threading
+import time
+
+import numpy as np
+
+
+class _Pending:
+    def __init__(self, encoding, where):
+        self.encoding = encoding
+        self.where = where
+        self.match = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MatchBatcher:
+    def __init__(self, gallery_source, max_batch=32, max_wait_ms=2.0):
+        """``gallery_source`` is called once per batch to get the current gallery."""
+        self.gallery_source = gallery_source
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._pending = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._last_batch = 0
+        self.batches = 0
+        self.queries = 0
+        self.largest = 0
+
+    def nearest(self, encoding, where=None):
+        """Same result as ``gallery.nearest(encoding, where)``, computed in a batch."""
+        pending = _Pending(np.asarray(encoding, dtype=np.float32).ravel(), where)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._pending.append(pending)
+            self._cond.notify()
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.match
+
+    def stats(self):
+        with self._cond:
+            return {
+                "batches": self.batches,
+                "queries": self.queries,
+                "mean_batch": round(self.queries / self.batches, 2) if self.batches else 0.0,
+                "largest_batch": self.largest,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # Expect about as many requests as last time: a lone kiosk never
+                # waits, a 9 AM rush fills batches within max_wait.
+                target = min(self.max_batch, max(self._last_batch, 1))
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < target:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch]
+                del self._pending[: self.max_batch]
+                self.batches += 1
+                self.queries += len(batch)
+                self.largest = max(self.largest, len(batch))
+                self._last_batch = len(batch)
+            self._execute(batch)
+
+    def _execute(self, batch):
+        groups = {}
+        for pending in batch:
+            groups.setdefault(_where_key(pending.where), []).append(pending)
+        try:
+            gallery = self.gallery_source()
+        except Exception as e:
+            gallery, error = None, e
+        for group in groups.values():
+            try:
+                if gallery is None:
+                    raise error
+                where = group[0].where
+                if len(group) == 1 or gallery.ann is not None or gallery.tree is not None:
+                    matches = [gallery.nearest(p.encoding, where=where) for p in group]
+                else:
+                    matches = gallery.nearest_many([p.encoding for p in group], where=where)
+                for pending, match in zip(group, matches):
+                    pending.match = match
+            except Exception as e:
+                for pending in group:
+                    pending.error = e
+            finally:
+                for pending in group:
+                    pending.done.set()
+
+
+def _where_key(where):
+    # Requests can only share a scan when they select the same rows.
+    items = []
+    for field, value in sorted((where or {}).items()):
+        if value is None:
+            continue
+        if isinstance(value, (list, tuple, set)):
+            value = tuple(sorted(str(v) for v in value))
+        items.append((field, value))
+    return tuple(items)
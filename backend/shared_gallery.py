@@ -0,0 +1,315 @@
+"""Gallery shared between worker processes through ``multiprocessing.shared_memory``.
+
+Every published version of the gallery lives in its own read-only segment:
+
+    float32 (n, dim) matrix | float32 (n,) squared norms | identities JSON
+
+A small control segment holds the current version number, the segment name
+and the ``GalleryStore.disk_stamp()`` of the files it was published from.
+The control block is written under a sequence counter (odd while a write is
+in progress) so readers never act on a half-written record.
+
+Readers map the current segment zero-copy with ``FaceGallery.from_arrays``
+and re-check the control block at most every ``poll_interval`` seconds, which
+bounds how long an enrollment made in another worker stays invisible.
+
+Writers take the store's cross-process lock, build a private copy of the
+latest version (the first ``add`` copies the rows out of shared memory),
+journal the change to disk as usual, then publish the result as a new
+segment and unlink the previous one.  Workers still mapping the old segment
+keep a valid view until they move on.
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import namedtuple
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from face_gallery import ENCODING_DIM, FaceGallery
+
+_SEQ = struct.Struct("<Q")
+# version, count, dim, identities bytes, disk stamp (3 fields), segment name
+_CONTROL = struct.Struct("<QQIQqQQ64s")
+
+Control = namedtuple(
+    "Control",
+    ["version", "count", "dim", "ident_len", "manifest_mtime", "manifest_size", "journal_size", "segment"],
+)
+
+
+def default_name(directory):
+    """Short, stable segment prefix for a store directory (macOS caps names at 31 chars)."""
+    digest = zlib.crc32(os.path.abspath(directory).encode("utf-8")) & 0xFFFFFFFF
+    return f"sag_{digest:08x}"
+
+
+class SharedGallery:
+    def __init__(self, store, name=None, storage="float32", poll_interval=1.0, verify=True):
+        self.store = store
+        self.name = name or default_name(store.directory)
+        self.storage = storage
+        self.poll_interval = poll_interval
+        self.verify = verify
+        self.initialized = False  # True when this process loaded the gallery from disk
+        self.version = 0
+        self._control = None
+        self._segment = None
+        self._gallery = None
+        self._checked_at = 0.0
+        self._retired = []
+        self._swap_lock = threading.RLock()
+
+    # ---- reading ----
+    def open(self):
+        """Attach to the published gallery, loading it from disk if there is none."""
+        with self.store.lock:
+            self._control = self._open_control()
+            control = self.read_control()
+            if control.version and _stamp(control) == self.store.disk_stamp():
+                try:
+                    self._adopt(control)
+                    return self._gallery
+                except FileNotFoundError:
+                    pass  # segment vanished (e.g. host reboot); republish below
+
+            if self.store.exists():
+                gallery = self.store.load(storage=self.storage, verify=self.verify)
+            else:
+                gallery = FaceGallery(storage=self.storage)
+            self._publish(gallery)
+            self.initialized = True
+            return self._gallery
+
+    def current(self):
+        """The latest published gallery, re-checked at most every ``poll_interval``."""
+        if time.monotonic() - self._checked_at >= self.poll_interval:
+            self.refresh()
+        return self._gallery
+
+    def refresh(self):
+        """Swap to a newer published version if there is one; True when swapped."""
+        if not self._swap_lock.acquire(blocking=False):
+            return False  # another request thread is already swapping
+        try:
+            self._checked_at = time.monotonic()
+            while True:
+                control = self.read_control()
+                if control.version == self.version:
+                    return False
+                try:
+                    self._adopt(control)
+                    return True
+                except FileNotFoundError:
+                    continue  # superseded between reading the control block and attaching
+        finally:
+            self._swap_lock.release()
+
+    def is_stale(self):
+        """True when the files on disk no longer match the published version."""
+        with self.store.lock:
+            return _stamp(self.read_control()) != self.store.disk_stamp()
+
+    def reload(self, force=False):
+        """Publish a fresh load from disk (e.g. after an offline rebuild or restore).
+
+        Every worker's watcher may notice the change at once; the stamp is
+        re-checked under the store lock so only the first one reloads.
+        """
+        with self.store.lock:
+            if not force and _stamp(self.read_control()) == self.store.disk_stamp():
+                return False
+            gallery = self.store.load(storage=self.storage, verify=self.verify)
+            self._publish(gallery)
+            return True
+
+    def read_control(self):
+        buf = self._control.buf
+        while True:
+            (before,) = _SEQ.unpack_from(buf, 0)
+            if before % 2 == 0:
+                fields = _CONTROL.unpack_from(buf, _SEQ.size)
+                if _SEQ.unpack_from(buf, 0)[0] == before:
+                    segment = fields[-1].rstrip(b"\0").decode("ascii")
+                    return Control(*fields[:-1], segment)
+            time.sleep(0)
+
+    # ---- writing ----
+    def add(self, encoding, admission_no, name, metadata=None):
+        return self.update(
+            lambda gallery: self.store.add(gallery, encoding, admission_no, name, metadata)
+        )
+
+    def remove(self, admission_no):
+        with self.store.lock:
+            gallery = self._latest()
+            removed = self.store.remove(gallery, admission_no)
+            if removed:
+                self._publish(gallery)
+            return removed
+
+    def update(self, mutate):
+        """Apply ``mutate`` to a private copy of the latest version and publish it."""
+        with self.store.lock:
+            gallery = self._latest()
+            result = mutate(gallery)
+            self._publish(gallery)
+            return result
+
+    def compact(self):
+        """Fold the journal into a new generation and record the new stamp."""
+        with self.store.lock:
+            gallery = self._latest()
+            generation = self.store.compact(gallery)
+            control = self.read_control()
+            self._write_control(control._replace(**self._stamp_fields()))
+            return generation
+
+    def _latest(self):
+        # Always a fresh object: the one serving requests must not see half-applied changes.
+        control = self.read_control()
+        segment = _open_segment(control.segment)
+        with self._swap_lock:
+            self._retired.append(segment)
+        return self._wrap(segment, control)
+
+    def _publish(self, gallery):
+        data = gallery.export()
+        identities = json.dumps(
+            {
+                "admission_nos": data["admission_nos"],
+                "names": data["names"],
+                "metadata": data["metadata"],
+            }
+        ).encode("utf-8")
+        matrix = data["encodings"]
+        count = len(matrix)
+        dim = matrix.shape[1] if matrix.ndim == 2 else ENCODING_DIM
+
+        previous = self.read_control()
+        version = previous.version + 1
+        segment_name = f"{self.name}_{version}"
+        size = matrix.nbytes + data["sq_norms"].nbytes + len(identities)
+        segment = _create_segment(segment_name, max(size, 1))
+        buf = segment.buf
+        buf[: matrix.nbytes] = matrix.tobytes()
+        offset = matrix.nbytes
+        buf[offset : offset + data["sq_norms"].nbytes] = data["sq_norms"].tobytes()
+        offset += data["sq_norms"].nbytes
+        buf[offset : offset + len(identities)] = identities
+
+        control = Control(version, count, dim, len(identities), 0, 0, 0, segment_name)
+        self._write_control(control._replace(**self._stamp_fields()))
+        if previous.segment:
+            _unlink(previous.segment)
+        self._adopt(self.read_control(), segment)
+
+    def _write_control(self, control):
+        buf = self._control.buf
+        (seq,) = _SEQ.unpack_from(buf, 0)
+        _SEQ.pack_into(buf, 0, seq + 1)
+        _CONTROL.pack_into(buf, _SEQ.size, *control[:-1], control.segment.encode("ascii"))
+        _SEQ.pack_into(buf, 0, seq + 2)
+
+    def _stamp_fields(self):
+        return dict(zip(("manifest_mtime", "manifest_size", "journal_size"), self.store.disk_stamp()))
+
+    # ---- segments ----
+    def _open_control(self):
+        size = _SEQ.size + _CONTROL.size
+        try:
+            return _open_segment(f"{self.name}_ctl")
+        except FileNotFoundError:
+            return _create_segment(f"{self.name}_ctl", size)
+
+    def _adopt(self, control, segment=None):
+        segment = segment or _open_segment(control.segment)
+        gallery = self._wrap(segment, control)
+        with self._swap_lock:
+            if self._segment is not None:
+                self._retired.append(self._segment)
+            self._segment, self._gallery, self.version = segment, gallery, control.version
+            self._close_retired()
+
+    def _wrap(self, segment, control):
+        buf = segment.buf
+        matrix = np.frombuffer(buf, dtype=np.float32, count=control.count * control.dim)
+        matrix = matrix.reshape(control.count, control.dim)
+        offset = matrix.nbytes
+        sq_norms = np.frombuffer(buf, dtype=np.float32, count=control.count, offset=offset)
+        offset += sq_norms.nbytes
+        identities = json.loads(bytes(buf[offset : offset + control.ident_len]))
+        matrix.flags.writeable = False
+        sq_norms.flags.writeable = False
+        return FaceGallery.from_arrays(
+            matrix,
+            identities["admission_nos"],
+            identities["names"],
+            identities.get("metadata"),
+            storage=self.storage,
+            sq_norms=sq_norms,
+        )
+
+    def _close_retired(self):
+        # A segment can only be closed once no gallery still views its buffer.
+        still_mapped = []
+        for segment in self._retired:
+            try:
+                segment.close()
+            except BufferError:
+                still_mapped.append(segment)
+        self._retired = still_mapped
+
+
+class _Segment(shared_memory.SharedMemory):
+    def __del__(self):
+        try:
+            self.close()
+        except BufferError:
+            pass  # arrays still view the mapping; it is released along with them
+
+
+def _stamp(control):
+    return (control.manifest_mtime, control.manifest_size, control.journal_size)
+
+
+def _open_segment(name):
+    return _untracked(lambda **kw: _Segment(name=name, **kw))
+
+
+def _create_segment(name, size):
+    try:
+        return _untracked(
+            lambda **kw: _Segment(name=name, create=True, size=size, **kw)
+        )
+    except FileExistsError:
+        _unlink(name)  # left behind by a crashed writer
+        return _untracked(
+            lambda **kw: _Segment(name=name, create=True, size=size, **kw)
+        )
+
+
+def _untracked(make):
+    # Segments must outlive the process that created or attached them, so keep
+    # them away from the resource tracker, which unlinks them at exit.
+    try:
+        return make(track=False)  # Python 3.13+
+    except TypeError:
+        segment = make()
+        if os.name == "posix":
+            resource_tracker.unregister(segment._name, "shared_memory")
+        return segment
+
+
+def _unlink(name):
+    if os.name != "posix":
+        return  # Windows frees a segment once its last handle closes
+    try:
+        # SharedMemory.unlink() would also unregister it from the resource tracker.
+        shared_memory._posixshmem.shm_unlink("/" + name)
+    except FileNotFoundError:
+        pass
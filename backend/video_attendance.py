@@ -0,0 +1,378 @@
+"""Take attendance from a recorded lecture video.
+
+Run from the backend folder:
+
+    python video_attendance.py lecture.mp4 --start "2026-10-17 09:05" --branch CSE
+
+Frames are sampled at ``--sample-fps`` (skipped frames are grabbed but never
+decoded), detected and encoded in a process pool, and matched against the
+enrolled gallery.  A student counts as present in a session once they were
+recognized in ``--min-frames`` sampled frames whose recording time falls in
+that AM/PM window (the same windows as live attendance); all records are
+then written with one ``insert_many``.  Students already marked for that
+date and session are left alone.
+
+The recording start defaults to the file's modification time minus its
+duration.  Progress is checkpointed to ``<video>.attendance.json`` every
+``--checkpoint-every`` seconds and on Ctrl-C; running the same command
+again resumes from there.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import cv2
+from dotenv import load_dotenv
+
+from attendance_sessions import session_for
+from face_pipeline import encode_faces
+from frame_buffers import worker_pool
+from gallery_store import GalleryStore
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Mark attendance from a recorded video.")
+    parser.add_argument("video")
+    parser.add_argument("--start", help='recording start, e.g. "2026-10-17 09:05"')
+    parser.add_argument("--branch", default="CSE")
+    parser.add_argument("--within-branch", action="store_true",
+                        help="only match students of --branch")
+    parser.add_argument("--sample-fps", type=float, default=1.0)
+    parser.add_argument("--min-frames", type=int, default=2,
+                        help="sampled frames a student must appear in")
+    parser.add_argument("--threshold", type=float, default=float(os.getenv("MATCH_THRESHOLD", "0.6")))
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-side", type=int, default=int(os.getenv("ROLL_CALL_MAX_SIDE", "1280")),
+                        help="detect on a copy no larger than this (0 = full frame)")
+    parser.add_argument("--upsample", type=int, default=int(os.getenv("ROLL_CALL_UPSAMPLE", "1")))
+    parser.add_argument("--model", default=os.getenv("DETECT_MODEL", "hog").lower())
+    parser.add_argument("--checkpoint", help="default: <video>.attendance.json")
+    parser.add_argument("--checkpoint-every", type=float, default=30.0, help="seconds")
+    parser.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    parser.add_argument("--dry-run", action="store_true", help="report, write nothing to MongoDB")
+    return parser.parse_args(argv)
+
+
+# ---- worker process side ----
+def _init_worker():
+    cv2.setNumThreads(1)  # one frame per worker; the pool provides the parallelism
+
+
+def _encode_frame(bgr, max_side, upsample, model):
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=bgr)
+    encodings, _ = encode_faces(
+        rgb, max_side=max_side or None, upsample=upsample, model=model, pool=worker_pool()
+    )
+    return encodings
+
+
+# ---- checkpoint ----
+def video_identity(path, sample_fps):
+    stat = os.stat(path)
+    return {
+        "video": os.path.abspath(path),
+        "size": stat.st_size,
+        "mtime": stat.st_mtime,
+        "sample_fps": sample_fps,
+    }
+
+
+def load_checkpoint(path, identity):
+    try:
+        with open(path) as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return None
+    if state.get("identity") != identity:
+        print(f"⚠️ {path} is for a different video or sample rate, starting over")
+        return None
+    return state
+
+
+def save_checkpoint(path, state):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+# ---- the scan ----
+class VideoScan:
+    def __init__(self, args, gallery, where):
+        self.args = args
+        self.gallery = gallery
+        self.where = where
+        self.capture = cv2.VideoCapture(args.video)
+        if not self.capture.isOpened():
+            raise SystemExit(f"❌ Cannot open video {args.video}")
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or 25.0
+        self.total = int(self.capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        self.step = max(1.0, self.fps / args.sample_fps)
+
+        self.checkpoint = args.checkpoint or args.video + ".attendance.json"
+        self.identity = video_identity(args.video, args.sample_fps)
+        state = None if args.restart else load_checkpoint(self.checkpoint, self.identity)
+        if state is None:
+            state = {
+                "identity": self.identity,
+                "start": self.recording_start().isoformat(),
+                "next_frame": 0,
+                "sampled": 0,
+                "seen": {},
+                "inserted": False,
+            }
+        self.state = state
+        self.start = datetime.fromisoformat(state["start"])
+
+    def recording_start(self):
+        if self.args.start:
+            return datetime.fromisoformat(self.args.start)
+        duration = (self.total or 0) / self.fps
+        start = datetime.fromtimestamp(os.path.getmtime(self.args.video)) - timedelta(seconds=duration)
+        print(f"ℹ️ No --start given, assuming the recording began at {start:%Y-%m-%d %H:%M:%S}")
+        return start.replace(microsecond=0)
+
+    def is_sample(self, index):
+        # The first frame of every 1/sample_fps stretch.
+        return index == 0 or int(index / self.step) != int((index - 1) / self.step)
+
+    def frames(self, first):
+        """(index, BGR frame) for every sampled frame from ``first`` on."""
+        index = 0
+        if first and self.capture.set(cv2.CAP_PROP_POS_FRAMES, first):
+            index = int(self.capture.get(cv2.CAP_PROP_POS_FRAMES))
+        while True:
+            if not self.capture.grab():
+                return
+            if index >= first and self.is_sample(index):
+                ok, frame = self.capture.retrieve()
+                if ok:
+                    yield index, frame
+            index += 1
+            self.decoded = index
+
+    def record(self, index, encodings):
+        if not encodings:
+            return
+        moment = self.start + timedelta(seconds=index / self.fps)
+        session_type = session_for(moment)
+        matches = self.gallery.nearest_many(encodings, where=self.where)
+        # A student seen twice in one frame still counts once.
+        best = {}
+        for match in matches:
+            if match is None or match.distance > self.args.threshold:
+                continue
+            if match.admission_no not in best or match.distance < best[match.admission_no].distance:
+                best[match.admission_no] = match
+        for admission_no, match in best.items():
+            key = f"{admission_no}|{moment.date().isoformat()}|{session_type or '-'}"
+            entry = self.state["seen"].setdefault(
+                key,
+                {
+                    "admission_no": admission_no,
+                    "name": match.name,
+                    "date": moment.date().isoformat(),
+                    "session": session_type,
+                    "frames": 0,
+                    "distance": float(match.distance),
+                    "first_seen": moment.isoformat(),
+                },
+            )
+            entry["frames"] += 1
+            entry["distance"] = min(entry["distance"], float(match.distance))
+
+    def run(self):
+        args = self.args
+        first = self.state["next_frame"]
+        if first:
+            print(f"↩️ Resuming {args.video} at frame {first} ({self.clock(first)})")
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker)
+        window = deque()  # results are taken in frame order, so the checkpoint is exact
+        started = last_report = last_save = time.monotonic()
+        self.decoded = first
+        sampled = 0
+        try:
+            for index, frame in self.frames(first):
+                window.append(
+                    (index, executor.submit(
+                        _encode_frame, frame, args.max_side, args.upsample, args.model
+                    ))
+                )
+                sampled += 1
+                while window and (len(window) >= 2 * args.workers or window[0][1].done()):
+                    done_index, future = window.popleft()
+                    self.record(done_index, future.result())
+                    self.state["next_frame"] = done_index + 1
+                    self.state["sampled"] += 1
+
+                now = time.monotonic()
+                if now - last_report >= 5:
+                    self.report(first, sampled, now - started)
+                    last_report = now
+                if now - last_save >= args.checkpoint_every:
+                    save_checkpoint(self.checkpoint, self.state)
+                    last_save = now
+
+            while window:
+                done_index, future = window.popleft()
+                self.record(done_index, future.result())
+                self.state["next_frame"] = done_index + 1
+                self.state["sampled"] += 1
+            self.state["next_frame"] = max(self.state["next_frame"], self.decoded)
+            self.state["complete"] = True
+            save_checkpoint(self.checkpoint, self.state)
+            self.report(first, sampled, time.monotonic() - started)
+        except KeyboardInterrupt:
+            for _, future in window:
+                future.cancel()
+            save_checkpoint(self.checkpoint, self.state)
+            print(f"\n💾 Interrupted, progress saved to {self.checkpoint}")
+            raise SystemExit(130)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.capture.release()
+
+    def clock(self, index):
+        seconds = int(index / self.fps)
+        return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+    def report(self, first, sampled, elapsed):
+        position = self.state["next_frame"]
+        total = f" / {self.clock(self.total)}" if self.total else ""
+        percent = f" ({100 * position / self.total:.0f}%)" if self.total else ""
+        elapsed = max(elapsed, 1e-6)
+        print(
+            f"⏱️ {self.clock(position)}{total}{percent}  "
+            f"{(self.decoded - first) / elapsed:.1f} frames/s read, "
+            f"{sampled / elapsed:.2f} sampled/s, "
+            f"{len({e['admission_no'] for e in self.state['seen'].values()})} students seen"
+        )
+
+
+# ---- writing attendance ----
+def present(state, min_frames):
+    return [
+        entry for entry in state["seen"].values()
+        if entry["frames"] >= min_frames and entry["session"] is not None
+    ]
+
+
+def insert_attendance(entries, branch):
+    from pymongo import MongoClient
+
+    client = MongoClient(os.getenv("MONGO_URI", "mongodb://localhost:27017/smart_attendance_db"))
+    db = client.get_default_database()
+    students = {
+        s["admission_no"]: s
+        for s in db.students.find(
+            {"admission_no": {"$in": sorted({e["admission_no"] for e in entries})}},
+            {"admission_no": 1, "name": 1, "branch": 1},
+        )
+    }
+    statuses = {}
+    docs = []
+    for (date, session_type) in sorted({(e["date"], e["session"]) for e in entries}):
+        group = [e for e in entries if e["date"] == date and e["session"] == session_type]
+        already = {
+            (a["admission_no"], a.get("branch"))
+            for a in db.attendance.find(
+                {
+                    "admission_no": {"$in": [e["admission_no"] for e in group]},
+                    "date": date,
+                    "session": session_type,
+                },
+                {"admission_no": 1, "branch": 1},
+            )
+        }
+        for entry in group:
+            key = (entry["admission_no"], date, session_type)
+            student = students.get(entry["admission_no"])
+            if student is None:
+                statuses[key] = "not_found"
+                continue
+            student_branch = student.get("branch", branch)
+            if (entry["admission_no"], student_branch) in already:
+                statuses[key] = "already_marked"
+                continue
+            statuses[key] = "marked"
+            docs.append(
+                {
+                    "admission_no": entry["admission_no"],
+                    "name": student["name"],
+                    "branch": student_branch,
+                    "date": date,
+                    "timestamp": datetime.fromisoformat(entry["first_seen"]),
+                    "status": "Present",
+                    "confidence": round(1 - entry["distance"], 2),
+                    "session": session_type,
+                    "source": "video",
+                }
+            )
+    if docs:
+        db.attendance.insert_many(docs, ordered=False)
+    client.close()
+    return statuses
+
+
+def main(argv=None):
+    load_dotenv()
+    args = parse_args(argv)
+    if args.sample_fps <= 0:
+        raise SystemExit("❌ --sample-fps must be positive")
+
+    gallery_store = GalleryStore(os.getenv("GALLERY_DIR", "face_gallery"))
+    if not gallery_store.exists():
+        raise SystemExit("❌ No face gallery found - enroll students first (or set GALLERY_DIR)")
+    # The server may be appending to the journal right now: never truncate it.
+    gallery = gallery_store.load(
+        storage=os.getenv("GALLERY_STORAGE", "float32").lower(),
+        verify=os.getenv("GALLERY_VERIFY_CHECKSUM", "1") == "1",
+        read_only=True,
+    )
+    print(f"✅ Loaded {len(gallery)} face encodings")
+    where = {"branch": args.branch} if args.within_branch else None
+
+    scan = VideoScan(args, gallery, where)
+    if scan.state.get("complete"):
+        print(f"ℹ️ {args.video} was already scanned (see {scan.checkpoint}); --restart to rescan")
+    else:
+        print(
+            f"🎬 {args.video}: {scan.fps:.1f} fps, sampling {args.sample_fps:g}/s "
+            f"with {args.workers} workers, recording starts {scan.start:%Y-%m-%d %H:%M:%S}"
+        )
+        scan.run()
+
+    entries = present(scan.state, args.min_frames)
+    outside = {
+        e["admission_no"] for e in scan.state["seen"].values()
+        if e["session"] is None and e["frames"] >= args.min_frames
+    }
+    if outside:
+        print(f"⚠️ {len(outside)} student(s) only seen outside the 9AM-1PM / 2PM-5PM windows")
+    if args.dry_run or scan.state["inserted"]:
+        statuses = {}
+        if scan.state["inserted"]:
+            print("ℹ️ Attendance from this video was already written")
+    else:
+        statuses = insert_attendance(entries, args.branch)
+        scan.state["inserted"] = True
+        save_checkpoint(scan.checkpoint, scan.state)
+
+    for entry in sorted(entries, key=lambda e: (e["date"], e["session"], e["admission_no"])):
+        status = statuses.get((entry["admission_no"], entry["date"], entry["session"]), "present")
+        print(
+            f"  {entry['date']} {entry['session']}  {entry['admission_no']:<12} "
+            f"{entry['name']:<24} {entry['frames']:>4} frames  "
+            f"conf {1 - entry['distance']:.2f}  {status}"
+        )
+    marked = sum(status == "marked" for status in statuses.values())
+    print(f"✅ {len(entries)} student-session(s) present, {marked} newly marked")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
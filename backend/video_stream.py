@@ -0,0 +1,92 @@
+"""Splitting a continuous MJPEG upload into JPEG frames.
+
+Cameras and ``ffmpeg -f mpjpeg`` send ``multipart/x-mixed-replace``: every
+frame is a JPEG behind a boundary line and a few part headers.  Rather than
+trusting boundaries and Content-Length headers, ``iter_jpeg_frames`` finds
+the JPEGs themselves: SOI, the length-prefixed header segments up to the
+first SOS, then the EOI marker (0xFF 0xD9 cannot occur inside entropy-coded
+data, where every 0xFF is stuffed).  Whatever sits between frames is
+skipped, so plain back-to-back JPEGs work as well.
+"""
+import numpy as np
+
+from image_io import ImageUploadError
+
+_SOI = b"\xff\xd8"
+_EOI = b"\xff\xd9"
+_SOS = 0xDA
+# Markers that stand alone, without a length field.
+_STANDALONE = frozenset(range(0xD0, 0xD8)) | {0x01, 0xD8}
+
+
+def iter_jpeg_frames(stream, max_frame_bytes=2 * 2**20, chunk_size=64 * 1024):
+    """Yield every JPEG in ``stream`` as a uint8 array, as soon as it is complete.
+
+    Raises ImageUploadError when a frame grows past ``max_frame_bytes``
+    without ending.  A truncated last frame is dropped.
+    """
+    buf = bytearray()
+    start = -1  # offset of the current frame's SOI
+    scan = 0  # where the search for the next marker resumes
+    entropy = False  # past the SOS header, looking for EOI
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        buf += chunk
+        while True:
+            if start < 0:
+                start = buf.find(_SOI, scan)
+                if start < 0:
+                    # Keep a trailing 0xFF: it may be the first half of an SOI.
+                    del buf[: max(0, len(buf) - 1)]
+                    scan = 0
+                    break
+                scan = start + 2
+                entropy = False
+
+            if not entropy:
+                scan = _skip_segments(buf, scan)
+                if scan < 0:  # the header is not complete yet
+                    scan = -scan
+                    break
+                entropy = True
+
+            end = buf.find(_EOI, scan)
+            if end < 0:
+                scan = max(scan, len(buf) - 1)
+                break
+            yield np.frombuffer(bytes(buf[start : end + 2]), dtype=np.uint8)
+            del buf[: end + 2]
+            start, scan = -1, 0
+
+        if start >= 0 and len(buf) - start > max_frame_bytes:
+            raise ImageUploadError(f"Video frame larger than {max_frame_bytes} bytes")
+
+
+def _skip_segments(buf, pos):
+    """Offset just past the SOS header at or after ``pos``.
+
+    Returns ``-pos_reached`` when ``buf`` ends before the SOS header does.
+    """
+    size = len(buf)
+    while True:
+        if pos + 2 > size:
+            return -pos
+        if buf[pos] != 0xFF:
+            raise ImageUploadError("Corrupt JPEG frame in video stream")
+        marker = buf[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in _STANDALONE:
+            pos += 2
+            continue
+        if pos + 4 > size:
+            return -pos
+        end = pos + 2 + (buf[pos + 2] << 8 | buf[pos + 3])
+        if end > size:
+            return -pos
+        if marker == _SOS:
+            return end
+        pos = end
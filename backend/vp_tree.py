@@ -0,0 +1,249 @@
+"""Vantage-point tree for exact k-NN and radius queries over face encodings.
+
+Each internal node keeps the [lo, hi] range of distances from its vantage
+point to everything below each child.  With the triangle inequality a child
+can be skipped whenever |d(q, vp) - d(vp, p)| already exceeds the search
+radius for every p in that range, so fixed-radius lookups such as the 0.4
+duplicate check touch only a small part of the gallery.  Leaves hold small
+buckets that are scanned with one vectorized distance computation.
+"""
+import copy
+import heapq
+
+import numpy as np
+
+
+class _Leaf:
+    __slots__ = ("ids", "vecs")
+
+    def __init__(self, ids, vecs):
+        self.ids = ids
+        self.vecs = vecs
+
+
+class _Node:
+    __slots__ = ("vp", "vp_vec", "vp_alive", "mu", "inside", "outside", "in_bounds", "out_bounds")
+
+
+class VPTree:
+    def __init__(self, leaf_size=32, seed=0):
+        self.leaf_size = leaf_size
+        self.root = None
+        self.dim = None
+        self.distance_evals = 0
+        self._size = 0
+        self._dead_vps = 0
+        self._location = {}
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def dead_fraction(self):
+        total = self._size + self._dead_vps
+        return self._dead_vps / total if total else 0.0
+
+    # ---- building ----
+    def build(self, vectors, ids):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        ids = np.asarray(ids, dtype=np.int64)
+        self.dim = vectors.shape[1] if vectors.ndim == 2 else None
+        self._size = len(ids)
+        self._dead_vps = 0
+        self._location = {}
+        self.root = self._build(ids, vectors) if len(ids) else None
+        return self
+
+    def _build(self, ids, vecs):
+        if len(ids) <= self.leaf_size:
+            leaf = _Leaf(ids.copy(), vecs.copy())
+            for i in leaf.ids:
+                self._location[int(i)] = leaf
+            return leaf
+
+        pick = int(self._rng.integers(len(ids)))
+        node = _Node()
+        node.vp, node.vp_vec, node.vp_alive = int(ids[pick]), vecs[pick].copy(), True
+        self._location[node.vp] = node
+
+        rest = np.arange(len(ids)) != pick
+        ids, vecs = ids[rest], vecs[rest]
+        dists = self._dist(vecs, node.vp_vec)
+        order = np.argsort(dists)
+        half = len(order) // 2
+        inner, outer = order[:half], order[half:]
+
+        node.mu = float(dists[outer[0]])
+        node.in_bounds = self._bounds(dists[inner])
+        node.out_bounds = self._bounds(dists[outer])
+        node.inside = self._build(ids[inner], vecs[inner]) if len(inner) else None
+        node.outside = self._build(ids[outer], vecs[outer])
+        return node
+
+    @staticmethod
+    def _bounds(dists):
+        if len(dists) == 0:
+            return [np.inf, -np.inf]
+        return [float(dists.min()), float(dists.max())]
+
+    # ---- mutation ----
+    def insert(self, vector, id_):
+        vec = np.asarray(vector, dtype=np.float32).ravel()
+        if self.root is None:
+            self.dim = len(vec)
+            self.root = _Leaf(np.array([id_], dtype=np.int64), vec[None].copy())
+            self._location[int(id_)] = self.root
+            self._size = 1
+            return
+
+        parent, side, node = None, None, self.root
+        while isinstance(node, _Node):
+            d = float(self._dist(vec[None], node.vp_vec)[0])
+            side = "inside" if d < node.mu else "outside"
+            bounds = node.in_bounds if side == "inside" else node.out_bounds
+            bounds[0], bounds[1] = min(bounds[0], d), max(bounds[1], d)
+            parent, node = node, getattr(node, side)
+
+        if node is None:
+            node = _Leaf(np.empty(0, dtype=np.int64), np.empty((0, len(vec)), dtype=np.float32))
+        leaf = _Leaf(np.append(node.ids, id_), np.vstack([node.vecs, vec]))
+        if len(leaf.ids) > 2 * self.leaf_size:
+            replacement = self._build(leaf.ids, leaf.vecs)
+        else:
+            replacement = leaf
+            for i in leaf.ids:
+                self._location[int(i)] = leaf
+
+        if parent is None:
+            self.root = replacement
+        else:
+            setattr(parent, side, replacement)
+        self._size += 1
+
+    def remove(self, id_):
+        holder = self._location.pop(int(id_), None)
+        if holder is None:
+            return False
+        if isinstance(holder, _Node):
+            # The vantage point still routes queries; it just stops matching.
+            holder.vp_alive = False
+            self._dead_vps += 1
+        else:
+            keep = holder.ids != id_
+            holder.ids, holder.vecs = holder.ids[keep], holder.vecs[keep]
+        self._size -= 1
+        return True
+
+    def remap(self, new_ids):
+        """Rewrite stored ids through ``new_ids`` (old id -> new id, -1 drops)."""
+        self._location = {}
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if isinstance(node, _Leaf):
+                mapped = new_ids[node.ids]
+                keep = mapped >= 0
+                node.ids, node.vecs = mapped[keep], node.vecs[keep]
+                for i in node.ids:
+                    self._location[int(i)] = node
+                continue
+            if node.vp_alive:
+                node.vp = int(new_ids[node.vp])
+                if node.vp < 0:
+                    node.vp_alive = False
+                    self._dead_vps += 1
+                else:
+                    self._location[node.vp] = node
+            stack.extend(child for child in (node.inside, node.outside) if child is not None)
+        self._size = len(self._location)
+
+    def remapped(self, new_ids):
+        """A copy with ids rewritten through ``new_ids``; this tree is left as is.
+
+        Nodes are copied because insert/remove/remap update them in place;
+        leaf arrays are shared, since those are only ever replaced.
+        """
+        clone = VPTree(leaf_size=self.leaf_size)
+        clone.dim = self.dim
+        clone._dead_vps = self._dead_vps
+        clone._rng = copy.deepcopy(self._rng)
+        clone.root = _copy_nodes(self.root)
+        clone.remap(new_ids)
+        return clone
+
+    # ---- queries ----
+    def knn(self, query, k=1):
+        """[(distance, id), ...] of the k nearest live points, closest first."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        heap = []  # max-heap of (-distance, id)
+
+        def tau():
+            return -heap[0][0] if len(heap) == k else np.inf
+
+        def offer(dist, id_):
+            if len(heap) < k:
+                heapq.heappush(heap, (-dist, id_))
+            elif dist < -heap[0][0]:
+                heapq.heapreplace(heap, (-dist, id_))
+
+        self._search(self.root, query, tau, offer)
+        return sorted((-d, i) for d, i in heap)
+
+    def radius(self, query, radius):
+        """[(distance, id), ...] of every live point within ``radius``, closest first."""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        found = []
+
+        def offer(dist, id_):
+            if dist <= radius:
+                found.append((dist, id_))
+
+        self._search(self.root, query, lambda: radius, offer)
+        return sorted(found)
+
+    def _search(self, root, query, tau, offer):
+        # Stack entries carry the parent's distance bounds for the subtree, and
+        # pruning is checked on pop so it uses the tightest tau found so far.
+        stack = [(root, -np.inf, np.inf, 0.0)] if root is not None else []
+        while stack:
+            node, lo, hi, d_parent = stack.pop()
+            t = tau()
+            if d_parent - t > hi or d_parent + t < lo:
+                continue
+
+            if isinstance(node, _Leaf):
+                if len(node.ids):
+                    dists = self._dist(node.vecs, query)
+                    for dist, id_ in zip(dists.tolist(), node.ids.tolist()):
+                        offer(dist, id_)
+                continue
+
+            d = float(self._dist(node.vp_vec[None], query)[0])
+            if node.vp_alive:
+                offer(d, node.vp)
+
+            # Push the far child first so the near one is searched first.
+            near, far = ("inside", "outside") if d < node.mu else ("outside", "inside")
+            for side in (far, near):
+                child = getattr(node, side)
+                if child is not None:
+                    lo, hi = node.in_bounds if side == "inside" else node.out_bounds
+                    stack.append((child, lo, hi, d))
+
+    def _dist(self, vecs, query):
+        self.distance_evals += len(vecs)
+        diff = vecs - query
+        return np.sqrt(np.einsum("ij,ij->i", diff, diff))
+
+
+def _copy_nodes(node):
+    if node is None:
+        return None
+    if isinstance(node, _Leaf):
+        return _Leaf(node.ids, node.vecs)
+    clone = _Node()
+    clone.vp, clone.vp_vec, clone.vp_alive, clone.mu = node.vp, node.vp_vec, node.vp_alive, node.mu
+    clone.in_bounds, clone.out_bounds = list(node.in_bounds), list(node.out_bounds)
+    clone.inside, clone.outside = _copy_nodes(node.inside), _copy_nodes(node.outside)
+    return clone
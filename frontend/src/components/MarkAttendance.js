@@ -3,16 +3,32 @@ import React, { useState, useRef, useEffect, useCallback } from "react";
 import { API_BASE } from "../config";
 import { getToken } from "../auth";
 
+const BURST_FRAMES = 3;
+const BURST_GAP_MS = 150;
+
+// ✅ Stable per-kiosk id - lets the backend remember who was just marked here
+const getDeviceId = () => {
+  let id = localStorage.getItem("kioskDeviceId");
+  if (!id) {
+    id = window.crypto && window.crypto.randomUUID
+      ? window.crypto.randomUUID()
+      : `kiosk-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem("kioskDeviceId", id);
+  }
+  return id;
+};
+
 const MarkAttendance = ({ branch, onStatsUpdate }) => {
   const [status, setStatus] = useState("ready");
   const [result, setResult] = useState(null);
+  const [admissionNo, setAdmissionNo] = useState("");
   const videoRef = useRef(null);
   const streamRef = useRef(null);
   const timeoutRef = useRef(null);
 
-  // ✅ FIXED: captureFrameAsDataURL
-  const captureFrameAsDataURL = useCallback(() => {
-    if (!videoRef.current) return null;
+  // ✅ Capture as a JPEG Blob - sent as raw bytes, no base64 overhead
+  const captureFrameAsBlob = useCallback(() => {
+    if (!videoRef.current) return Promise.resolve(null);
     const video = videoRef.current;
 
     // ✅ Fixed canvas size
@@ -21,9 +37,20 @@ const MarkAttendance = ({ branch, onStatsUpdate }) => {
     canvas.height = 240;
     const ctx = canvas.getContext("2d");
     ctx.drawImage(video, 0, 0, 320, 240);
-    return canvas.toDataURL("image/jpeg", 0.8); // Quality 80%
+    return new Promise((resolve) => canvas.toBlob(resolve, "image/jpeg", 0.8)); // Quality 80%
   }, []);
 
+  // ✅ Short burst of frames - the backend votes across them in one request
+  const captureBurst = useCallback(async () => {
+    const frames = [];
+    for (let i = 0; i < BURST_FRAMES; i++) {
+      if (i > 0) await new Promise((resolve) => setTimeout(resolve, BURST_GAP_MS));
+      const blob = await captureFrameAsBlob();
+      if (blob) frames.push(blob);
+    }
+    return frames;
+  }, [captureFrameAsBlob]);
+
   const stopCamera = useCallback(() => {
     if (streamRef.current) {
       streamRef.current.getTracks().forEach((track) => track.stop());
@@ -46,17 +73,17 @@ const MarkAttendance = ({ branch, onStatsUpdate }) => {
       return;
     }
 
-    console.log("📸 Capturing frame..."); // DEBUG
+    console.log("📸 Capturing frames..."); // DEBUG
 
-    const imageDataUrl = captureFrameAsDataURL();
-    if (!imageDataUrl) {
+    const frames = await captureBurst();
+    if (frames.length === 0) {
       setStatus("error");
       setResult("Failed to capture frame");
       stopCamera();
       return;
     }
 
-    console.log("✅ Image captured:", imageDataUrl.substring(0, 50) + "..."); // DEBUG
+    console.log("✅ Frames captured:", frames.map((f) => f.size), "bytes"); // DEBUG
 
     try {
       setStatus("processing");
@@ -64,18 +91,21 @@ const MarkAttendance = ({ branch, onStatsUpdate }) => {
       const token = getToken();
       console.log("MarkAttendance token:", token);
 
-      // ✅ Send { image, branch } - Backend expects THIS!
-      // ✅ Add Authorization header
-      const res = await fetch(`${API_BASE}/api/mark_attendance`, {
+      // ✅ One multipart "image" part per frame, branch + device in the query string
+      const params = new URLSearchParams({
+        branch: branch || "CSE",
+        device_id: getDeviceId(),
+      });
+      // ✅ Typed/scanned admission no → 1:1 check against that student only
+      if (admissionNo.trim()) params.set("admission_no", admissionNo.trim());
+      const form = new FormData();
+      frames.forEach((blob, i) => form.append("image", blob, `frame${i}.jpg`));
+      const res = await fetch(`${API_BASE}/api/mark_attendance?${params}`, {
         method: "POST",
         headers: {
-          "Content-Type": "application/json",
           Authorization: token ? `Bearer ${token}` : "",
         },
-        body: JSON.stringify({
-          image: imageDataUrl, // ← CHANGED from 'frame' to 'image'
-          branch: branch || "CSE", // ← ADDED branch!
-        }),
+        body: form,
       });
 
       console.log("📡 Response status:", res.status); // DEBUG
@@ -102,7 +132,7 @@ const MarkAttendance = ({ branch, onStatsUpdate }) => {
     } finally {
       stopCamera();
     }
-  }, [branch, onStatsUpdate, captureFrameAsDataURL, stopCamera]);
+  }, [branch, admissionNo, onStatsUpdate, captureBurst, stopCamera]);
 
   // ✅ startCameraAndDetect - Added branch prop
   const startCameraAndDetect = useCallback(async () => {
@@ -160,6 +190,12 @@ const MarkAttendance = ({ branch, onStatsUpdate }) => {
       <div className="attendance-header">
         <h3>🎥 Auto Mark Attendance - {branch}</h3>
         <p>Position face in frame and wait...</p>
+        <input
+          type="text"
+          value={admissionNo}
+          onChange={(e) => setAdmissionNo(e.target.value)}
+          placeholder="Admission No. (optional - scan ID card)"
+        />
       </div>
 
       {/* ✅ CAMERA VIEW */}